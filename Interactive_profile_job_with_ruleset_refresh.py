@@ -1,106 +1,149 @@
-import requests
+import argparse
+import asyncio
 import json
-import time
-
-# Define the API URLs
-login_url = 'http://<ENGINE_NAME>/masking/api/v5.1.33/login'
-profile_jobs_url = 'http://<ENGINE_NAME>/masking/api/v5.1.33/profile-jobs?page_number=1'
-execute_job_url = 'http://<ENGINE_NAME>/masking/api/v5.1.33/executions'
-async_tasks_url = 'http://<ENGINE_NAME>/masking/api/v5.1.33/async-tasks/'
-
-# Define the request headers
-headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
-}
-
-# Define the request body for the login with hardcoded credentials
-login_data = {
-    'username': 'USERNAME',
-    'password': 'PASSWORD'
-}
-
-# Send a POST request to the login URL
-login_response = requests.post(login_url, headers=headers, json=login_data)
-
-# Extract the authorization token from the login response
-auth_token = login_response.json().get('Authorization')
-
-# Check if the authorization token is valid
-if auth_token:
+
+from masking_engine import EngineClient, EngineError, add_metrics_arguments, enable_metrics, parse_id_ranges, poll_until_done
+from masking_engine_async import AsyncEngineClient
+from masking_models import ProfileJob
+
+# Define the masking engine connection
+ENGINE_HOST = '<ENGINE_NAME>'
+API_VERSION = 'v5.1.33'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+# Turn input like "3,5-7" into profileJobIds, kept as ranges (IdRanges) rather than a list
+def parse_job_ids(input_str):
+    return parse_id_ranges(input_str)
+
+# Trigger a ruleset refresh and wait for its async task to finish, returns the final task status.
+# client is an AsyncEngineClient.
+async def refresh_ruleset(client, ruleset_id, label=''):
+    task_path = await client.refresh_ruleset(ruleset_id)
+
+    def report(task_response):
+        print(f"{label}Ruleset refresh status: {task_response.get('status')}, startTime: {task_response.get('startTime')}")
+
+    task_response = await poll_until_done(client, task_path, on_update=report)
+    task_status = task_response.get('status')
+    print(f"{label}Final ruleset refresh status: {task_status}, endTime: {task_response.get('endTime')}")
+    return task_status
+
+# Start a profile (or masking) job and wait for the execution to finish, returns the final job status
+async def run_job_to_completion(client, job_id, label=''):
+    print(f"{label}Triggering job with profileJobId: {job_id}")
+    execute_response = await client.post('executions', headers={'Content-Type': 'application/json'}, json={'jobId': job_id})
+    if execute_response.status_code != 200:
+        raise EngineError(execute_response)
+
+    # Extract the executionId and print the required fields
+    execution_info = execute_response.json()
+    print(f"{label}Job execution response:")
+    print(f"{label}executionId:", execution_info['executionId'])
+    print(f"{label}status:", execution_info['status'])
+    print(f"{label}startTime:", execution_info['startTime'])
+
+    def report(monitor_response):
+        print(f"{label}Current job status:", monitor_response['status'])
+
+    monitor_response = await poll_until_done(client, f"executions/{execution_info['executionId']}", on_update=report)
+    job_status = monitor_response['status']
+    print(f"{label}Final job status:", job_status)
+    return job_status
+
+# Refresh the ruleset of a profile job (a ProfileJob), then run the profile job
+async def refresh_and_profile(client, profile_job):
+    label = f"[{profile_job.job_id}] "
+    try:
+        refresh_status = await refresh_ruleset(client, profile_job.ruleset_id, label)
+        if refresh_status != 'SUCCEEDED':
+            print(f"{label}Ruleset refresh did not succeed, profile job not triggered.")
+            return refresh_status
+        return await run_job_to_completion(client, profile_job.job_id, label)
+    except EngineError as e:
+        print(f"{label}Request to the engine failed. {e}")
+        return 'FAILED'
+
+# Run every refresh -> profile chain at the same time in one event loop, over one async client of the engine.
+# A chain that fails with any other error is reported and counted as FAILED, the other chains keep running.
+async def refresh_and_profile_all(engine, profile_jobs):
+    async with AsyncEngineClient(engine) as client:
+        results = await asyncio.gather(*(refresh_and_profile(client, job) for job in profile_jobs), return_exceptions=True)
+    statuses = []
+    for job, result in zip(profile_jobs, results):
+        if isinstance(result, BaseException):
+            print(f"[{job.job_id}] Refresh and profile failed. {type(result).__name__}: {result}")
+            result = 'FAILED'
+        statuses.append(result)
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh rulesets and run the selected profile jobs.")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    # Create one pooled client for every call made to the engine
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+
+    # Send a POST request to the login URL and keep the authorization token on the client
+    auth_token = engine.login()
+
+    # Check if the authorization token is valid
+    if not auth_token:
+        print("Failed to obtain authorization token. Please check your credentials.")
+        return
+
     print("Login successful!")
     print("Authorization Token:", auth_token)
 
-    # Send a GET request to the profile jobs API
-    profile_jobs_response = requests.get(profile_jobs_url, headers={'Authorization': auth_token}).json()
+    # Fetch every page of the profile jobs API
+    try:
+        profile_jobs = [ProfileJob.from_response(job) for job in engine.paginate('profile-jobs')]
+    except EngineError:
+        profile_jobs = []
 
     # Check if the profile jobs response is valid
-    if profile_jobs_response:
-        print("Profile Jobs (profileJobId, jobName):")
-        for job in profile_jobs_response['responseList']:
-            print(job['profileJobId'], job['jobName'])
+    if not profile_jobs:
+        print("Failed to retrieve profile jobs. Please check the API endpoint and authorization token.")
+        return
 
-        # Add a line break after profile job selection
-        print()
+    print("Profile Jobs (profileJobId, jobName):")
+    for job in profile_jobs:
+        print(job.job_id, job.name)
+
+    # Add a line break after profile job selection
+    print()
+
+    # Add a note about the RuleSet refresh
+    print("NOTE: A RuleSet refresh will run for the associated profile job before the profile job is triggered.")
 
-        # Add a note about the RuleSet refresh
-        print("NOTE: A RuleSet refresh will run for the associated profile job before the profile job is triggered.")
-
-        # Prompt the user to select a job by profileJobId
-        selected_job_id = input("Enter the profileJobId to trigger: ")
-
-        # Check if the selected job ID is valid
-        selected_job = next((job for job in profile_jobs_response['responseList'] if job['profileJobId'] == int(selected_job_id)), None)
-        if selected_job:
-            # Extract the rulesetId from the selected job
-            ruleset_id = selected_job['rulesetId']
-
-            # Trigger ruleset refresh
-            refresh_response = requests.put(f"http://uvo1gukczfceqn0kxdm.vm.cld.sr/masking/api/v5.1.33/database-rulesets/{ruleset_id}/refresh", headers={'Authorization': auth_token}, json={})
-
-            # Monitor the ruleset refresh status
-            async_task_id = refresh_response.json().get('asyncTaskId')
-            while True:
-                task_response = requests.get(f"{async_tasks_url}{async_task_id}", headers={'Authorization': auth_token}).json()
-                task_status = task_response.get('status')
-                start_time = task_response.get('startTime')
-                print(f"Ruleset refresh status: {task_status}, startTime: {start_time}")
-                if task_status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                    end_time = task_response.get('endTime')
-                    print(f"Final ruleset refresh status: {task_status}, endTime: {end_time}")
-                    break
-                time.sleep(10)  # Wait for 10 seconds before checking the status again
-
-            # Add a line break after ruleset refresh
-            print()
-
-            # Trigger the selected job
-            print(f"Triggering job with profileJobId: {selected_job_id}")
-            execute_response = requests.post(execute_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json={'jobId': int(selected_job_id)})
-
-            # Extract the executionId and print the required fields
-            execution_info = execute_response.json()
-            print("Job execution response:")
-            print("executionId:", execution_info['executionId'])
-            print("status:", execution_info['status'])
-            print("startTime:", execution_info['startTime'])
-
-            # Add a line break after the start time of the profile job trigger
-            print()
-
-            # Monitor the job status
-            execution_id = execution_info['executionId']
-            while True:
-                monitor_response = requests.get(f"http://uvo1gukczfceqn0kxdm.vm.cld.sr/masking/api/v5.1.33/executions/{execution_id}", headers={'Authorization': auth_token}).json()
-                job_status = monitor_response['status']
-                print("Current job status:", job_status)
-                if job_status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                    print("Final job status:", job_status)
-                    break
-                time.sleep(10)  # Wait for 10 seconds before checking the status again
-        else:
-            print(f"Error: No job found with the profileJobId '{selected_job_id}'")
+    # Prompt the user to select one or more jobs by profileJobId
+    selected_job_ids = parse_job_ids(input("Enter the profileJobId(s) to trigger (comma-separated or range, e.g., 3,5-7): "))
+
+    # Check if the selected job IDs are valid
+    profile_jobs_by_id = {job.job_id: job for job in profile_jobs}
+    selected_jobs = []
+    if len(selected_job_ids) > len(profile_jobs_by_id):
+        # A wide range: walk the profile jobs that exist instead of every ID in it
+        selected_jobs = [job for job in profile_jobs if job.job_id in selected_job_ids]
     else:
-        print("Failed to retrieve profile jobs. Please check the API endpoint and authorization token.")
-else:
-    print("Failed to obtain authorization token. Please check your credentials.")
+        for job_id in selected_job_ids:
+            if job_id in profile_jobs_by_id:
+                selected_jobs.append(profile_jobs_by_id[job_id])
+            else:
+                print(f"Error: No job found with the profileJobId '{job_id}'")
+
+    if selected_jobs:
+        results = asyncio.run(refresh_and_profile_all(engine, selected_jobs))
+
+        # Add a line break before the summary
+        print()
+        print("Summary (profileJobId, final status):")
+        for job, status in zip(selected_jobs, results):
+            print(job.job_id, status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : benchmark_client_scripts.py
+# Version   : v1
+# Times the real code paths of the scripts against mock_masking_engine.py at several engine sizes.
+# For every case it reports the requests the engine received, the wall time and the peak Python memory of the client.
+# Each case gets a fresh mock engine in a separate process, so its state and memory never mix with the client's.
+# Cases:
+#   list_rulesets         fetch_rulesets (all pages)
+#   status_checks         check_multiple_execution_statuses over every execution id
+#   bulk_create           provision_masking_jobs for every ruleset without a job
+#   bulk_create_legacy    the old option 2 loop: list every job, then create one, per ruleset without a job, with a
+#                         new connection per request (small sizes only)
+#   refresh_profile       refresh_and_profile_all for up to MAX_POLL_CHAINS profile jobs
+# Usage: python benchmark_client_scripts.py [--sizes 10,1000,10000] [--cases status_checks,bulk_create] [--json results.json]
+##################################################################################################################
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+import Interactive_profile_job_with_ruleset_refresh as profile_script
+import masking_job_rs_creation as creation_script
+from masking_engine import EngineClient
+from masking_models import ProfileJob
+
+DEFAULT_SIZES = (10, 1000, 10000)
+
+# The old one-listing-per-job loop is quadratic, it is only run up to this many objects
+LEGACY_MAX_OBJECTS = 1000
+
+# Number of refresh -> profile chains polled at once in refresh_profile
+MAX_POLL_CHAINS = 100
+
+# Mock engine timings used by the benchmark, short so the polling cases finish quickly
+EXECUTION_DURATION = 1.0
+REFRESH_DURATION = 0.5
+
+benchmark_login = {'username': 'benchmark', 'password': 'benchmark'}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Start mock_masking_engine.py in its own process and wait until it answers
+@contextlib.contextmanager
+def mock_engine(objects, latency):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_masking_engine.py'), '--port', str(port), '--objects', str(objects),
+                                '--latency', str(latency), '--execution-duration', str(EXECUTION_DURATION),
+                                '--refresh-duration', str(REFRESH_DURATION)],
+                               stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(600):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/__stats", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        yield f"127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+def engine_stats(host):
+    return requests.get(f"http://{host}/__stats").json()
+
+def reset_stats(host):
+    requests.post(f"http://{host}/__reset")
+
+
+# Ruleset ids that have no masking job yet on the mock engine
+def rulesets_without_jobs(engine):
+    with_jobs = {job['rulesetId'] for job in creation_script.list_masking_jobs(engine)}
+    return [r for r in creation_script.fetch_rulesets(engine) if r['databaseRulesetId'] not in with_jobs]
+
+def case_list_rulesets(engine, objects):
+    creation_script.fetch_rulesets(engine)
+
+def case_status_checks(engine, objects):
+    creation_script.check_multiple_execution_statuses(engine, range(1, objects + 1))
+
+def case_bulk_create(engine, objects, rulesets):
+    creation_script.provision_masking_jobs(engine, [{"rulesetId": r['databaseRulesetId']} for r in rulesets], allow_update=False)
+
+# create_masking_job as the scripts had it before the shared client: one unpaged GET of every masking job to check
+# the name, then the POST, both with plain requests calls
+def legacy_create_masking_job(engine, ruleset_id, ruleset_name):
+    headers = {'accept': 'application/json', 'Authorization': engine.auth_token}
+    response = requests.get(engine.url('masking-jobs'), headers=headers)
+    existing_jobs = response.json().get('responseList', []) if response.status_code == 200 else []
+    if any(job['jobName'] == ruleset_name for job in existing_jobs):
+        return
+    job_data = creation_script.build_job_data(ruleset_id, ruleset_name)
+    requests.post(engine.url('masking-jobs'), headers=dict(headers, **{'Content-Type': 'application/json'}), json=job_data)
+
+def case_bulk_create_legacy(engine, objects, rulesets):
+    for ruleset in rulesets:
+        legacy_create_masking_job(engine, ruleset['databaseRulesetId'], ruleset['rulesetName'])
+
+def case_refresh_profile(engine, objects, profile_jobs):
+    asyncio.run(profile_script.refresh_and_profile_all(engine, profile_jobs))
+
+# Each case: (function, setup) where setup prepares extra arguments without being measured
+cases = {
+    'list_rulesets': (case_list_rulesets, None),
+    'status_checks': (case_status_checks, None),
+    'bulk_create': (case_bulk_create, rulesets_without_jobs),
+    'bulk_create_legacy': (case_bulk_create_legacy, rulesets_without_jobs),
+    'refresh_profile': (case_refresh_profile, lambda engine: [ProfileJob.from_response(job) for job in engine.paginate('profile-jobs')][:MAX_POLL_CHAINS]),
+}
+
+
+# Run one case against a fresh mock engine and return its measurements
+def run_case(name, objects, latency):
+    func, setup = cases[name]
+    with mock_engine(objects, latency) as host:
+        engine = EngineClient(host, token_cache=False, pool_size=20)
+        engine.login(benchmark_login)
+        extra = (setup(engine),) if setup else ()
+        reset_stats(host)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(engine, objects, *extra)
+        wall_time = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = engine_stats(host)
+        engine.close()
+    return {"case": name, "objects": objects, "requests": stats['requests'], "wallTime": wall_time,
+            "peakMemoryMB": peak / 1024 / 1024, "byEndpoint": stats['byEndpoint']}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the masking scripts against a local mock engine.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated engine sizes (number of rulesets)")
+    parser.add_argument('--cases', default=','.join(cases), help="Comma-separated cases to run")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock engine latency per request in milliseconds")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'Case':<22}{'Objects':<10}{'Requests':<12}{'Wall Time (s)':<16}{'Peak Memory (MB)':<18}")
+    print("="*78)
+    for objects in map(int, args.sizes.split(',')):
+        for name in args.cases.split(','):
+            if name == 'bulk_create_legacy' and objects > LEGACY_MAX_OBJECTS:
+                continue
+            result = run_case(name, objects, args.latency)
+            results.append(result)
+            print(f"{name:<22}{objects:<10}{result['requests']:<12}{result['wallTime']:<16.2f}{result['peakMemoryMB']:<18.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : convert_UTC_log_time_to_local_time.py
+# Version   : v1
+# Python version of convert_UTC_log_time_to_local_time.ps1 for large masking logs on any platform.
+# Every yyyy-MM-ddTHH:mm:ss,fffZ timestamp is replaced by the same instant in local time (yyyy-MM-ddTHH:mm:ss,fff).
+# Local time is the time zone of the server this script is run on, or the --timezone given.
+# - The input is memory-mapped and split on line boundaries into chunks converted by worker processes,
+#   chunks are written back in input order so the output lines keep the same order.
+# - The UTC offset is looked up once per DST period, not per line.
+# - A directory converts every file in it into the output directory, keeping the file names.
+# Usage: python convert_UTC_log_time_to_local_time.py masking_logs_UTC.txt masking_logs_local.txt [--timezone Europe/Dublin]
+#        python convert_UTC_log_time_to_local_time.py logs_utc/ logs_local/ [--workers 8] [--chunk-size 32]
+##################################################################################################################
+
+import argparse
+import calendar
+import mmap
+import os
+import re
+from collections import deque
+from datetime import datetime, timezone
+from multiprocessing import Pool
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+# Define the format of the timestamps in the log file
+timestamp_pattern = re.compile(rb'\b(\d{4}-\d{2}-\d{2})T(\d{2}):(\d{2}):(\d{2}),(\d{3})Z\b')
+
+DEFAULT_CHUNK_SIZE_MB = 32
+SECONDS_PER_DAY = 86400
+
+# Longest step used when looking for the end of a DST period, transitions are assumed to be further apart than this
+PERIOD_STEP = SECONDS_PER_DAY
+
+
+# UTC offset of a time zone with the DST period it is valid for.
+# offset(t) only calls into the time zone database when t leaves the current period.
+class OffsetCache:
+    def __init__(self, tz_name=None):
+        self.tz = ZoneInfo(tz_name) if tz_name else None
+        self.start = 0
+        self.end = -1
+        self.current = 0
+
+    def _lookup(self, t):
+        if self.tz:
+            return int(datetime.fromtimestamp(t, self.tz).utcoffset().total_seconds())
+        return int(datetime.fromtimestamp(t, timezone.utc).astimezone().utcoffset().total_seconds())
+
+    # Find the first second after `inside` whose offset differs, searching towards `outside`
+    def _boundary(self, inside, outside, offset):
+        while abs(outside - inside) > 1:
+            middle = (inside + outside) // 2
+            if self._lookup(middle) == offset:
+                inside = middle
+            else:
+                outside = middle
+        return outside
+
+    def _period(self, t, offset, direction):
+        inside = t
+        for _ in range(400):
+            probe = inside + direction * PERIOD_STEP
+            if self._lookup(probe) != offset:
+                return self._boundary(inside, probe, offset)
+            inside = probe
+        # No change for more than a year, the zone does not use DST
+        return inside + direction
+
+    def offset(self, t):
+        if not self.start <= t < self.end:
+            self.current = self._lookup(t)
+            self.start = self._period(t, self.current, -1) + 1
+            self.end = self._period(t, self.current, 1)
+        return self.current
+
+
+# Replaces the UTC timestamps of a block of log text
+class TimestampConverter:
+    def __init__(self, tz_name=None):
+        self.offsets = OffsetCache(tz_name)
+        self.day_starts = {}
+        self.day_names = {}
+
+    # Seconds since the epoch of midnight UTC for a b'yyyy-MM-dd' date, cached per day
+    def _day_start(self, date):
+        day_start = self.day_starts.get(date)
+        if day_start is None:
+            year, month, day = int(date[:4]), int(date[5:7]), int(date[8:10])
+            day_start = self.day_starts[date] = calendar.timegm((year, month, day, 0, 0, 0))
+        return day_start
+
+    # b'yyyy-MM-dd' for a day number since the epoch, cached per day
+    def _day_name(self, day_number):
+        name = self.day_names.get(day_number)
+        if name is None:
+            name = self.day_names[day_number] = datetime.fromtimestamp(day_number * SECONDS_PER_DAY, timezone.utc).strftime('%Y-%m-%d').encode()
+        return name
+
+    def _replace(self, match):
+        date, hours, minutes, seconds, millis = match.groups()
+        utc = self._day_start(date) + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+        local_day, local_seconds = divmod(utc + self.offsets.offset(utc), SECONDS_PER_DAY)
+        hours, rest = divmod(local_seconds, 3600)
+        minutes, seconds = divmod(rest, 60)
+        return b'%sT%02d:%02d:%02d,%s' % (self._day_name(local_day), hours, minutes, seconds, millis)
+
+    def convert(self, data):
+        return timestamp_pattern.sub(self._replace, data)
+
+
+# Converter of the current worker process, built once per process
+_worker_converter = None
+
+def _init_worker(tz_name):
+    global _worker_converter
+    _worker_converter = TimestampConverter(tz_name)
+
+# Convert bytes [start, end) of a file, run in a worker process
+def _convert_chunk(task):
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _worker_converter.convert(data)
+
+
+# Split a file into (path, start, end) chunks of about chunk_size bytes that end on a line boundary
+def split_file(path, chunk_size):
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = data.find(b'\n', min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            yield path, start, end
+            start = end
+
+# Convert one file, at most 2 chunks per worker are in flight so memory stays bounded
+def convert_file(pool, input_path, output_path, chunk_size, workers):
+    pending = deque()
+    with open(output_path, 'wb') as output:
+        for task in split_file(input_path, chunk_size):
+            pending.append(pool.apply_async(_convert_chunk, (task,)))
+            if len(pending) >= 2 * workers:
+                output.write(pending.popleft().get())
+        while pending:
+            output.write(pending.popleft().get())
+
+# List (input file, output file) pairs for a file or a directory of logs
+def list_files(input_path, output_path):
+    if not os.path.isdir(input_path):
+        return [(input_path, output_path)]
+    files = []
+    for root, _, names in os.walk(input_path):
+        for name in sorted(names):
+            source = os.path.join(root, name)
+            target = os.path.join(output_path, os.path.relpath(source, input_path))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            files.append((source, target))
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the UTC timestamps of masking logs to local time.")
+    parser.add_argument('input', help="Log file or directory of log files")
+    parser.add_argument('output', help="Output file, or output directory when the input is a directory")
+    parser.add_argument('--timezone', help="IANA time zone, e.g. Europe/Dublin (default: time zone of this server)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE_MB, help="Chunk size in MB handed to each worker")
+    args = parser.parse_args()
+
+    # Checked here, a time zone the workers cannot load would kill every worker the pool starts
+    if args.timezone:
+        if ZoneInfo is None:
+            parser.error("--timezone needs Python 3.9 or later (zoneinfo)")
+        try:
+            ZoneInfo(args.timezone)
+        except (KeyError, ValueError):
+            parser.error(f"unknown time zone: {args.timezone}")
+
+    files = list_files(args.input, args.output)
+    with Pool(args.workers, initializer=_init_worker, initargs=(args.timezone,)) as pool:
+        for input_path, output_path in files:
+            convert_file(pool, input_path, output_path, args.chunk_size * 1024 * 1024, args.workers)
+            print(f"Log conversion complete. Converted log saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : execution_history.py
+# Version   : v1
+# Local SQLite store of every masking execution the scripts observe, keyed by engine, job and execution.
+# Status checks record rowsMasked, startTime and endTime here instead of throwing them away, and this
+# script reports on them:
+#   report       rows/sec and runs per job
+#   percentiles  duration percentiles per job
+#   trend JOB    rows/sec of the last runs of one job (job ID or name)
+#   regressions  jobs whose recent rows/sec dropped compared to their earlier runs
+# Usage: python execution_history.py report|percentiles|trend|regressions [JOB] [--db execution_history.db]
+##################################################################################################################
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from masking_models import Execution
+
+DEFAULT_HISTORY_DB = os.environ.get('MASKING_HISTORY_DB', os.path.expanduser('~/.local/share/delphix_masking/execution_history.db'))
+
+# Default regression check: compare the median rate of the last 3 runs with the median of the 10 runs before them
+REGRESSION_RECENT_RUNS = 3
+REGRESSION_BASELINE_RUNS = 10
+REGRESSION_THRESHOLD = 0.2
+
+schema = '''
+CREATE TABLE IF NOT EXISTS executions (
+    engine       TEXT    NOT NULL,
+    execution_id INTEGER NOT NULL,
+    job_id       INTEGER,
+    job_name     TEXT,
+    status       TEXT,
+    rows_masked  INTEGER,
+    start_time   REAL,
+    end_time     REAL,
+    observed_at  REAL,
+    PRIMARY KEY (engine, execution_id)
+);
+CREATE INDEX IF NOT EXISTS executions_by_job ON executions (engine, job_id, start_time);
+'''
+
+
+# Value at fraction q (0..1) of a sorted list, interpolating between neighbours
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def median(values):
+    return percentile(sorted(values), 0.5)
+
+
+class ExecutionHistory:
+    def __init__(self, path=DEFAULT_HISTORY_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared by the status-check threads, writes are serialised by the lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(schema)
+        self._lock = threading.Lock()
+
+    # Record an Execution (or an execution response body) as observed now,
+    # a later observation of the same execution replaces it, except for a job name it does not know.
+    # engine_host is EngineClient.host, the same key whatever name a script or fleet file gives the engine.
+    def record(self, engine_host, execution, job_name=None):
+        self.record_many(engine_host, [execution], job_name)
+
+    # Record a batch of executions with one statement and one commit, for listings of thousands of executions
+    def record_many(self, engine_host, executions, job_name=None):
+        now = time.time()
+        rows = []
+        for execution in executions:
+            if isinstance(execution, dict):
+                execution = Execution.from_response(execution)
+            name = job_name or execution.job_name
+            rows.append((engine_host, execution.execution_id, execution.job_id, None if name == 'Unknown' else name, execution.status,
+                         execution.rows_masked, execution.start_time, execution.end_time, now))
+        if not rows:
+            return
+        with self._lock:
+            self.db.executemany('INSERT INTO executions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                                'ON CONFLICT (engine, execution_id) DO UPDATE SET '
+                                'job_id = excluded.job_id, job_name = COALESCE(excluded.job_name, executions.job_name), '
+                                'status = excluded.status, rows_masked = excluded.rows_masked, start_time = excluded.start_time, '
+                                'end_time = excluded.end_time, observed_at = excluded.observed_at', rows)
+            self.db.commit()
+
+    # Finished, successful runs with a duration, oldest first: (engine, job_id, job_name, rows_masked, duration)
+    def completed_runs(self, job=None):
+        query = ('SELECT engine, job_id, job_name, rows_masked, end_time - start_time FROM executions '
+                 "WHERE status = 'SUCCEEDED' AND end_time > start_time")
+        params = ()
+        if job is not None:
+            query += ' AND (CAST(job_id AS TEXT) = ? OR job_name = ?)'
+            params = (str(job), str(job))
+        with self._lock:
+            return self.db.execute(query + ' ORDER BY start_time', params).fetchall()
+
+    # Runs grouped per (engine, job_id), keeping the latest job name
+    def _runs_by_job(self, job=None):
+        jobs = {}
+        for engine, job_id, job_name, rows_masked, duration in self.completed_runs(job):
+            entry = jobs.setdefault((engine, job_id), {"jobName": job_name, "runs": []})
+            entry["jobName"] = job_name or entry["jobName"]
+            entry["runs"].append((rows_masked, duration))
+        return jobs
+
+    # Median duration in seconds of the last `limit` successful runs of a job on an engine, None without history
+    def expected_duration(self, engine_host, job_id, limit=REGRESSION_BASELINE_RUNS):
+        with self._lock:
+            rows = self.db.execute('SELECT end_time - start_time FROM executions '
+                                   "WHERE engine = ? AND job_id = ? AND status = 'SUCCEEDED' AND end_time > start_time "
+                                   'ORDER BY start_time DESC LIMIT ?', (engine_host, job_id, limit)).fetchall()
+        return median([duration for duration, in rows])
+
+    # (rows_masked, duration) of the last successful run of a job on an engine, None without history
+    def last_run(self, engine_host, job_id):
+        with self._lock:
+            return self.db.execute('SELECT rows_masked, end_time - start_time FROM executions '
+                                   "WHERE engine = ? AND job_id = ? AND status = 'SUCCEEDED' AND end_time > start_time "
+                                   'ORDER BY start_time DESC LIMIT 1', (engine_host, job_id)).fetchone()
+
+    # Rows the next run of a job is expected to mask: the rows masked by its last successful run
+    def expected_rows(self, engine_host, job_id):
+        run = self.last_run(engine_host, job_id)
+        return run[0] if run else None
+
+    # (status, rows_masked, observed_at) of the last time this execution was recorded, None if never
+    def last_observation(self, engine_host, execution_id):
+        with self._lock:
+            return self.db.execute('SELECT status, rows_masked, observed_at FROM executions WHERE engine = ? AND execution_id = ?',
+                                   (engine_host, execution_id)).fetchone()
+
+    # Rows/sec per job: runs, average rate and the rate of the last run
+    def throughput(self):
+        report = []
+        for (engine, job_id), entry in sorted(self._runs_by_job().items(), key=lambda item: str(item[0])):
+            rates = [rows / duration for rows, duration in entry["runs"] if rows is not None]
+            report.append({"engine": engine, "jobId": job_id, "jobName": entry["jobName"], "runs": len(entry["runs"]),
+                           "avgRate": sum(rates) / len(rates) if rates else None, "lastRate": rates[-1] if rates else None})
+        return report
+
+    # Duration percentiles (p50, p90, p99) per job
+    def duration_percentiles(self):
+        report = []
+        for (engine, job_id), entry in sorted(self._runs_by_job().items(), key=lambda item: str(item[0])):
+            durations = sorted(duration for _, duration in entry["runs"])
+            report.append({"engine": engine, "jobId": job_id, "jobName": entry["jobName"], "runs": len(durations),
+                           "p50": percentile(durations, 0.5), "p90": percentile(durations, 0.9), "p99": percentile(durations, 0.99)})
+        return report
+
+    # The last `limit` runs of one job (job ID or name) with their rate, oldest first
+    def trend(self, job, limit=20):
+        runs = self.completed_runs(job)[-limit:]
+        return [{"engine": engine, "jobId": job_id, "jobName": job_name, "rowsMasked": rows, "duration": duration,
+                 "rate": rows / duration if rows is not None else None}
+                for engine, job_id, job_name, rows, duration in runs]
+
+    # Jobs whose median rate over the recent runs is more than `threshold` below the median of the runs before them
+    def regressions(self, recent=REGRESSION_RECENT_RUNS, baseline=REGRESSION_BASELINE_RUNS, threshold=REGRESSION_THRESHOLD):
+        report = []
+        for (engine, job_id), entry in self._runs_by_job().items():
+            rates = [rows / duration for rows, duration in entry["runs"] if rows is not None]
+            if len(rates) < recent + 1:
+                continue
+            recent_rate = median(rates[-recent:])
+            baseline_rate = median(rates[-recent - baseline:-recent])
+            if baseline_rate and recent_rate < baseline_rate * (1 - threshold):
+                report.append({"engine": engine, "jobId": job_id, "jobName": entry["jobName"],
+                               "baselineRate": baseline_rate, "recentRate": recent_rate,
+                               "change": recent_rate / baseline_rate - 1})
+        return sorted(report, key=lambda item: item["change"])
+
+    def close(self):
+        self.db.close()
+
+
+def format_number(value, digits=1):
+    return 'Unknown' if value is None else f"{value:,.{digits}f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on the masking executions recorded by the scripts.")
+    parser.add_argument('report', choices=['report', 'percentiles', 'trend', 'regressions'])
+    parser.add_argument('job', nargs='?', help="With trend, the job ID or job name")
+    parser.add_argument('--db', default=DEFAULT_HISTORY_DB, help="History database file")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="With regressions, relative drop in rows/sec to report")
+    args = parser.parse_args()
+
+    history = ExecutionHistory(args.db)
+    if args.report == 'report':
+        print(f"{'Engine':<25}{'Job ID':<10}{'Job Name':<30}{'Runs':<8}{'Avg Rows/sec':<16}{'Last Rows/sec':<16}")
+        print("="*105)
+        for row in history.throughput():
+            print(f"{row['engine']:<25}{row['jobId']:<10}{str(row['jobName']):<30}{row['runs']:<8}{format_number(row['avgRate']):<16}{format_number(row['lastRate']):<16}")
+    elif args.report == 'percentiles':
+        print(f"{'Engine':<25}{'Job ID':<10}{'Job Name':<30}{'Runs':<8}{'p50 (s)':<12}{'p90 (s)':<12}{'p99 (s)':<12}")
+        print("="*109)
+        for row in history.duration_percentiles():
+            print(f"{row['engine']:<25}{row['jobId']:<10}{str(row['jobName']):<30}{row['runs']:<8}{format_number(row['p50']):<12}{format_number(row['p90']):<12}{format_number(row['p99']):<12}")
+    elif args.report == 'trend':
+        if not args.job:
+            parser.error("trend needs a job ID or job name")
+        print(f"{'Engine':<25}{'Job ID':<10}{'Rows Masked':<15}{'Duration (s)':<15}{'Rows/sec':<12}")
+        print("="*77)
+        for row in history.trend(args.job):
+            print(f"{row['engine']:<25}{row['jobId']:<10}{str(row['rowsMasked']):<15}{format_number(row['duration']):<15}{format_number(row['rate']):<12}")
+    else:
+        print(f"{'Engine':<25}{'Job ID':<10}{'Job Name':<30}{'Before Rows/sec':<18}{'Recent Rows/sec':<18}{'Change':<8}")
+        print("="*109)
+        for row in history.regressions(threshold=args.threshold):
+            print(f"{row['engine']:<25}{row['jobId']:<10}{str(row['jobName']):<30}{format_number(row['baselineRate']):<18}{format_number(row['recentRate']):<18}{row['change']:+.0%}")
+    history.close()
+
+if __name__ == "__main__":
+    main()
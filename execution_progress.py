@@ -0,0 +1,162 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : execution_progress.py
+# Version   : v1
+# Progress of running masking executions sampled over time, for the status tables and masking_watch.py.
+# Every time an execution is seen its rowsMasked is added to a small ring buffer of samples (the last RING_SIZE),
+# from which the tracker gives:
+# - the instantaneous rows/sec between the last two samples
+# - a smoothed rows/sec (EWMA weighted by the time between samples, so irregular sampling is fine)
+# - an ETA from the rows masked by the last successful run of the same job (execution_history.py)
+# - a flag: STALLED when rowsMasked has not moved for STALL_SECONDS, SLOW when the smoothed rate fell below
+#   SLOW_FRACTION of the job's last run rate (or of the best rate seen so far when the job has no history)
+# The first sample of an execution can come from its last observation in the history, so a status check in a
+# new process already shows a rate.
+##################################################################################################################
+
+import math
+import time
+from collections import deque
+
+from execution_history import format_number
+from masking_engine import TERMINAL_STATUSES
+
+# Samples kept per execution
+RING_SIZE = 20
+
+# Time constant (seconds) of the smoothed rate: a sample dt seconds after the previous one weighs 1 - exp(-dt / EWMA_WINDOW)
+EWMA_WINDOW = 60.0
+
+# Stall detection
+STALL_SECONDS = 300.0
+SLOW_FRACTION = 0.25
+# Samples needed before an execution can be flagged SLOW
+MIN_SAMPLES = 3
+
+
+# Rows/sec as 1,234.5, blank until there are two samples
+def format_rate(value):
+    return '' if value is None else format_number(value)
+
+# "2h 05m", "12m 30s", "45s", blank when unknown
+def format_duration(seconds):
+    if seconds is None or math.isnan(seconds):
+        return ''
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+# Samples and rates of one execution
+class ExecutionProgress:
+    __slots__ = ('samples', 'smoothed_rate', 'peak_rate', 'expected_rows', 'reference_rate', 'last_change', 'status')
+
+    def __init__(self, expected_rows=None, reference_rate=None):
+        self.samples = deque(maxlen=RING_SIZE)
+        self.smoothed_rate = None
+        self.peak_rate = None
+        self.expected_rows = expected_rows
+        self.reference_rate = reference_rate
+        # Time rowsMasked last changed
+        self.last_change = None
+        self.status = None
+
+    def add(self, t, rows, status=None):
+        self.status = status
+        if rows is None:
+            return
+        if self.samples:
+            last_t, last_rows = self.samples[-1]
+            if t <= last_t:
+                return
+            if rows < last_rows:
+                # The engine restarted the count, start over
+                self.samples.clear()
+                self.smoothed_rate = None
+            else:
+                rate = (rows - last_rows) / (t - last_t)
+                weight = 1 - math.exp(-(t - last_t) / EWMA_WINDOW)
+                self.smoothed_rate = rate if self.smoothed_rate is None else self.smoothed_rate + weight * (rate - self.smoothed_rate)
+                self.peak_rate = max(self.peak_rate or 0.0, self.smoothed_rate)
+                if rows != last_rows:
+                    self.last_change = t
+        if self.last_change is None:
+            self.last_change = t
+        self.samples.append((t, rows))
+
+    @property
+    def rows(self):
+        return self.samples[-1][1] if self.samples else None
+
+    # Rows/sec between the last two samples
+    @property
+    def rate(self):
+        if len(self.samples) < 2:
+            return None
+        (t0, rows0), (t1, rows1) = self.samples[-2], self.samples[-1]
+        return (rows1 - rows0) / (t1 - t0)
+
+    # Seconds left at the smoothed rate until the rows of the last run are masked, None when unknown
+    @property
+    def eta(self):
+        if not self.expected_rows or not self.smoothed_rate or self.rows is None:
+            return None
+        return max(self.expected_rows - self.rows, 0) / self.smoothed_rate
+
+    @property
+    def percent(self):
+        if not self.expected_rows or self.rows is None:
+            return None
+        return min(100.0, 100.0 * self.rows / self.expected_rows)
+
+    # 'STALLED', 'SLOW' or '' for a running execution, '' once it finished
+    def flag(self, now=None):
+        if self.status in TERMINAL_STATUSES or len(self.samples) < 2:
+            return ''
+        now = self.samples[-1][0] if now is None else now
+        if self.last_change is not None and now - self.last_change >= STALL_SECONDS:
+            return 'STALLED'
+        reference = self.reference_rate or self.peak_rate
+        if len(self.samples) >= MIN_SAMPLES and reference and self.smoothed_rate is not None and self.smoothed_rate < SLOW_FRACTION * reference:
+            return 'SLOW'
+        return ''
+
+
+# Progress of every execution seen on one engine (its EngineClient.host). history (an ExecutionHistory) gives the expected rows and
+# rate of each job's last run, and the last recorded observation of an execution as its first sample.
+class ProgressTracker:
+    def __init__(self, engine_host, history=None):
+        self.engine_host = engine_host
+        self.history = history
+        self.progress = {}
+        # jobId -> (expected rows, rows/sec) of the job's last successful run
+        self._last_runs = {}
+
+    def _last_run(self, job_id):
+        if job_id not in self._last_runs:
+            run = self.history.last_run(self.engine_host, job_id) if self.history and job_id is not None else None
+            rows, duration = run if run else (None, None)
+            self._last_runs[job_id] = (rows, rows / duration if rows and duration else None)
+        return self._last_runs[job_id]
+
+    # Add a sample of an Execution, call it before the execution is recorded in the history.
+    # now is the time the execution was read, default the current time.
+    def observe(self, execution, now=None):
+        now = time.time() if now is None else now
+        progress = self.progress.get(execution.execution_id)
+        if progress is None:
+            expected_rows, reference_rate = self._last_run(execution.job_id)
+            progress = self.progress[execution.execution_id] = ExecutionProgress(expected_rows, reference_rate)
+            previous = self.history.last_observation(self.engine_host, execution.execution_id) if self.history else None
+            if previous and previous[0] not in TERMINAL_STATUSES:
+                progress.add(previous[2], previous[1], previous[0])
+        progress.add(now, execution.rows_masked, execution.status)
+        return progress
+
+    def get(self, execution_id):
+        return self.progress.get(execution_id)
@@ -0,0 +1,206 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : export_ruleset_metadata.py
+# Version   : v1
+# Exports what every database ruleset covers: one row per column with its table, algorithm and domain.
+# Built for rulesets with tens of thousands of columns:
+# - rulesets and table-metadata are listed once, only the tables (id -> ruleset, table name) are kept in memory.
+# - column-metadata is streamed page by page (pages fetched concurrently) and every row is written as soon as
+#   its page arrives, so memory does not grow with the number of columns.
+# - tables and columns are listed either with one filtered listing per ruleset/table (ruleset_id,
+#   table_metadata_id, several at once) or with one pass over the whole listing joined on the client,
+#   whichever needs fewer requests.
+# - pages and tables are written in engine order, so two exports of the same engine can be diffed.
+# Formats: csv, jsonl, and parquet when pyarrow is installed (written in row groups of PARQUET_ROW_GROUP rows).
+# Usage: python export_ruleset_metadata.py coverage.csv [--ruleset 12,15-20] [--format csv|jsonl|parquet] [--workers 4]
+##################################################################################################################
+
+import argparse
+import csv
+import json
+import math
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from masking_engine import (DEFAULT_PAGE_SIZE, DEFAULT_PAGE_WORKERS, EngineClient, EngineError, add_metrics_arguments,
+                            enable_metrics, parse_id_ranges)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # Parquet output is optional, csv and jsonl work without pyarrow
+    pyarrow = None
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+# Columns of the export: (output name, source, field) where source is ruleset, table or column
+EXPORT_COLUMNS = [
+    ('rulesetId', 'ruleset', 'databaseRulesetId'),
+    ('rulesetName', 'ruleset', 'rulesetName'),
+    ('connectorId', 'ruleset', 'databaseConnectorId'),
+    ('tableMetadataId', 'table', 'tableMetadataId'),
+    ('tableName', 'table', 'tableName'),
+    ('columnMetadataId', 'column', 'columnMetadataId'),
+    ('columnName', 'column', 'columnName'),
+    ('dataType', 'column', 'dataType'),
+    ('isMasked', 'column', 'isMasked'),
+    ('algorithmName', 'column', 'algorithmName'),
+    ('domainName', 'column', 'domainName'),
+]
+
+PARQUET_ROW_GROUP = 50000
+
+
+# Writes export rows one at a time in csv, jsonl or parquet
+class MetadataWriter:
+    def __init__(self, path, output_format):
+        self.format = output_format
+        self.names = [name for name, _, _ in EXPORT_COLUMNS]
+        self.rows = 0
+        if output_format == 'parquet':
+            self.schema = pyarrow.schema([(name, pyarrow.bool_() if name == 'isMasked' else
+                                           pyarrow.int64() if name.endswith('Id') else pyarrow.string()) for name in self.names])
+            self.file = pyarrow.parquet.ParquetWriter(path, self.schema)
+            self.batch = []
+        else:
+            self.file = open(path, 'w', newline='') if path != '-' else sys.stdout
+            if output_format == 'csv':
+                self.csv = csv.writer(self.file)
+                self.csv.writerow(self.names)
+
+    def write(self, row):
+        self.rows += 1
+        if self.format == 'csv':
+            self.csv.writerow(['' if value is None else value for value in row])
+        elif self.format == 'jsonl':
+            self.file.write(json.dumps(dict(zip(self.names, row))) + '\n')
+        else:
+            self.batch.append(row)
+            if len(self.batch) >= PARQUET_ROW_GROUP:
+                self._flush_batch()
+
+    def _flush_batch(self):
+        columns = {name: [row[i] for row in self.batch] for i, name in enumerate(self.names)}
+        self.file.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+        self.batch = []
+
+    def close(self):
+        if self.format == 'parquet':
+            if self.batch:
+                self._flush_batch()
+            self.file.close()
+        elif self.file is not sys.stdout:
+            self.file.close()
+
+
+def export_row(ruleset, table, column):
+    sources = {'ruleset': ruleset, 'table': table, 'column': column}
+    return [sources[source].get(field) for _, source, field in EXPORT_COLUMNS]
+
+# Whether one pass over the whole listing of path takes fewer requests than `filtered` filtered listings
+def whole_listing_is_cheaper(engine, path, filtered):
+    _, total = engine.fetch_page(path, 1, 1)
+    return total is not None and math.ceil(total / DEFAULT_PAGE_SIZE) < filtered
+
+# Selected rulesets and their tables, in engine order: [(ruleset, [table, ...])]
+def list_ruleset_tables(engine, ruleset_ids=None, workers=DEFAULT_PAGE_WORKERS):
+    rulesets = [r for r in engine.paginate('database-rulesets', ordered=True)
+                if ruleset_ids is None or r['databaseRulesetId'] in ruleset_ids]
+    if whole_listing_is_cheaper(engine, 'table-metadata', len(rulesets)):
+        tables_by_ruleset = {r['databaseRulesetId']: [] for r in rulesets}
+        for table in engine.paginate('table-metadata', ordered=True, workers=workers):
+            if table.get('rulesetId') in tables_by_ruleset:
+                tables_by_ruleset[table['rulesetId']].append(table)
+        return [(r, tables_by_ruleset[r['databaseRulesetId']]) for r in rulesets]
+
+    def tables(ruleset):
+        return ruleset, list(engine.paginate('table-metadata', params={'ruleset_id': ruleset['databaseRulesetId']}, ordered=True))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(tables, rulesets))
+
+# Column rows of the given tables, one filtered column-metadata listing per table with `workers` tables in flight,
+# written in table order
+def columns_by_table(engine, ruleset_tables, workers):
+    def columns(table):
+        return list(engine.paginate('column-metadata', params={'table_metadata_id': table['tableMetadataId']}, ordered=True, workers=1))
+    tables = ((ruleset, table) for ruleset, ruleset_table_list in ruleset_tables for table in ruleset_table_list)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for ruleset, table in tables:
+            window.append((ruleset, table, executor.submit(columns, table)))
+            if len(window) >= 2 * workers:
+                yield from table_rows(*window.popleft())
+        while window:
+            yield from table_rows(*window.popleft())
+
+def table_rows(ruleset, table, future):
+    for column in future.result():
+        yield export_row(ruleset, table, column)
+
+# Column rows of the selected tables from one pass over the whole column-metadata listing
+def columns_by_listing(engine, ruleset_tables, workers):
+    table_index = {table['tableMetadataId']: (ruleset, table) for ruleset, tables in ruleset_tables for table in tables}
+    for column in engine.paginate('column-metadata', ordered=True, workers=workers):
+        entry = table_index.get(column.get('tableMetadataId'))
+        if entry:
+            yield export_row(entry[0], entry[1], column)
+
+# Stream every column row of the selected rulesets into the writer, picking the cheaper way to list the columns
+def export_metadata(engine, writer, ruleset_ids=None, workers=DEFAULT_PAGE_WORKERS):
+    ruleset_tables = list_ruleset_tables(engine, ruleset_ids, workers)
+    table_count = sum(len(tables) for _, tables in ruleset_tables)
+    if whole_listing_is_cheaper(engine, 'column-metadata', table_count):
+        print(f"Exporting {len(ruleset_tables)} rulesets, {table_count} tables from the whole column listing", file=sys.stderr)
+        rows = columns_by_listing(engine, ruleset_tables, workers)
+    else:
+        print(f"Exporting {len(ruleset_tables)} rulesets, {table_count} tables one table at a time", file=sys.stderr)
+        rows = columns_by_table(engine, ruleset_tables, workers)
+    for row in rows:
+        writer.write(row)
+    return writer.rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the table and column metadata of database rulesets.")
+    parser.add_argument('output', help="Output file, - for standard output")
+    parser.add_argument('--ruleset', help="Only export these ruleset IDs, e.g. 12,15-20 (default: all)")
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help="Output format (default: from the file extension, else csv)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_PAGE_WORKERS, help="Pages or tables fetched at once")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    output_format = args.format or {'jsonl': 'jsonl', 'parquet': 'parquet'}.get(args.output.rsplit('.', 1)[-1], 'csv')
+    if output_format == 'parquet' and pyarrow is None:
+        parser.error("parquet output needs pyarrow (pip install pyarrow)")
+    try:
+        ruleset_ids = parse_id_ranges(args.ruleset) if args.ruleset else None
+    except ValueError:
+        parser.error("--ruleset takes ruleset IDs such as 12,15-20")
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    writer = MetadataWriter(args.output, output_format)
+    try:
+        rows = export_metadata(engine, writer, ruleset_ids, args.workers)
+    except EngineError as e:
+        print("Failed to retrieve ruleset metadata.", file=sys.stderr)
+        print(e, file=sys.stderr)
+        return
+    finally:
+        writer.close()
+    print(f"Exported {rows} columns to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -13,65 +13,56 @@
 # 4. Create Masking Job: Prompts the user for a ruleset ID to create a new masking job with the same name as the RuleSet.
 # 5. Create a masking job
 # 6. Run a masking job
-# 7. Check job execution status 
+# 7. Check job execution status: by execution IDs and/or filters such as job=12 status=FAILED since=today
 # 8. Exit: Exits the script
 ##################################################################################################################
 
-import requests
+import argparse
 import json
-from datetime import datetime
-
-# Define the API URLs and headers
-login_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/login'
-rulesets_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/database-rulesets?page_number=1'
-create_masking_job_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/masking-jobs'
-masking_jobs_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/masking-jobs?page_number=1'
-run_masking_job_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/executions'
-execution_status_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/executions/'
-job_details_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/masking-jobs/'
-connectors_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/database-connectors?page_number=1'
-database_ruleset_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/database-rulesets'
-
-headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
-}
-
-login_data = {
-    'username': 'admin',
-    'password': 'Delphix_123!'
-}
-
-def login():
-    response = requests.post(login_url, headers=headers, json=login_data)
-    if response.status_code == 200:
-        return response.json().get('Authorization')
-    else:
-        print("Login failed. Please check your credentials and API endpoint.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
-        return None
-
-def fetch_rulesets(auth_token):
-    response = requests.get(rulesets_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
+from execution_history import ExecutionHistory
+from execution_progress import ProgressTracker
+from masking_engine import (EngineClient, EngineError, add_cache_arguments, add_metrics_arguments, enable_metrics,
+                            open_response_cache)
+from masking_job_rs_creation import (TunedSettings, apply_job_settings, check_execution_statuses_by_query, masking_job_names,
+                                     parse_status_query, remember_masking_job)
+from masking_engine_async import run_sync
+from masking_models import Connector, MaskingJob, Ruleset
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+def login(engine):
+    return engine.login()
+
+def fetch_rulesets(engine):
+    try:
+        return [Ruleset.from_response(r) for r in engine.paginate('database-rulesets')]
+    except EngineError as e:
         print("Failed to retrieve rulesets.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        print(e)
         return []
 
-def list_masking_jobs(auth_token):
-    response = requests.get(masking_jobs_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
+def list_masking_jobs(engine):
+    try:
+        return [MaskingJob.from_response(job) for job in engine.paginate('masking-jobs')]
+    except EngineError as e:
         print("Failed to retrieve masking jobs.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        print(e)
         return []
 
-def create_masking_job(auth_token, ruleset_id, ruleset_name):
-    existing_jobs = list_masking_jobs(auth_token)
-    if any(job['jobName'] == ruleset_name for job in existing_jobs):
+def create_masking_job(engine, ruleset_id, ruleset_name):
+    try:
+        job_names = masking_job_names(engine)
+    except EngineError as e:
+        print("Failed to retrieve masking jobs.")
+        print(e)
+        return
+    if ruleset_name in job_names:
         print(f"Failed to create masking job. '{ruleset_name}' already exists")
         return
 
@@ -95,130 +86,74 @@ def create_masking_job(auth_token, ruleset_id, ruleset_name):
             }
         }
     }
-    response = requests.post(create_masking_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=job_data)
-    if response.status_code == 200:
-        job_response = response.json()
-        print("\nMasking Job Details:")
-        print("maskingJobId:", job_response.get('maskingJobId', 'Unknown'))
-        print("jobName:", job_response.get('jobName', 'Unknown'))
-        print("rulesetId:", job_response.get('rulesetId', 'Unknown'))
-        print("Masking job created successfully!")
-    else:
+    # Start from the settings masking_job_tuner.py found fastest for this ruleset, if any
+    apply_job_settings(job_data, TunedSettings().get(engine.name, ruleset_id))
+    try:
+        job_response = run_sync(engine, lambda client: client.create_masking_job(job_data))
+    except EngineError as e:
         print("Failed to create masking job.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
-
-def run_masking_job(auth_token, job_id):
-    job_data = {
-        "jobId": job_id
-    }
-    response = requests.post(run_masking_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=job_data)
-    if response.status_code == 200:
-        execution_id = response.json().get('executionId')
-        return execution_id
-    else:
+        print(e)
+        return
+    remember_masking_job(engine, ruleset_name)
+    print("\nMasking Job Details:")
+    print("maskingJobId:", job_response.get('maskingJobId', 'Unknown'))
+    print("jobName:", job_response.get('jobName', 'Unknown'))
+    print("rulesetId:", job_response.get('rulesetId', 'Unknown'))
+    print("Masking job created successfully!")
+
+def run_masking_job(engine, job_id):
+    try:
+        return run_sync(engine, lambda client: client.run_job(job_id))
+    except EngineError as e:
         print(f"Failed to execute masking job {job_id}.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        print(e)
         return None
 
-def fetch_job_details(auth_token, job_id):
-    response = requests.get(f"{job_details_url}{job_id}", headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        job_details = response.json()
-        return {
-            "jobId": job_id,
-            "jobName": job_details.get('jobName', 'Unknown')
-        }
-    else:
-        print(f"Failed to retrieve details for Job ID {job_id}.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
-        return {
-            "jobId": job_id,
-            "jobName": 'Unknown'
-        }
-
-def format_datetime(dt_str):
+def fetch_connectors(engine):
     try:
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%dT%H:%M:%S')
-    except ValueError:
-        return 'Unknown'
-
-def check_execution_status(auth_token, execution_id):
-    response = requests.get(f"{execution_status_url}{execution_id}", headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        execution_details = response.json()
-        job_id = execution_details.get('jobId')
-        job_details = fetch_job_details(auth_token, job_id)
-        return {
-            "executionId": execution_id,
-            "jobId": job_details["jobId"],
-            "jobName": job_details["jobName"],
-            "status": execution_details.get('status', 'Unknown'),
-            "rowsMasked": execution_details.get('rowsMasked', 'Unknown'),
-            "startTime": format_datetime(execution_details.get('startTime', 'Unknown')),
-            "endTime": format_datetime(execution_details.get('endTime', 'Unknown'))
-        }
-    else:
-        print(f"Failed to retrieve status for Execution ID {execution_id}. Response Code: {response.status_code}")
-        print(f"Response: {response.text}")
-        return None
-
-def check_multiple_execution_statuses(auth_token, execution_ids):
-    statuses = [check_execution_status(auth_token, execution_id) for execution_id in execution_ids]
-    
-    # Print header
-    print("\nJob Execution Status:")
-    print(f"{'Execution ID':<15}{'Job ID':<10}{'Job Name':<20}{'Status':<10}{'Rows Masked':<12}{'Start Time':<20}{'End Time':<20}")
-    print("="*120)
-    
-    # Print details
-    for status in statuses:
-        if status:
-            print(f"{status['executionId']:<15}{status['jobId']:<10}{status['jobName']:<20}{status['status']:<10}{status['rowsMasked']:<12}{status['startTime']:<20}{status['endTime']:<20}")
-
-def parse_job_ids(input_str):
-    job_ids = []
-    for part in input_str.split(','):
-        if '-' in part:
-            start, end = map(int, part.split('-'))
-            job_ids.extend(range(start, end + 1))
-        else:
-            job_ids.append(int(part.strip()))
-    return job_ids
-
-def fetch_connectors(auth_token):
-    response = requests.get(connectors_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
+        return [Connector.from_response(c) for c in engine.paginate('database-connectors')]
+    except EngineError as e:
         print("Failed to retrieve connectors.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        print(e)
         return []
 
-def create_database_ruleset(auth_token, connector_id, ruleset_name):
+def create_database_ruleset(engine, connector_id, ruleset_name):
     ruleset_data = {
         "rulesetName": ruleset_name,
         "databaseConnectorId": connector_id
     }
-    response = requests.post(database_ruleset_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=ruleset_data)
-    if response.status_code == 200:
-        ruleset_response = response.json()
-        print("\nDatabase Ruleset Details:")
-        if 'databaseRulesetId' in ruleset_response and 'rulesetName' in ruleset_response and 'databaseConnectorId' in ruleset_response:
-            print("databaseRulesetId:", ruleset_response['databaseRulesetId'])
-            print("rulesetName:", ruleset_response['rulesetName'])
-            print("databaseConnectorId:", ruleset_response['databaseConnectorId'])
-        else:
-            print("Database ruleset created but missing expected keys.")
-            print("Debug Info: Response JSON:", ruleset_response)
-    else:
+    try:
+        ruleset_response = run_sync(engine, lambda client: client.create_database_ruleset(ruleset_data))
+    except EngineError as e:
         print("Failed to create database ruleset.")
-        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        print(e)
+        return
+    print("\nDatabase Ruleset Details:")
+    if 'databaseRulesetId' in ruleset_response and 'rulesetName' in ruleset_response and 'databaseConnectorId' in ruleset_response:
+        print("databaseRulesetId:", ruleset_response['databaseRulesetId'])
+        print("rulesetName:", ruleset_response['rulesetName'])
+        print("databaseConnectorId:", ruleset_response['databaseConnectorId'])
+    else:
+        print("Database ruleset created but missing expected keys.")
+        print("Debug Info: Response JSON:", ruleset_response)
 
 def main():
-    auth_token = login()
+    parser = argparse.ArgumentParser(description="Interactive masking menu.")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE,
+                          response_cache=open_response_cache(args.no_cache))
+    auth_token = login(engine)
     if not auth_token:
         return
+
+    # Keep every execution status we see for the throughput reports of execution_history.py
+    history = ExecutionHistory()
+    # Rows/sec and ETA of running executions, sampled every time their status is checked
+    progress = ProgressTracker(engine.host, history)
     
     while True:
         print("\nInteractive Masking Menu")
@@ -234,40 +169,34 @@ def main():
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            rulesets = fetch_rulesets(auth_token)
+            rulesets = fetch_rulesets(engine)
             print("\nExisting Rulesets:")
             print(f"{'Ruleset ID':<15}{'Ruleset Name':<30}")
             print("="*45)
             for ruleset in rulesets:
-                ruleset_id = ruleset.get('databaseRulesetId', 'Unknown')
-                ruleset_name = ruleset.get('rulesetName', 'Unknown')
-                print(f"{ruleset_id:<15}{ruleset_name:<30}")
+                print(f"{ruleset.ruleset_id:<15}{ruleset.name:<30}")
 
         elif choice == '2':
-            connectors = fetch_connectors(auth_token)
+            connectors = fetch_connectors(engine)
             print("\nExisting Connectors:")
             print(f"{'Connector ID':<15}{'Connector Name':<30}")
             print("="*45)
             for connector in connectors:
-                connector_id = connector.get('databaseConnectorId', 'Unknown')
-                connector_name = connector.get('connectorName', 'Unknown')
-                print(f"{connector_id:<15}{connector_name:<30}")
+                print(f"{connector.connector_id:<15}{connector.name:<30}")
 
         elif choice == '3':
-            masking_jobs = list_masking_jobs(auth_token)
+            masking_jobs = list_masking_jobs(engine)
             print("\nExisting Masking Jobs:")
             print(f"{'Job ID':<10}{'Job Name':<30}")
             print("="*40)
             for job in masking_jobs:
-                job_id = job.get('maskingJobId', 'Unknown')
-                job_name = job.get('jobName', 'Unknown')
-                print(f"{job_id:<10}{job_name:<30}")
+                print(f"{job.job_id:<10}{job.name:<30}")
 
         elif choice == '4':
             try:
                 connector_id = int(input("Enter the connector ID for the new ruleset: "))
                 ruleset_name = input("Enter the name for the new ruleset: ")
-                create_database_ruleset(auth_token, connector_id, ruleset_name)
+                create_database_ruleset(engine, connector_id, ruleset_name)
             except ValueError:
                 print("Invalid input. Please enter a numeric connector ID.")
 
@@ -275,14 +204,14 @@ def main():
             try:
                 ruleset_id = int(input("Enter the ruleset ID: "))
                 ruleset_name = input("Enter the name for the masking job: ")
-                create_masking_job(auth_token, ruleset_id, ruleset_name)
+                create_masking_job(engine, ruleset_id, ruleset_name)
             except ValueError:
                 print("Invalid input. Please enter a numeric ruleset ID.")
 
         elif choice == '6':
             try:
                 job_id = int(input("Enter the job ID: "))
-                execution_id = run_masking_job(auth_token, job_id)
+                execution_id = run_masking_job(engine, job_id)
                 if execution_id:
                     print(f"Masking job {job_id} started with execution ID {execution_id}.")
                 else:
@@ -291,9 +220,13 @@ def main():
                 print("Invalid input. Please enter a numeric job ID.")
 
         elif choice == '7':
-            execution_ids_str = input("Enter execution IDs (comma-separated or range, e.g., 1-3): ")
-            execution_ids = parse_job_ids(execution_ids_str)
-            check_multiple_execution_statuses(auth_token, execution_ids)
+            query_str = input("Enter execution IDs (comma-separated or range, e.g., 1-3) and/or filters, e.g. job=12 status=FAILED since=today, or all: ")
+            try:
+                query = parse_status_query(query_str)
+            except ValueError as e:
+                print(f"Invalid query: {e}")
+                continue
+            check_execution_statuses_by_query(engine, query, history, progress)
 
         elif choice == '8':
             print("Exiting...")
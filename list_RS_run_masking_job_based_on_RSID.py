@@ -10,65 +10,50 @@
 # 3. Exit: Exits the script.
 
 ##################################################################################################################
-import requests
+import argparse
 import json
 
-# Define the API URLs
-# Replace <ENGINE_ENGINE_URL> with your actual values
-login_url = 'http://<MASKING_ENGINE_URL>/masking/api/v5.1.33/login'
-rulesets_url = 'http://<MASKING_ENGINE_URL>/masking/api/v5.1.33/database-rulesets?page_number=1'
-create_masking_job_url = 'http://<MASKING_ENGINE_URL>/masking/api/v5.1.33/masking-jobs'
-masking_jobs_url = 'http://<MASKING_ENGINE_URL>/masking/api/v5.1.33/masking-jobs?page_number=1'
+from masking_engine import (EngineClient, EngineError, add_cache_arguments, add_metrics_arguments, enable_metrics,
+                            open_response_cache)
+from masking_engine_async import run_sync
+from masking_job_rs_creation import TunedSettings, apply_job_settings, masking_job_names, remember_masking_job
+from masking_models import Ruleset
 
-# Define the request headers
-headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
-}
+# Define the masking engine connection
+# Replace <MASKING_ENGINE_URL> with your actual values
+ENGINE_HOST = '<MASKING_ENGINE_URL>'
+API_VERSION = 'v5.1.33'
+POOL_SIZE = 10
 
-# Define the request body for the login with hardcoded credentials
-# Replace USERNAME, and PASSWORD with your actual values
-login_data = {
-    'username': 'USERNAME',
-    'password': 'PASSWORD'
-}
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
 
 # Function to login and get the auth token
-def login():
-    response = requests.post(login_url, headers=headers, json=login_data)
-    if response.status_code == 200:
-        return response.json().get('Authorization')
-    else:
-        print("Login failed. Please check your credentials and API endpoint.")
-        return None
+def login(engine):
+    return engine.login()
 
 # Function to fetch existing rulesets
-def list_rulesets(auth_token):
-    response = requests.get(rulesets_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        rulesets = response.json().get('responseList', [])
+def list_rulesets(engine):
+    try:
+        rulesets = []
         print("Existing Rulesets (databaseRulesetId, rulesetName):")
-        for ruleset in rulesets:
-            print(ruleset['databaseRulesetId'], ruleset['rulesetName'])
+        for ruleset in map(Ruleset.from_response, engine.paginate('database-rulesets')):
+            print(ruleset.ruleset_id, ruleset.name)
+            rulesets.append(ruleset)
         return rulesets
-    else:
+    except EngineError:
         print("Failed to retrieve rulesets.")
         return []
 
-# Function to fetch existing masking jobs
-def list_masking_jobs(auth_token):
-    response = requests.get(masking_jobs_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
-        print("Failed to retrieve masking jobs.")
-        return []
-
 # Function to create a masking job
-def create_masking_job(auth_token, ruleset_id, ruleset_name):
-    # Fetch existing masking jobs to check for duplicates
-    existing_jobs = list_masking_jobs(auth_token)
-    if any(job['jobName'] == ruleset_name for job in existing_jobs):
+def create_masking_job(engine, ruleset_id, ruleset_name):
+    # Check for duplicates against the job names listed once per session
+    try:
+        job_names = masking_job_names(engine)
+    except EngineError:
+        print("Failed to retrieve masking jobs.")
+        return
+    if ruleset_name in job_names:
         print(f"Failed to create masking job. '{ruleset_name}' already exists")
         return
 
@@ -92,20 +77,31 @@ def create_masking_job(auth_token, ruleset_id, ruleset_name):
             }
         }
     }
-    response = requests.post(create_masking_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=job_data)
-    if response.status_code == 200:
-        job_response = response.json()
-        print("\nMasking Job Details:")
-        print("maskingJobId:", job_response['maskingJobId'])
-        print("jobName:", job_response['jobName'])
-        print("rulesetId:", job_response['rulesetId'])
-        print("Masking job created successfully!")
-    else:
+    # Start from the settings masking_job_tuner.py found fastest for this ruleset, if any
+    apply_job_settings(job_data, TunedSettings().get(engine.name, ruleset_id))
+    try:
+        job_response = run_sync(engine, lambda client: client.create_masking_job(job_data))
+    except EngineError:
         print("Failed to create masking job.")
+        return
+    remember_masking_job(engine, ruleset_name)
+    print("\nMasking Job Details:")
+    print("maskingJobId:", job_response['maskingJobId'])
+    print("jobName:", job_response['jobName'])
+    print("rulesetId:", job_response['rulesetId'])
+    print("Masking job created successfully!")
 
 # Main interactive menu
 def main():
-    auth_token = login()
+    parser = argparse.ArgumentParser(description="List rulesets and create masking jobs.")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE,
+                          response_cache=open_response_cache(args.no_cache))
+    auth_token = login(engine)
     if not auth_token:
         return
 
@@ -117,15 +113,15 @@ def main():
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            rulesets = list_rulesets(auth_token)
+            rulesets = list_rulesets(engine)
             ruleset_id = int(input("\nEnter the rulesetId to create a masking job: "))
-            selected_ruleset = next((r for r in rulesets if r['databaseRulesetId'] == ruleset_id), None)
+            selected_ruleset = next((r for r in rulesets if r.ruleset_id == ruleset_id), None)
             if selected_ruleset:
-                create_masking_job(auth_token, ruleset_id, selected_ruleset['rulesetName'])
+                create_masking_job(engine, ruleset_id, selected_ruleset.name)
             else:
                 print("Rule set ID does not exist. Failed to create masking job.")
         elif choice == '2':
-            list_rulesets(auth_token)
+            list_rulesets(engine)
         elif choice == '3':
             break
         else:
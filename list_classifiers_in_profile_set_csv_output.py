@@ -0,0 +1,82 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : list_classifiers_in_profile_set_csv_output.py
+# Version   : v1
+# Python version of list_classifiers_in_profile_set_csv_output.bash covering every profile set.
+# Profile sets and classifiers are each paged through once (both listings run at the same time),
+# classifiers are indexed by classifierId and every profile set is joined against the index in one pass.
+# The CSV is written row by row as each profile set is joined.
+# Usage: python list_classifiers_in_profile_set_csv_output.py [--profile-set CMC_Profile_set_v1 ...] [--output report.csv]
+##################################################################################################################
+
+import argparse
+import csv
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from masking_engine import EngineClient, EngineError, add_metrics_arguments, enable_metrics
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1gukczfceqn0kxdm.vm.cld.sr'
+API_VERSION = 'v5.1.33'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+
+# Build the classifierId -> classifier index from one pass over every classifier page
+def index_classifiers(engine):
+    return {classifier['classifierId']: classifier for classifier in engine.paginate('classifiers')}
+
+# Yield (classifierId, classifierName, profileSetName) for every classifier of every selected profile set
+def classifier_rows(profile_sets, classifiers, profile_set_names=None):
+    for profile_set in profile_sets:
+        profile_set_name = profile_set.get('profileSetName')
+        if profile_set_names and profile_set_name not in profile_set_names:
+            continue
+        for classifier_id in profile_set.get('classifierIds') or []:
+            classifier = classifiers.get(classifier_id, {})
+            yield classifier_id, classifier.get('classifierName', 'Unknown'), profile_set_name
+
+def main():
+    parser = argparse.ArgumentParser(description="List the classifiers of every profile set as CSV.")
+    parser.add_argument('--profile-set', action='append', help="Only report this profile set (can be repeated)")
+    parser.add_argument('--output', help="CSV file to write (default: standard output)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        print("Error: Authorization token not found in the response", file=sys.stderr)
+        return
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            classifiers = executor.submit(index_classifiers, engine)
+            profile_sets = executor.submit(lambda: list(engine.paginate('profile-sets')))
+            classifiers, profile_sets = classifiers.result(), profile_sets.result()
+    except EngineError as e:
+        print(f"Error: Failed to retrieve profile sets or classifiers. {e}", file=sys.stderr)
+        return
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(['ClassifierId', 'ClassifierName', 'profileSetName'])
+        rows = 0
+        for row in classifier_rows(profile_sets, classifiers, set(args.profile_set or [])):
+            writer.writerow(row)
+            rows += 1
+    finally:
+        if args.output:
+            output.close()
+
+    if not rows:
+        print("Error: No classifiers found in the selected profile sets", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1168 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_engine.py
+# Version   : v1
+# Shared masking engine client used by the interactive scripts.
+# One EngineClient holds a single keep-alive connection pool per engine, so repeated calls
+# (status checks, job lookups, listings) reuse the same TCP connections instead of opening a new one per call.
+# Every request is timed and counted in `metrics` by engine, endpoint, method and status, see EngineMetrics.
+# Inventory listings and details can be served from a persistent response cache shared across runs, see ResponseCache.
+##################################################################################################################
+
+import asyncio
+import atexit
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import fcntl
+except ImportError:
+    # No fcntl on Windows, the token cache is then used without a file lock
+    fcntl = None
+
+# Default values for a masking engine connection
+DEFAULT_API_VERSION = 'v5.1.33'
+DEFAULT_POOL_SIZE = 10
+
+# Default values for paginated list endpoints
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_PAGE_WORKERS = 4
+
+# Token cache and credentials locations, both can be overridden from the environment
+TOKEN_CACHE_FILE = os.environ.get('MASKING_TOKEN_CACHE', os.path.expanduser('~/.cache/delphix_masking/tokens.json'))
+TOKEN_TTL = int(os.environ.get('MASKING_TOKEN_TTL', 1800))
+CREDENTIALS_FILE = os.environ.get('MASKING_CONFIG', os.path.expanduser('~/.config/delphix_masking/credentials.json'))
+
+# Response cache for inventory listings and details (see ResponseCache), location and size can be overridden
+# from the environment. Only the endpoints below are cached, for the given number of seconds; an entry older than
+# that is still served for up to RESPONSE_CACHE_STALE seconds while it is revalidated in the background.
+RESPONSE_CACHE_FILE = os.environ.get('MASKING_RESPONSE_CACHE', os.path.expanduser('~/.cache/delphix_masking/responses.db'))
+RESPONSE_CACHE_SIZE = int(os.environ.get('MASKING_RESPONSE_CACHE_SIZE', 64 * 1024 * 1024))
+RESPONSE_CACHE_STALE = 24 * 3600
+CACHE_TTLS = {
+    'database-connectors': 900,
+    'database-rulesets': 300,
+    'masking-jobs': 300,
+    'profile-jobs': 300,
+}
+# A write to an endpoint also invalidates these endpoints: deleting a connector deletes its rulesets,
+# and jobs show the name of their ruleset
+CACHE_INVALIDATES = {
+    'database-connectors': ('database-rulesets', 'masking-jobs', 'profile-jobs'),
+    'database-rulesets': ('masking-jobs', 'profile-jobs'),
+}
+
+# Retry policy: idempotent requests are retried on these statuses and on connection errors/timeouts.
+# Other requests are only retried when the engine refused them before doing any work (429, 503, connect timeout).
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REFUSED_STATUSES = (429, 503)
+MAX_RETRIES = 4
+RETRY_BASE = 0.5
+RETRY_CAP = 30.0
+
+# Circuit breaker: open after this many consecutive failures, stay open for the cooldown (doubling up to the max),
+# and give up waiting for the engine after BREAKER_MAX_WAIT seconds
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 5.0
+BREAKER_MAX_COOLDOWN = 120.0
+BREAKER_MAX_WAIT = 600.0
+
+# Statuses after which an execution or async task will not change any more
+TERMINAL_STATUSES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+# Default polling intervals (seconds): fast at first, backing off for long tasks, capped
+POLL_INITIAL = 1.0
+POLL_FACTOR = 1.5
+POLL_MAX = 15.0
+
+# Request metrics: latency histogram buckets (seconds), and where to write the metrics when the script exits
+# (a .prom file for the Prometheus node_exporter textfile collector, anything else is written as JSON)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_FILE = os.environ.get('MASKING_METRICS_FILE')
+
+# Define the request headers
+headers = {
+    'accept': 'application/json',
+    'Content-Type': 'application/json'
+}
+
+
+# Raised when the engine answers with anything other than 200
+class EngineError(Exception):
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.text = response.text
+        super().__init__(f"Status Code: {response.status_code}, Response: {response.text}")
+
+
+# Raised when the circuit breaker has been open for longer than the caller is willing to wait
+class CircuitOpenError(EngineError):
+    def __init__(self, engine_name, waited):
+        self.status_code = None
+        self.text = f"Engine {engine_name} is saturated, gave up after waiting {waited:.0f}s for it to recover"
+        Exception.__init__(self, self.text)
+
+
+# Thread-safe memo for lookups such as jobId -> job details.
+# Each key is computed once, concurrent callers asking for the same key wait for the first call.
+class Memo:
+    def __init__(self, func):
+        self.func = func
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def __call__(self, key):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(self.func(key))
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
+
+
+# Numeric path segments are object ids, 'executions/12' and 'executions/13' are both counted as 'executions/{id}'
+_id_segment = re.compile(r'/\d+(?=/|$)')
+
+def endpoint_template(path):
+    return _id_segment.sub('/{id}', '/' + path.strip('/'))[1:]
+
+
+# Latency histograms and request counts for every engine call made by this process.
+# Requests are grouped by (engine, method, endpoint, status). GET requests are also counted per exact URL
+# (path and query parameters) to find redundant calls: the same URL fetched again with an unchanged response,
+# e.g. one job's details looked up N times in one run. Polling a running execution is not redundant
+# as long as its status or rowsMasked keeps changing.
+class EngineMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # (engine, method, endpoint, status) -> [count, total seconds, max seconds, count per bucket]
+        self.series = {}
+        # (engine, url) -> [calls, hash of the last response, calls that returned an unchanged response]
+        self.calls = {}
+        # (engine, endpoint, outcome) -> response cache lookups, outcome is hit, stale, revalidated or miss
+        self.cache = {}
+
+    def observe(self, engine_name, method, path, status, latency, params=None, content=None):
+        key = (engine_name, method, endpoint_template(path), str(status))
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0, 0.0, 0.0, [0] * len(self.buckets)]
+            series[0] += 1
+            series[1] += latency
+            series[2] = max(series[2], latency)
+            for i, bound in enumerate(self.buckets):
+                if latency <= bound:
+                    series[3][i] += 1
+                    break
+            if method == 'GET' and status == 200:
+                url = path.strip('/')
+                if params:
+                    url += '?' + '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+                digest = hash(content)
+                entry = self.calls.get((engine_name, url))
+                if entry is None:
+                    self.calls[(engine_name, url)] = [1, digest, 0]
+                else:
+                    entry[0] += 1
+                    if entry[1] == digest:
+                        entry[2] += 1
+                    entry[1] = digest
+
+    def observe_cache(self, engine_name, path, outcome):
+        key = (engine_name, endpoint_template(path), outcome)
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    # Number of requests observed so far
+    def request_count(self):
+        with self._lock:
+            return sum(series[0] for series in self.series.values())
+
+    # Latency below which a fraction q of the requests fall, interpolated inside the bucket
+    def _quantile(self, counts, total, maximum, q):
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                return min(maximum, lower + (bound - lower) * (rank - seen) / count)
+            seen += count
+            lower = bound
+        return maximum
+
+    # One row per (engine, method, endpoint) with every status merged, slowest total time first
+    def summary(self):
+        rows = {}
+        with self._lock:
+            for (engine_name, method, endpoint, status), (count, total, maximum, counts) in self.series.items():
+                row = rows.setdefault((engine_name, method, endpoint), {
+                    "engine": engine_name, "method": method, "endpoint": endpoint, "calls": 0, "errors": 0,
+                    "totalTime": 0.0, "maxTime": 0.0, "buckets": [0] * len(self.buckets), "statuses": {}})
+                row["calls"] += count
+                row["errors"] += 0 if status[:1] in ('2', '3') else count
+                row["totalTime"] += total
+                row["maxTime"] = max(row["maxTime"], maximum)
+                row["buckets"] = [a + b for a, b in zip(row["buckets"], counts)]
+                row["statuses"][status] = row["statuses"].get(status, 0) + count
+        for row in rows.values():
+            row["p50"] = self._quantile(row["buckets"], row["calls"], row["maxTime"], 0.5)
+            row["p95"] = self._quantile(row["buckets"], row["calls"], row["maxTime"], 0.95)
+            del row["buckets"]
+        return sorted(rows.values(), key=lambda row: -row["totalTime"])
+
+    # GET URLs answered with the same response more than once, most repeated first
+    def redundant_calls(self):
+        with self._lock:
+            redundant = [{"engine": engine_name, "url": url, "calls": calls, "unchanged": unchanged}
+                         for (engine_name, url), (calls, _, unchanged) in self.calls.items() if unchanged]
+        return sorted(redundant, key=lambda row: -row["unchanged"])
+
+    def to_json(self):
+        with self._lock:
+            series = [{"engine": engine_name, "method": method, "endpoint": endpoint, "status": status, "count": count,
+                       "sum": total, "max": maximum, "buckets": dict(zip(map(str, self.buckets), counts))}
+                      for (engine_name, method, endpoint, status), (count, total, maximum, counts) in self.series.items()]
+            cache = [{"engine": engine_name, "endpoint": endpoint, "outcome": outcome, "count": count}
+                     for (engine_name, endpoint, outcome), count in self.cache.items()]
+        return {"started": self.started, "duration": time.time() - self.started, "series": series,
+                "summary": self.summary(), "redundantCalls": self.redundant_calls(), "cache": cache}
+
+    # Metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = ['# HELP masking_engine_request_duration_seconds Latency of masking engine API requests.',
+                 '# TYPE masking_engine_request_duration_seconds histogram']
+        with self._lock:
+            series = sorted(self.series.items())
+        for (engine_name, method, endpoint, status), (count, total, _, counts) in series:
+            labels = f'engine="{engine_name}",method="{method}",endpoint="{endpoint}",status="{status}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'masking_engine_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'masking_engine_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'masking_engine_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'masking_engine_request_duration_seconds_count{{{labels}}} {count}')
+        lines.append('# HELP masking_engine_redundant_requests_total GET requests that returned the same response as the previous identical request.')
+        lines.append('# TYPE masking_engine_redundant_requests_total counter')
+        redundant = {}
+        for row in self.redundant_calls():
+            key = (row["engine"], endpoint_template(row["url"].split('?')[0]))
+            redundant[key] = redundant.get(key, 0) + row["unchanged"]
+        for (engine_name, endpoint), count in sorted(redundant.items()):
+            lines.append(f'masking_engine_redundant_requests_total{{engine="{engine_name}",endpoint="{endpoint}"}} {count}')
+        lines.append('# HELP masking_engine_cache_lookups_total Response cache lookups by outcome (hit, stale, revalidated, miss).')
+        lines.append('# TYPE masking_engine_cache_lookups_total counter')
+        with self._lock:
+            cache = sorted(self.cache.items())
+        for (engine_name, endpoint, outcome), count in cache:
+            lines.append(f'masking_engine_cache_lookups_total{{engine="{engine_name}",endpoint="{endpoint}",outcome="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    # Write the metrics to a .prom (Prometheus textfile) or JSON file, replacing it atomically
+    def write(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    # Print the per-endpoint summary and the redundant calls
+    def print_summary(self, limit=20):
+        print("\nEngine calls:")
+        print(f"{'Method':<8}{'Endpoint':<45}{'Calls':<8}{'Errors':<8}{'Total (s)':<11}{'p50 (ms)':<10}{'p95 (ms)':<10}{'Max (ms)':<10}")
+        print("="*110)
+        for row in self.summary():
+            print(f"{row['method']:<8}{row['endpoint']:<45}{row['calls']:<8}{row['errors']:<8}{row['totalTime']:<11.2f}"
+                  f"{row['p50'] * 1000:<10.0f}{row['p95'] * 1000:<10.0f}{row['maxTime'] * 1000:<10.0f}")
+        redundant = self.redundant_calls()
+        if redundant:
+            print(f"\nRedundant calls (same GET answered with an unchanged response), top {limit}:")
+            print(f"{'URL':<70}{'Calls':<8}{'Unchanged':<10}")
+            print("="*88)
+            for row in redundant[:limit]:
+                print(f"{row['url']:<70}{row['calls']:<8}{row['unchanged']:<10}")
+        with self._lock:
+            cache = sorted(self.cache.items())
+        if cache:
+            print("\nResponse cache:")
+            print(f"{'Endpoint':<45}{'Outcome':<13}{'Lookups':<8}")
+            print("="*66)
+            for (_, endpoint, outcome), count in cache:
+                print(f"{endpoint:<45}{outcome:<13}{count:<8}")
+
+
+# Metrics of every EngineClient in this process
+metrics = EngineMetrics()
+
+# Add the --stats and --metrics-file options to a script's argument parser
+def add_metrics_arguments(parser):
+    parser.add_argument('--stats', action='store_true', help="Print per-endpoint call counts and latencies when the script exits")
+    parser.add_argument('--metrics-file', default=METRICS_FILE,
+                        help="Write request metrics to this file at exit, .prom for the Prometheus textfile collector, otherwise JSON")
+
+# Print and/or write the metrics when the script exits
+def enable_metrics(stats=False, metrics_file=None):
+    if stats:
+        atexit.register(metrics.print_summary)
+    if metrics_file:
+        atexit.register(metrics.write, metrics_file)
+
+
+# Set of ids given as ranges, e.g. "3,5-7,100-5000", kept as sorted, merged (start, end) intervals.
+# Membership is a binary search and iteration is lazy, so a range of millions of ids costs two numbers.
+class IdRanges:
+    def __init__(self, ranges=()):
+        self.ranges = []
+        for start, end in sorted(ranges):
+            if self.ranges and start <= self.ranges[-1][1] + 1:
+                self.ranges[-1] = (self.ranges[-1][0], max(self.ranges[-1][1], end))
+            else:
+                self.ranges.append((start, end))
+        self._starts = [start for start, _ in self.ranges]
+
+    def __contains__(self, value):
+        if not isinstance(value, int):
+            return False
+        i = bisect.bisect_right(self._starts, value) - 1
+        return i >= 0 and value <= self.ranges[i][1]
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.ranges)
+
+    def __bool__(self):
+        return bool(self.ranges)
+
+    def __repr__(self):
+        return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in self.ranges)
+
+# Turn input like "3,5-7" into an IdRanges, raises ValueError on anything else
+def parse_id_ranges(input_str):
+    ranges = []
+    for part in input_str.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = map(int, part.split('-'))
+            ranges.append((min(start, end), max(start, end)))
+        else:
+            ranges.append((int(part), int(part)))
+    return IdRanges(ranges)
+
+# Token bucket limiting how many requests per second a batch sends to the engine.
+# acquire() blocks until the next request is allowed, it is safe to call from many threads.
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+# AIMD controller for the number of requests in flight to one engine.
+# Every successful, fast response adds about one slot per round of requests (limit += 1/limit).
+# A 5xx/429, a timeout or a latency well above the best latency seen halves the limit,
+# at most once per average latency so one burst of errors only counts once.
+class AdaptiveLimiter:
+    def __init__(self, initial=4, minimum=1, maximum=DEFAULT_POOL_SIZE, latency_tolerance=3.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self.errors = 0
+        self.requests = 0
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    # Take a slot if one is free without waiting, for callers that cannot block (the async client)
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    # Give back the slot of a request abandoned before it completed, its latency says nothing about the engine
+    def cancel(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency, failed):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            if failed:
+                self.errors += 1
+            else:
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                # The baseline follows the best latency seen and drifts up slowly as the engine's normal latency changes
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline + (latency - self.baseline) * 0.01)
+
+            # Ignore slowdowns of a few milliseconds, they are noise rather than a saturated engine
+            slow = not failed and self.latency > max(self.baseline * self.latency_tolerance, self.baseline + 0.05)
+            now = time.monotonic()
+            if failed or slow:
+                if now - self.last_decrease > (self.latency or 0):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+# Stops traffic to an engine that keeps failing.
+# After `threshold` consecutive failures the breaker opens: callers wait out the cooldown, then a single probe
+# request is let through (half-open). A successful probe closes the breaker, a failed one reopens it with
+# twice the cooldown. Callers waiting longer than max_wait get a CircuitOpenError.
+class CircuitBreaker:
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=BREAKER_MAX_COOLDOWN,
+                 max_wait=BREAKER_MAX_WAIT):
+        self.name = name
+        self.threshold = threshold
+        self.initial_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_wait = max_wait
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_until = 0.0
+        self._cond = threading.Condition()
+
+    def before_request(self):
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                delay = self._delay()
+                if not delay:
+                    return
+                now = time.monotonic()
+                if now - started > self.max_wait:
+                    raise CircuitOpenError(self.name, now - started)
+                self._cond.wait(min(delay, started + self.max_wait - now + 0.01))
+
+    # Seconds a request has to wait before it may be sent, 0 when it may go now. For callers that cannot block
+    # (AsyncEngineClient), they sleep and ask again.
+    def wait_time(self):
+        with self._cond:
+            return self._delay()
+
+    # The caller holds the lock
+    def _delay(self):
+        now = time.monotonic()
+        if self.state == 'closed':
+            return 0
+        if self.state == 'open' and now >= self.opened_until:
+            self.state = 'half-open'
+            return 0
+        # Open: wait for the cooldown to end, half-open: wait for the probe result
+        return max(self.opened_until - now, 0.1) if self.state == 'open' else 1.0
+
+    def record(self, failed):
+        with self._cond:
+            if not failed:
+                self.failures = 0
+                if self.state != 'closed':
+                    print(f"Engine {self.name} recovered, circuit breaker closed.")
+                self.state = 'closed'
+                self.cooldown = self.initial_cooldown
+            else:
+                self.failures += 1
+                if self.state == 'half-open' or (self.state == 'closed' and self.failures >= self.threshold):
+                    print(f"Engine {self.name} is not responding, pausing requests for {self.cooldown:.0f}s.")
+                    self.state = 'open'
+                    self.opened_until = time.monotonic() + self.cooldown
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._cond.notify_all()
+
+
+# Full-jitter exponential backoff before retry number `attempt` (0 based), never shorter than Retry-After
+def backoff_delay(attempt, response=None):
+    delay = random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt))
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+# Return the login body for an engine.
+# MASKING_USERNAME / MASKING_PASSWORD win, otherwise the credentials file is read:
+#   {"username": "admin", "password": "...", "engines": {"engine1.example.com": {"username": "...", "password": "..."}}}
+# where an entry under "engines" overrides the default username/password for that host.
+def load_credentials(host=None, path=CREDENTIALS_FILE):
+    username = os.environ.get('MASKING_USERNAME')
+    password = os.environ.get('MASKING_PASSWORD')
+    if username and password:
+        return {'username': username, 'password': password}
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    credentials = dict(config.get('engines', {}).get(host) or config)
+    return {'username': username or credentials.get('username'), 'password': password or credentials.get('password')}
+
+
+# Authorization tokens shared by every script and process on this machine.
+# Tokens are kept in a JSON file readable only by the owner, keyed by engine URL and user,
+# and every read-modify-write happens under an exclusive file lock.
+class TokenCache:
+    def __init__(self, path=TOKEN_CACHE_FILE, ttl=TOKEN_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    # Hold the cache file lock for the duration of a with block
+    def lock(self):
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o700, exist_ok=True)
+        return _FileLock(f"{self.path}.lock")
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, tokens):
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(tokens, f)
+        os.replace(tmp_path, self.path)
+
+    # Return the cached token for key if it is younger than the ttl, the caller must hold the lock
+    def get(self, key):
+        entry = self._read().get(key)
+        if entry and time.time() - entry['saved'] < self.ttl:
+            return entry['token']
+        return None
+
+    # Store a token for key, the caller must hold the lock
+    def put(self, key, token):
+        tokens = {k: v for k, v in self._read().items() if time.time() - v['saved'] < self.ttl}
+        tokens[key] = {'token': token, 'saved': time.time()}
+        self._write(tokens)
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        os.chmod(self.path, 0o600)
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+# Persistent cache of GET responses for the endpoints in CACHE_TTLS, shared by every script and process on this
+# machine through one SQLite file. Entries are keyed by engine URL, path and query parameters.
+# - an entry younger than its endpoint's TTL is served without asking the engine
+# - an older entry (up to RESPONSE_CACHE_STALE) is served straight away and refreshed in the background
+# - past that the request waits for the engine. Refreshes send If-None-Match / If-Modified-Since when the engine
+#   gave an ETag or Last-Modified, a 304 only renews the entry.
+# - a listing read with EngineClient.paginate is one entry holding every record, read from the engine in one pass,
+#   so its pages are served, refreshed and expired together. Single pages (page_number=...) are not cached.
+# - a successful write from any EngineClient, with or without a cache of its own, invalidates the endpoint it
+#   touched (and CACHE_INVALIDATES) for every API version of the engine. A refresh that started before an
+#   invalidation is not stored, so a read never returns data older than the last write made from this machine.
+# - the file is kept under max_bytes by evicting the least recently used entries.
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE_FILE, max_bytes=RESPONSE_CACHE_SIZE, ttls=None, stale=RESPONSE_CACHE_STALE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.stale = stale
+        # One connection shared by the page threads and background refreshes, serialised by the lock
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        os.chmod(path, 0o600)
+        self.db.executescript('''
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key           TEXT PRIMARY KEY,
+                engine        TEXT NOT NULL,
+                endpoint      TEXT NOT NULL,
+                body          BLOB NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                stored_at     REAL NOT NULL,
+                used_at       REAL NOT NULL,
+                size          INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_by_endpoint ON responses (engine, endpoint);
+            CREATE INDEX IF NOT EXISTS responses_by_use ON responses (used_at);
+            CREATE TABLE IF NOT EXISTS invalidations (
+                engine   TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                at       REAL NOT NULL,
+                PRIMARY KEY (engine, endpoint)
+            );
+        ''')
+        self._lock = threading.Lock()
+
+    # Cached endpoint of a path ('masking-jobs/12' -> 'masking-jobs'), None when the path is not cached
+    def endpoint(self, path):
+        endpoint = path.strip('/').split('/')[0]
+        return endpoint if endpoint in self.ttls else None
+
+    # Cached endpoint of a GET request, None for other endpoints and for single pages of a listing
+    def cached_endpoint(self, path, params=None):
+        if params and ('page_number' in params or 'page_size' in params):
+            return None
+        return self.endpoint(path)
+
+    def key(self, engine, path, params=None):
+        query = '&'.join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        return f"{engine}|{path.strip('/')}?{query}"
+
+    # Key of a whole listing read by paginate, its body is the JSON list of every record
+    def listing_key(self, engine, path, params=None):
+        return f"{self.key(engine, path, params)}#all"
+
+    # (body, etag, last_modified, age in seconds) of an entry, None when there is none
+    def get(self, key):
+        with self._lock:
+            row = self.db.execute('SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE responses SET used_at = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+        return row[0], row[1], row[2], time.time() - row[3]
+
+    # Store a response fetched at requested_at, unless the endpoint was invalidated since
+    def put(self, key, engine, endpoint, body, etag, last_modified, requested_at):
+        with self._lock:
+            invalidated = self.db.execute('SELECT MAX(at) FROM invalidations WHERE endpoint = ? AND substr(?, 1, length(engine)) = engine',
+                                          (endpoint, engine)).fetchone()
+            if invalidated[0] is not None and invalidated[0] >= requested_at:
+                return
+            now = time.time()
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (key, engine, endpoint, body, etag, last_modified, now, now, len(body)))
+            self._evict()
+            self.db.commit()
+
+    # A revalidation answered 304: the entry is fresh again
+    def renew(self, key, requested_at):
+        with self._lock:
+            self.db.execute('UPDATE responses SET stored_at = ? WHERE key = ? AND stored_at < ?', (time.time(), key, requested_at))
+            self.db.commit()
+
+    # Drop the least recently used entries until the cache fits in max_bytes, the caller holds the lock
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute('SELECT key, size FROM responses ORDER BY used_at').fetchall():
+            self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # Forget every entry of the endpoint written to by path, and of the endpoints that depend on it, for every
+    # API version of the engine: entries whose engine URL starts with the engine's URL up to the API version
+    def invalidate(self, engine, path):
+        prefix = f"{engine.rstrip('/').rsplit('/', 1)[0]}/"
+        written = path.strip('/').split('/')[0]
+        now = time.time()
+        with self._lock:
+            for endpoint in (written,) + CACHE_INVALIDATES.get(written, ()):
+                self.db.execute('DELETE FROM responses WHERE substr(engine, 1, ?) = ? AND endpoint = ?', (len(prefix), prefix, endpoint))
+                self.db.execute('INSERT OR REPLACE INTO invalidations VALUES (?, ?, ?)', (prefix, endpoint, now))
+            self.db.commit()
+
+    def clear(self):
+        with self._lock:
+            self.db.execute('DELETE FROM responses')
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+# A requests.Response rebuilt from a cached body
+def cached_response(url, body):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.url = url
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+    return response
+
+# Add the --no-cache option to a script that reads inventory listings through the response cache
+def add_cache_arguments(parser):
+    parser.add_argument('--no-cache', action='store_true', help="Always ask the engine instead of using the response cache")
+
+def open_response_cache(no_cache=False):
+    return None if no_cache else ResponseCache(RESPONSE_CACHE_FILE)
+
+# Cache file path -> ResponseCache used by clients without a cache of their own to invalidate what their writes
+# make stale, opened the first time it is needed and only when a cached run created the file
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+def shared_response_cache():
+    with _shared_caches_lock:
+        cache = _shared_caches.get(RESPONSE_CACHE_FILE)
+        if cache is None and os.path.exists(RESPONSE_CACHE_FILE):
+            cache = _shared_caches[RESPONSE_CACHE_FILE] = ResponseCache(RESPONSE_CACHE_FILE)
+        return cache
+
+
+class EngineClient:
+    # Create a client for one masking engine.
+    # host        : engine host name, e.g. 'myengine.example.com'
+    # api_version : masking API version used to build every URL, e.g. 'v5.1.33'
+    # pool_size   : number of keep-alive connections kept open to the engine
+    # name        : label used when results from several engines are shown together, defaults to host
+    # token_cache : TokenCache shared with other processes, None for the default cache, False to disable it
+    # response_cache : ResponseCache for the inventory listings and details, None (default) to always ask the engine
+    def __init__(self, host, api_version=DEFAULT_API_VERSION, scheme='http', pool_size=DEFAULT_POOL_SIZE, timeout=60, name=None,
+                 token_cache=None, response_cache=None):
+        self.host = host
+        self.name = name or host
+        self.api_version = api_version
+        self.base_url = f"{scheme}://{host}/masking/api/{api_version}"
+        self.timeout = timeout
+        self.auth_token = None
+        self.login_data = None
+        self.token_cache = TokenCache() if token_cache is None else token_cache
+        self.response_cache = response_cache
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        self.limiter = AdaptiveLimiter(initial=max(1, pool_size // 2), maximum=pool_size)
+        self.breaker = CircuitBreaker(self.name)
+        self._close_callbacks = []
+
+        self.session = requests.Session()
+        self.session.headers.update({'accept': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # Build the full URL for an API path such as 'database-rulesets' or 'executions/12'
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    # Send one HTTP request through the circuit breaker and the adaptive in-flight limit
+    def _send(self, method, path, request_headers, kwargs):
+        self.breaker.before_request()
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, self.url(path), headers=request_headers, **kwargs)
+        except requests.RequestException as e:
+            latency = time.monotonic() - started
+            self.limiter.release(latency, True)
+            self.breaker.record(True)
+            metrics.observe(self.name, method, path, type(e).__name__, latency)
+            raise
+        latency = time.monotonic() - started
+        failed = response.status_code in RETRY_STATUSES
+        self.limiter.release(latency, failed)
+        self.breaker.record(failed)
+        metrics.observe(self.name, method, path, response.status_code, latency, kwargs.get('params'), response.content)
+        return response
+
+    # Send a request with retries (see the retry policy above), retry=True/False overrides the policy
+    def _send_with_retries(self, method, path, request_headers, kwargs, retry):
+        for attempt in range(MAX_RETRIES + 1):
+            last_attempt = attempt == MAX_RETRIES
+            try:
+                response = self._send(method, path, request_headers, kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt or not (retry or isinstance(e, requests.ConnectTimeout)):
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            if last_attempt or response.status_code not in RETRY_STATUSES:
+                return response
+            if not (retry or response.status_code in REFUSED_STATUSES):
+                return response
+            time.sleep(backoff_delay(attempt, response))
+
+    # Send a request to the engine, answering GETs of cached endpoints from the response cache when there is one.
+    # A successful write invalidates the cached responses of the endpoint it touched.
+    def request(self, method, path, retry=None, **kwargs):
+        cache = self.response_cache
+        if cache and method == 'GET' and cache.cached_endpoint(path, kwargs.get('params')):
+            return self._cached_get(path, retry, kwargs)
+        response = self._request(method, path, retry, **kwargs)
+        if method not in IDEMPOTENT_METHODS and response.status_code < 400:
+            self.invalidate(path)
+        return response
+
+    # Drop the cached responses a successful write to path made stale, in this client's cache or, for a client
+    # without one, in the shared cache file other (cached) runs read
+    def invalidate(self, path):
+        cache = self.response_cache or shared_response_cache()
+        if cache:
+            cache.invalidate(self.base_url, path)
+
+    # Send a request to the engine using the pooled session and the current auth token.
+    # A 401 means the token expired: log in again (once for all threads) and retry the request once.
+    def _request(self, method, path, retry=None, **kwargs):
+        request_headers = dict(kwargs.pop('headers', None) or {})
+        kwargs.setdefault('timeout', self.timeout)
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        token = self.auth_token
+        if token and 'Authorization' not in request_headers:
+            request_headers['Authorization'] = token
+        response = self._send_with_retries(method, path, request_headers, kwargs, retry)
+        if response.status_code == 401 and token and self.login_data and request_headers.get('Authorization') == token:
+            if self.relogin(token):
+                request_headers['Authorization'] = self.auth_token
+                response = self._send_with_retries(method, path, request_headers, kwargs, retry)
+        return response
+
+    # GET through the response cache: fresh entries are served as they are, stale ones are served while a
+    # background refresh runs, missing or expired ones are fetched (revalidated when possible) before returning
+    def _cached_get(self, path, retry, kwargs):
+        cache = self.response_cache
+        endpoint = cache.endpoint(path)
+        key = cache.key(self.base_url, path, kwargs.get('params'))
+        entry = cache.get(key)
+        if entry:
+            body, _, _, age = entry
+            if age < cache.ttls[endpoint]:
+                metrics.observe_cache(self.name, path, 'hit')
+                return cached_response(self.url(path), body)
+            if age < cache.ttls[endpoint] + cache.stale:
+                metrics.observe_cache(self.name, path, 'stale')
+                self._refresh_in_background(key, lambda: self._refresh(path, key, entry, retry, kwargs, background=True))
+                return cached_response(self.url(path), body)
+        return self._refresh(path, key, entry, retry, kwargs)
+
+    # Fetch path from the engine and store the response, conditionally when the entry has validators
+    def _refresh(self, path, key, entry, retry, kwargs, background=False):
+        cache = self.response_cache
+        request_kwargs = dict(kwargs)
+        request_headers = dict(request_kwargs.pop('headers', None) or {})
+        if entry and entry[1]:
+            request_headers['If-None-Match'] = entry[1]
+        if entry and entry[2]:
+            request_headers['If-Modified-Since'] = entry[2]
+        requested_at = time.time()
+        response = self._request('GET', path, retry, headers=request_headers, **request_kwargs)
+        if response.status_code == 304 and entry:
+            if not background:
+                metrics.observe_cache(self.name, path, 'revalidated')
+            cache.renew(key, requested_at)
+            return cached_response(self.url(path), entry[0])
+        if not background:
+            metrics.observe_cache(self.name, path, 'miss')
+        if response.status_code == 200:
+            cache.put(key, self.base_url, cache.endpoint(path), response.content, response.headers.get('ETag'),
+                      response.headers.get('Last-Modified'), requested_at)
+        return response
+
+    # Every record of a cached listing, served from its one cache entry like _cached_get serves a response.
+    # A missing or expired listing is read from the engine, its records are yielded as the pages arrive in order.
+    def _cached_listing(self, path, params, page_size, workers):
+        cache = self.response_cache
+        endpoint = cache.endpoint(path)
+        key = cache.listing_key(self.base_url, path, params)
+        entry = cache.get(key)
+        if entry:
+            body, _, _, age = entry
+            if age < cache.ttls[endpoint]:
+                metrics.observe_cache(self.name, path, 'hit')
+                yield from json.loads(body)
+                return
+            if age < cache.ttls[endpoint] + cache.stale:
+                metrics.observe_cache(self.name, path, 'stale')
+                self._refresh_in_background(key, lambda: list(self._refresh_listing(path, key, params, page_size, workers)))
+                yield from json.loads(body)
+                return
+        metrics.observe_cache(self.name, path, 'miss')
+        yield from self._refresh_listing(path, key, params, page_size, workers)
+
+    # Read a listing from the engine in page order and store it once every page has been read
+    def _refresh_listing(self, path, key, params, page_size, workers):
+        records = []
+        requested_at = time.time()
+        for record in self._paginate(path, params, page_size, workers, ordered=True):
+            records.append(record)
+            yield record
+        self.response_cache.put(key, self.base_url, self.response_cache.endpoint(path), json.dumps(records).encode(),
+                                None, None, requested_at)
+
+    # Run refresh() in a daemon thread, at most one refresh per cache entry at a time
+    def _refresh_in_background(self, key, refresh):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                refresh()
+            except (requests.RequestException, EngineError):
+                # The stale entry stays, the next read tries again
+                pass
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    # Fetch one page of a list endpoint and return (records, total)
+    def fetch_page(self, path, page_number, page_size, params=None):
+        page_params = dict(params or {})
+        page_params.update({'page_number': page_number, 'page_size': page_size})
+        response = self.get(path, params=page_params)
+        if response.status_code != 200:
+            raise EngineError(response)
+        body = response.json()
+        records = body.get('responseList', [])
+        total = body.get('_pageInfo', {}).get('total')
+        return records, total
+
+    # Iterate over every record of a list endpoint such as 'database-rulesets'.
+    # The first page gives the total count, the remaining pages are fetched concurrently
+    # (at most `workers` pages in flight) and their records are yielded as each page arrives,
+    # so record order across pages is not guaranteed unless ordered=True, which yields the pages in page order
+    # (a slow page then holds back the pages after it, still at most `workers` of them).
+    # Listings of cached endpoints come from the response cache as a whole, in page order.
+    def paginate(self, path, params=None, page_size=DEFAULT_PAGE_SIZE, workers=DEFAULT_PAGE_WORKERS, ordered=False):
+        if self.response_cache and self.response_cache.endpoint(path):
+            return self._cached_listing(path, params, page_size, workers)
+        return self._paginate(path, params, page_size, workers, ordered)
+
+    def _paginate(self, path, params, page_size, workers, ordered):
+        records, total = self.fetch_page(path, 1, page_size, params)
+        yield from records
+
+        if total is None:
+            # Engine did not report a total, walk the pages one by one until a short page
+            page_number = 1
+            while len(records) == page_size:
+                page_number += 1
+                records, _ = self.fetch_page(path, page_number, page_size, params)
+                yield from records
+            return
+
+        pages = iter(range(2, math.ceil(total / page_size) + 1))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            if ordered:
+                window = deque(executor.submit(self.fetch_page, path, page_number, page_size, params)
+                               for page_number in itertools.islice(pages, workers))
+                while window:
+                    records, _ = window.popleft().result()
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        window.append(executor.submit(self.fetch_page, path, next_page, page_size, params))
+                    yield from records
+                return
+            in_flight = set()
+            for page_number in pages:
+                in_flight.add(executor.submit(self.fetch_page, path, page_number, page_size, params))
+                if len(in_flight) >= workers:
+                    break
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    records, _ = future.result()
+                    yield from records
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        in_flight.add(executor.submit(self.fetch_page, path, next_page, page_size, params))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _token_key(self):
+        return f"{self.base_url}|{self.login_data.get('username')}"
+
+    def _login_request(self):
+        started = time.monotonic()
+        response = self.session.post(self.url('login'), headers=headers, json=self.login_data, timeout=self.timeout)
+        metrics.observe(self.name, 'POST', 'login', response.status_code, time.monotonic() - started)
+        if response.status_code == 200:
+            return response.json().get('Authorization')
+        print("Login failed. Please check your credentials and API endpoint.")
+        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        return None
+
+    # Function to login and keep the auth token on the client for later calls.
+    # Credentials default to load_credentials(), a token cached by another process is reused when still valid.
+    def login(self, login_data=None):
+        self.login_data = login_data or load_credentials(self.host)
+        if not self.token_cache:
+            self.auth_token = self._login_request()
+            return self.auth_token
+        with self.token_cache.lock():
+            token = self.token_cache.get(self._token_key())
+            if not token:
+                token = self._login_request()
+                if token:
+                    self.token_cache.put(self._token_key(), token)
+        self.auth_token = token
+        return token
+
+    # Replace an expired token. If another thread or process already replaced it, that token is used
+    # instead of logging in again. Returns the new token or None.
+    def relogin(self, expired_token):
+        with self._login_lock:
+            if self.auth_token != expired_token:
+                return self.auth_token
+            if not self.token_cache:
+                token = self._login_request()
+            else:
+                with self.token_cache.lock():
+                    token = self.token_cache.get(self._token_key())
+                    if not token or token == expired_token:
+                        token = self._login_request()
+                        if token:
+                            self.token_cache.put(self._token_key(), token)
+            if token:
+                self.auth_token = token
+            return token
+
+    # Call callback when the client is closed, e.g. to stop an event loop that sends requests for it
+    def on_close(self, callback):
+        self._close_callbacks.append(callback)
+
+    def close(self):
+        while self._close_callbacks:
+            self._close_callbacks.pop()()
+        self.session.close()
+        if self.response_cache:
+            self.response_cache.close()
+
+
+# Yield the delays between status polls: initial, initial*factor, ... capped at maximum
+def poll_intervals(initial=POLL_INITIAL, factor=POLL_FACTOR, maximum=POLL_MAX):
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+# Poll an execution or async task (e.g. 'executions/12', 'async-tasks/7') until it reaches a terminal status.
+# engine is an EngineClient, whose blocking GET runs in a worker thread so many polls can share one event loop,
+# or an AsyncEngineClient, whose GET is awaited on the loop.
+# on_update is called with every response body and the final body is returned.
+async def poll_until_done(engine, path, on_update=None, intervals=None):
+    for delay in intervals or poll_intervals():
+        if asyncio.iscoroutinefunction(engine.get):
+            response = await engine.get(path)
+        else:
+            response = await asyncio.to_thread(engine.get, path)
+        if response.status_code != 200:
+            raise EngineError(response)
+        body = response.json()
+        if on_update:
+            on_update(body)
+        if body.get('status') in TERMINAL_STATUSES:
+            return body
+        await asyncio.sleep(delay)
+
+
+# Read a fleet configuration file and return (EngineClient, login_data) for every engine in it.
+# {"engines": [{"name": "prod1", "host": "engine1.example.com", "apiVersion": "v5.1.35",
+#               "scheme": "http", "poolSize": 10, "username": "admin", "password": "..."}]}
+# Engines without username/password get theirs from load_credentials().
+def load_fleet(path):
+    with open(path) as f:
+        config = json.load(f)
+    fleet = []
+    for entry in config.get('engines', []):
+        engine = EngineClient(entry['host'], api_version=entry.get('apiVersion', DEFAULT_API_VERSION),
+                              scheme=entry.get('scheme', 'http'), pool_size=entry.get('poolSize', DEFAULT_POOL_SIZE),
+                              name=entry.get('name'))
+        if entry.get('username') and entry.get('password'):
+            login_data = {'username': entry['username'], 'password': entry['password']}
+        else:
+            login_data = load_credentials(entry['host'])
+        fleet.append((engine, login_data))
+    return fleet
+
+
+# Call func(engine) on every engine at the same time, one thread per engine.
+# Returns a list of (engine, result, error) in fleet order, error is the exception raised by func or None.
+def fan_out(engines, func):
+    def call(engine):
+        try:
+            return engine, func(engine), None
+        except Exception as e:
+            return engine, None, e
+
+    if not engines:
+        return []
+    with ThreadPoolExecutor(max_workers=len(engines)) as executor:
+        return list(executor.map(call, engines))
@@ -0,0 +1,382 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_engine_async.py
+# Version   : v1
+# asyncio counterpart of EngineClient for fleet monitoring and bulk jobs with thousands of calls in flight.
+# AsyncEngineClient wraps an EngineClient, which keeps doing the login, token cache and re-login, and sends the
+# API calls from one event loop:
+# - with aiohttp installed, over one shared aiohttp connection pool (pool_size connections) with at most
+#   max_in_flight requests outstanding, without a thread per request
+# - without aiohttp, every call runs EngineClient.request in a pool of pool_size threads: same API, but the
+#   concurrency is bounded by the threads (and by the EngineClient's own pool_size)
+# Retries, the circuit breaker (the EngineClient's, shared with its threads), the adaptive in-flight limit and
+# metrics work as in EngineClient. The limit is an AdaptiveLimiter of the async client growing up to max_in_flight,
+# the EngineClient's own limiter stays sized for its connection pool. Cached inventory endpoints and listings
+# (see ResponseCache) are read through EngineClient so they share its cache, and writes invalidate it.
+# The engine operations (list, create job/ruleset, run, status) are written once here, waiting for executions
+# and async tasks is masking_engine.poll_until_done for both clients. Synchronous script functions call them with run_sync(), which keeps one event loop per
+# EngineClient in a background thread so the connection pool is reused from call to call.
+##################################################################################################################
+
+import asyncio
+import atexit
+import functools
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from masking_engine import (DEFAULT_PAGE_SIZE, DEFAULT_PAGE_WORKERS, IDEMPOTENT_METHODS, MAX_RETRIES, REFUSED_STATUSES,
+                            RETRY_STATUSES, AdaptiveLimiter, CircuitOpenError, EngineError, backoff_delay, metrics)
+from masking_models import Execution, MaskingJob
+
+try:
+    import aiohttp
+except ImportError:
+    # Without aiohttp the async client runs the synchronous client in threads
+    aiohttp = None
+
+# Errors of a request that got no response from the engine, raised by either send path
+TRANSPORT_ERRORS = (requests.RequestException, asyncio.TimeoutError) + ((aiohttp.ClientError,) if aiohttp else ())
+
+# Default limits: connections kept open to one engine, and requests outstanding at once
+DEFAULT_ASYNC_POOL_SIZE = 100
+DEFAULT_MAX_IN_FLIGHT = 1000
+
+
+# An aiohttp response with its body already read, with the requests.Response attributes the scripts use
+class AsyncResponse:
+    def __init__(self, status_code, content, headers, url):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncEngineClient:
+    # Create an async client for the engine of an EngineClient.
+    # pool_size     : aiohttp connections kept open to the engine, or threads sending requests without aiohttp
+    # max_in_flight : requests outstanding at once, the others wait for a free slot. Requests sent with aiohttp
+    #                 are further held to an adaptive limit that starts at pool_size and grows up to max_in_flight
+    def __init__(self, engine, pool_size=DEFAULT_ASYNC_POOL_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.engine = engine
+        self.name = engine.name
+        self.pool_size = pool_size
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.limiter = AdaptiveLimiter(initial=min(pool_size, max_in_flight), maximum=max_in_flight)
+        self.slot_freed = asyncio.Condition()
+        self.session = None
+        self.executor = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                                 headers={'accept': 'application/json'},
+                                                 timeout=aiohttp.ClientTimeout(total=self.engine.timeout))
+        return self.session
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    # Run a blocking EngineClient call in the client's threads, not the loop's small default pool
+    def _in_thread(self, func, *args, **kwargs):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=f"{self.name} requests")
+        return asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    # Log in with the EngineClient (token cache included) and use its token
+    async def login(self, login_data=None):
+        return await asyncio.to_thread(self.engine.login, login_data)
+
+    async def _breaker_wait(self):
+        breaker = self.engine.breaker
+        started = time.monotonic()
+        while True:
+            delay = breaker.wait_time()
+            if not delay:
+                return
+            waited = time.monotonic() - started
+            if waited > breaker.max_wait:
+                raise CircuitOpenError(self.name, waited)
+            await asyncio.sleep(min(delay, 1.0))
+
+    # Wait for a slot of the adaptive limit without blocking the loop, slots are only freed by this loop
+    async def _acquire_slot(self):
+        async with self.slot_freed:
+            await self.slot_freed.wait_for(self.limiter.try_acquire)
+
+    # Give a slot back with the request's latency, or without a sample when latency is None (cancelled)
+    async def _release_slot(self, latency=None, failed=False):
+        if latency is None:
+            self.limiter.cancel()
+        else:
+            self.limiter.release(latency, failed)
+        async with self.slot_freed:
+            self.slot_freed.notify_all()
+
+    # Send one HTTP request through the circuit breaker and the adaptive in-flight limit, timed in metrics
+    async def _send(self, method, path, request_headers, kwargs):
+        await self._breaker_wait()
+        await self._acquire_slot()
+        started = time.monotonic()
+        try:
+            async with self._session().request(method, self.engine.url(path), headers=request_headers, **kwargs) as r:
+                content = await r.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            latency = time.monotonic() - started
+            await self._release_slot(latency, True)
+            self.engine.breaker.record(True)
+            metrics.observe(self.name, method, path, type(e).__name__, latency)
+            raise
+        except BaseException:
+            # Cancelled: give the slot back without counting the request
+            await self._release_slot()
+            raise
+        latency = time.monotonic() - started
+        response = AsyncResponse(r.status, content, r.headers, str(r.url))
+        failed = response.status_code in RETRY_STATUSES
+        await self._release_slot(latency, failed)
+        self.engine.breaker.record(failed)
+        metrics.observe(self.name, method, path, response.status_code, latency, kwargs.get('params'), content)
+        return response
+
+    # Same retry policy as EngineClient._send_with_retries
+    async def _send_with_retries(self, method, path, request_headers, kwargs, retry):
+        for attempt in range(MAX_RETRIES + 1):
+            last_attempt = attempt == MAX_RETRIES
+            try:
+                response = await self._send(method, path, request_headers, kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # A connection that could not be opened never reached the engine, like a connect timeout
+                if last_attempt or not (retry or isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if last_attempt or response.status_code not in RETRY_STATUSES:
+                return response
+            if not (retry or response.status_code in REFUSED_STATUSES):
+                return response
+            await asyncio.sleep(backoff_delay(attempt, response))
+
+    # Send a request to the engine. A 401 re-logs in through the EngineClient (once for every caller) and
+    # retries the request once. A successful write invalidates the cached responses it touched.
+    async def request(self, method, path, retry=None, **kwargs):
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        cache = self.engine.response_cache
+        async with self.in_flight:
+            if aiohttp is None or (cache and method == 'GET' and cache.cached_endpoint(path, kwargs.get('params'))):
+                return await self._in_thread(self.engine.request, method, path, retry=retry, **kwargs)
+            request_headers = dict(kwargs.pop('headers', None) or {})
+            token = self.engine.auth_token
+            if token and 'Authorization' not in request_headers:
+                request_headers['Authorization'] = token
+            response = await self._send_with_retries(method, path, request_headers, kwargs, retry)
+            if response.status_code == 401 and token and self.engine.login_data and request_headers.get('Authorization') == token:
+                if await asyncio.to_thread(self.engine.relogin, token):
+                    request_headers['Authorization'] = self.engine.auth_token
+                    response = await self._send_with_retries(method, path, request_headers, kwargs, retry)
+        if method not in IDEMPOTENT_METHODS and response.status_code < 400:
+            await asyncio.to_thread(self.engine.invalidate, path)
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    # GET path and return its JSON body, EngineError unless the engine answered 200
+    async def get_json(self, path, **kwargs):
+        response = await self.get(path, **kwargs)
+        if response.status_code != 200:
+            raise EngineError(response)
+        return response.json()
+
+    # Fetch one page of a list endpoint and return (records, total)
+    async def fetch_page(self, path, page_number, page_size, params=None):
+        page_params = dict(params or {})
+        page_params.update({'page_number': page_number, 'page_size': page_size})
+        body = await self.get_json(path, params=page_params)
+        return body.get('responseList', []), body.get('_pageInfo', {}).get('total')
+
+    # Iterate over every record of a list endpoint, in engine order, with `workers` pages fetched at once.
+    # Cached listings are read whole through the EngineClient's response cache.
+    async def paginate(self, path, params=None, page_size=DEFAULT_PAGE_SIZE, workers=DEFAULT_PAGE_WORKERS):
+        cache = self.engine.response_cache
+        if cache and cache.endpoint(path):
+            for record in await self._in_thread(lambda: list(self.engine.paginate(path, params, page_size, workers))):
+                yield record
+            return
+        records, total = await self.fetch_page(path, 1, page_size, params)
+        for record in records:
+            yield record
+        if total is None:
+            page_number = 1
+            while len(records) == page_size:
+                page_number += 1
+                records, _ = await self.fetch_page(path, page_number, page_size, params)
+                for record in records:
+                    yield record
+            return
+        pages = iter(range(2, math.ceil(total / page_size) + 1))
+        window = deque()
+        try:
+            for page_number in pages:
+                window.append(asyncio.ensure_future(self.fetch_page(path, page_number, page_size, params)))
+                if len(window) >= workers:
+                    break
+            while window:
+                records, _ = await window.popleft()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    window.append(asyncio.ensure_future(self.fetch_page(path, next_page, page_size, params)))
+                for record in records:
+                    yield record
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def list_all(self, path, params=None):
+        return [record async for record in self.paginate(path, params)]
+
+    # Create a masking job or database ruleset and return the engine's response body
+    async def create_masking_job(self, job_data):
+        return await self.create('masking-jobs', job_data)
+
+    async def create_database_ruleset(self, ruleset_data):
+        return await self.create('database-rulesets', ruleset_data)
+
+    # Create an object of any list endpoint and return the engine's response body
+    async def create(self, path, data):
+        response = await self.post(path, headers={'Content-Type': 'application/json'}, json=data)
+        if response.status_code != 200:
+            raise EngineError(response)
+        return response.json()
+
+    # Start a masking or profile job, returns the executionId
+    async def run_job(self, job_id):
+        response = await self.post('executions', headers={'Content-Type': 'application/json'}, json={"jobId": job_id})
+        if response.status_code != 200:
+            raise EngineError(response)
+        return response.json().get('executionId')
+
+    # Details of a masking job as a MaskingJob, a job that cannot be read is 'Unknown'
+    async def job(self, job_id):
+        response = await self.get(f"masking-jobs/{job_id}")
+        if response.status_code != 200:
+            print(f"Failed to retrieve details for Job ID {job_id}.")
+            print(f"Status Code: {response.status_code}, Response: {response.text}")
+            return MaskingJob(job_id, 'Unknown')
+        return MaskingJob.from_response(response.json())
+
+    # Status of one execution as an Execution with its job name.
+    # jobs is an optional jobId -> lookup task map shared by a batch, so every job is looked up once.
+    async def execution(self, execution_id, jobs=None):
+        execution = Execution.from_response(await self.get_json(f"executions/{execution_id}"))
+        jobs = {} if jobs is None else jobs
+        if execution.job_id not in jobs:
+            jobs[execution.job_id] = asyncio.ensure_future(self.job(execution.job_id))
+        execution.job_name = (await jobs[execution.job_id]).name
+        return execution
+
+    # Status of many executions at once, in input order; an execution that cannot be read gives its exception
+    async def executions(self, execution_ids):
+        jobs = {}
+        return await asyncio.gather(*(self.execution(execution_id, jobs) for execution_id in execution_ids), return_exceptions=True)
+
+    # Start a ruleset refresh, returns the path of its async task
+    async def refresh_ruleset(self, ruleset_id):
+        response = await self.put(f"database-rulesets/{ruleset_id}/refresh", json={})
+        if response.status_code != 200:
+            raise EngineError(response)
+        return f"async-tasks/{response.json().get('asyncTaskId')}"
+
+
+# An event loop in a background thread holding the AsyncEngineClient of one EngineClient
+class EngineLoop:
+    def __init__(self, engine, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=f"{engine.name} event loop", daemon=True)
+        self.thread.start()
+        self.client = AsyncEngineClient(engine, max_in_flight=max_in_flight)
+
+    # Run operation(client) on the loop and wait for its result
+    def run(self, operation):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            raise RuntimeError("run_sync() called from the engine's own event loop, await the operation instead")
+        return asyncio.run_coroutine_threadsafe(operation(self.client), self.loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=10)
+
+
+# EngineClient -> its EngineLoop, for the life of the process
+_loops = {}
+_loops_lock = threading.Lock()
+
+# Run an AsyncEngineClient operation from synchronous code and return its result, e.g.
+#   run_sync(engine, lambda client: client.execution(12))
+# Every call for the same EngineClient shares one event loop and connection pool.
+# The loop is stopped by engine.close() or at exit.
+def run_sync(engine, operation):
+    with _loops_lock:
+        engine_loop = _loops.get(engine)
+        if engine_loop is None:
+            engine_loop = _loops[engine] = EngineLoop(engine)
+            engine.on_close(lambda: _close_loop(engine))
+    return engine_loop.run(operation)
+
+def _close_loop(engine):
+    with _loops_lock:
+        engine_loop = _loops.pop(engine, None)
+    if engine_loop:
+        engine_loop.close()
+
+@atexit.register
+def _close_loops():
+    with _loops_lock:
+        engine_loops = list(_loops.values())
+        _loops.clear()
+    for engine_loop in engine_loops:
+        try:
+            engine_loop.close()
+        except (RuntimeError, TimeoutError):
+            # The loop is already gone at interpreter exit
+            pass
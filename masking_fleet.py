@@ -0,0 +1,112 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_fleet.py
+# Version   : v1
+# Lists rulesets, connectors, masking jobs or executions on every masking engine of a fleet at once.
+# Each engine has its own login and connection pool, the engines are queried concurrently and the results
+# are merged into one table tagged by engine, so a fleet-wide sweep takes about as long as the slowest engine.
+# Usage: python masking_fleet.py rulesets|connectors|jobs|executions [--fleet masking_fleet.json] [--status RUNNING]
+# The fleet file lists the engines:
+#   {"engines": [{"name": "prod1", "host": "engine1.example.com", "apiVersion": "v5.1.35",
+#                 "username": "admin", "password": "..."}]}
+##################################################################################################################
+
+import argparse
+
+from execution_history import ExecutionHistory
+from masking_engine import add_metrics_arguments, enable_metrics, fan_out, load_fleet
+from masking_models import Connector, Execution, ExecutionTable, MaskingJob, Ruleset
+
+DEFAULT_FLEET_FILE = 'masking_fleet.json'
+
+# Endpoint, record type and columns printed for each listing: (heading, width, record attribute)
+LISTINGS = {
+    'rulesets': ('database-rulesets', Ruleset, [('Ruleset ID', 15, 'ruleset_id'), ('Ruleset Name', 30, 'name'),
+                                                ('Connector ID', 15, 'connector_id')]),
+    'connectors': ('database-connectors', Connector, [('Connector ID', 15, 'connector_id'), ('Connector Name', 30, 'name'),
+                                                      ('Database Type', 15, 'database_type')]),
+    'jobs': ('masking-jobs', MaskingJob, [('Job ID', 10, 'job_id'), ('Job Name', 30, 'name'), ('Ruleset ID', 15, 'ruleset_id')]),
+}
+
+EXECUTION_COLUMNS = [('Execution ID', 15, 'execution_id'), ('Job ID', 10, 'job_id'), ('Job Name', 20, 'job_name'),
+                     ('Status', 10, 'status'), ('Rows Masked', 12, 'rows_masked'), ('Start Time', 20, 'start_text'),
+                     ('End Time', 20, 'end_text')]
+
+ENGINE_WIDTH = 20
+
+# Executions written to the history with one commit
+HISTORY_BATCH = 500
+
+
+# List every record of one endpoint on one engine as objects of the listing's record type
+def list_records(engine, path, record_type):
+    return [record_type.from_response(body) for body in engine.paginate(path)]
+
+# List the executions of one engine with the job name of each, using one jobs listing instead of a lookup per execution.
+# The executions are kept in an ExecutionTable, a fleet sweep of 100k executions stays a few MB.
+# Every execution seen is also recorded in history when one is given, HISTORY_BATCH at a time.
+def list_executions(engine, status=None, history=None):
+    job_names = {job.job_id: job.name for job in map(MaskingJob.from_response, engine.paginate('masking-jobs'))}
+    executions = ExecutionTable()
+    batch = []
+    for body in engine.paginate('executions'):
+        execution = Execution.from_response(body, job_names.get(body.get('jobId'), 'Unknown'))
+        if history:
+            batch.append(execution)
+            if len(batch) >= HISTORY_BATCH:
+                history.record_many(engine.host, batch)
+                batch = []
+        if status and execution.status != status:
+            continue
+        executions.append(execution)
+    if history:
+        history.record_many(engine.host, batch)
+    return executions
+
+def display(value):
+    return 'Unknown' if value is None else str(value)
+
+# Print the merged results of every engine as one table with an Engine column
+def print_fleet_table(title, columns, results):
+    print(f"\n{title}:")
+    print(f"{'Engine':<{ENGINE_WIDTH}}" + ''.join(f"{heading:<{width}}" for heading, width, _ in columns))
+    print("="*(ENGINE_WIDTH + sum(width for _, width, _ in columns)))
+    for engine, records, error in results:
+        if error:
+            continue
+        for record in records:
+            print(f"{engine.name:<{ENGINE_WIDTH}}" + ''.join(f"{display(getattr(record, name)):<{width}}" for _, width, name in columns))
+    for engine, _, error in results:
+        if error:
+            print(f"Failed to query engine {engine.name}. {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query every masking engine of a fleet concurrently.")
+    parser.add_argument('listing', choices=sorted(LISTINGS) + ['executions'])
+    parser.add_argument('--fleet', default=DEFAULT_FLEET_FILE, help="Fleet configuration file")
+    parser.add_argument('--status', help="With executions, only show executions with this status, e.g. RUNNING")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    fleet = load_fleet(args.fleet)
+    logins = {engine: login_data for engine, login_data in fleet}
+    login_results = fan_out(list(logins), lambda engine: engine.login(logins[engine]))
+    engines = [engine for engine, auth_token, error in login_results if auth_token and not error]
+    for engine, auth_token, error in login_results:
+        if error or not auth_token:
+            print(f"Skipping engine {engine.name}, login failed. {error or ''}")
+
+    if args.listing == 'executions':
+        history = ExecutionHistory()
+        results = fan_out(engines, lambda engine: list_executions(engine, args.status, history))
+        print_fleet_table("Job Execution Status", EXECUTION_COLUMNS, results)
+    else:
+        path, record_type, columns = LISTINGS[args.listing]
+        results = fan_out(engines, lambda engine: list_records(engine, path, record_type))
+        print_fleet_table(f"Existing {args.listing.capitalize()}", columns, results)
+
+if __name__ == "__main__":
+    main()
@@ -6,67 +6,115 @@
 # Version 1 : Base script to list rulesets and create masking jobs for the selected RuleSet
 # Version 2 : Sort the menu options and add multiple job selection
 # Version 3 : Add the ability to list anr run masking jobs with status
-# Interactive Menu: Presents an interactive menu with three options.
+# Version 4 : Batch provisioning of masking jobs from a desired-state file
+# Interactive Menu: Presents an interactive menu with these options.
 # 1. List Existing Rulesets: Retrieves and displays a list of existing rulesets with their IDs and names.
-# 2. Create Masking Job: Prompts the user for a ruleset ID to create a new masking job with the same name as the RuleSet.
-# 3. Exit: Exits the script.
+# 2. Create Masking Job: Prompts the user for ruleset IDs to create new masking jobs with the same name as the RuleSet.
+# 3. List existing masking jobs
+# 4. Run masking job(s): queued through masking_scheduler.py, longest job first, limited per engine and per connector
+# 5. Check status of masking job(s): by execution IDs and/or filters, e.g. "status=FAILED since=today" or "job=12 since=24h"
+#    Running executions show their rows/sec, ETA and SLOW/STALLED flag (execution_progress.py), checking again refines them
+# 6. Provision masking jobs from a desired-state file
+# 7. Exit: Exits the script.
+# Batch mode: python masking_job_rs_creation.py --apply desired_jobs.json [--dry-run]
+#             python masking_job_rs_creation.py --run 12,15-20 [--max-executions 4] [--per-connector 1]
+#             python masking_job_rs_creation.py --status "status=FAILED since=today"
+# The desired-state file is a JSON list (or {"jobs": [...]}) of entries such as
+#   {"rulesetId": 12}
+#   {"rulesetName": "HR_RS", "jobName": "HR_MASK", "feedbackSize": 50000, "databaseMaskingOptions": {"commitSize": 10000}}
+# Missing jobs are created, existing jobs whose settings differ are updated, the rest are left unchanged.
+# New jobs start from the settings saved for their ruleset by masking_job_tuner.py, when there are any.
 ##################################################################################################################
 
-import requests
+import argparse
+import asyncio
 import json
-from datetime import datetime
-
-# Define the API URLs and headers
-login_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/login'
-rulesets_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/database-rulesets?page_number=1'
-create_masking_job_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/masking-jobs'
-masking_jobs_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.33/masking-jobs?page_number=1'
-run_masking_job_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/executions'
-execution_status_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/executions/'
-job_details_url = 'http://uvo1h6cwkmhoeckc9am.vm.cld.sr/masking/api/v5.1.35/masking-jobs/'
-
-headers = {
-    'accept': 'application/json',
-    'Content-Type': 'application/json'
-}
-
-login_data = {
-    'username': 'admin',
-    'password': 'Delphix_123!'
-}
-
-def login():
-    response = requests.post(login_url, headers=headers, json=login_data)
-    if response.status_code == 200:
-        return response.json().get('Authorization')
-    else:
-        print("Login failed. Please check your credentials and API endpoint.")
-        return None
+import os
+import shlex
+import time
+from datetime import datetime, timedelta
 
-def fetch_rulesets(auth_token):
-    response = requests.get(rulesets_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
+from execution_history import ExecutionHistory
+from execution_progress import ProgressTracker, format_duration, format_rate
+from masking_engine import (TERMINAL_STATUSES, EngineClient, EngineError, RateLimiter, add_cache_arguments, add_metrics_arguments,
+                            enable_metrics, open_response_cache, parse_id_ranges)
+from masking_engine_async import TRANSPORT_ERRORS, run_sync
+from masking_models import Execution, MaskingJob, Ruleset, parse_time
+from masking_scheduler import DEFAULT_MAX_EXECUTIONS, DEFAULT_PER_CONNECTOR, schedule_masking_jobs, slot_limit
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 10
+
+# Concurrency used when provisioning masking jobs in bulk. Requests are paced by the engine's adaptive
+# in-flight limit, a fixed requests/sec cap is only applied when --rate is given.
+PROVISION_WORKERS = 8
+PROVISION_RATE = None
+
+# Per-ruleset job settings found by masking_job_tuner.py
+DEFAULT_TUNING_FILE = os.environ.get('MASKING_TUNING_FILE', os.path.expanduser('~/.config/delphix_masking/job_tuning.json'))
+
+# Status checks of up to this many execution IDs fetch each execution, larger ones read the executions listing
+DIRECT_LOOKUP_LIMIT = 20
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+def login(engine):
+    return engine.login()
+
+def fetch_rulesets(engine):
+    try:
+        return list(engine.paginate('database-rulesets'))
+    except EngineError:
         print("Failed to retrieve rulesets.")
         return []
 
-def list_masking_jobs(auth_token):
-    response = requests.get(masking_jobs_url, headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        return response.json().get('responseList', [])
-    else:
+def list_masking_jobs(engine):
+    try:
+        return list(engine.paginate('masking-jobs'))
+    except EngineError:
         print("Failed to retrieve masking jobs.")
         return []
 
-def create_masking_job(auth_token, ruleset_id, ruleset_name):
-    existing_jobs = list_masking_jobs(auth_token)
-    if any(job['jobName'] == ruleset_name for job in existing_jobs):
-        print(f"Failed to create masking job. '{ruleset_name}' already exists")
-        return
+# Fastest job settings per engine and ruleset, saved by masking_job_tuner.py.
+# {"engine|rulesetId": {"settings": {"feedbackSize": ..., "databaseMaskingOptions": {...}}, "rowsPerSec": ..., "tunedAt": ...}}
+class TunedSettings:
+    def __init__(self, path=DEFAULT_TUNING_FILE):
+        self.path = path
+        self.rulesets = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.rulesets = json.load(f)
+
+    # Saved settings for a ruleset, None when it was never tuned
+    def get(self, engine_name, ruleset_id):
+        entry = self.rulesets.get(f"{engine_name}|{ruleset_id}")
+        return entry['settings'] if entry else None
+
+    def save(self, engine_name, ruleset_id, settings, rows_per_sec):
+        self.rulesets[f"{engine_name}|{ruleset_id}"] = {"settings": settings, "rowsPerSec": rows_per_sec, "tunedAt": time.time()}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.rulesets, f, indent=2)
+        os.replace(tmp_path, self.path)
 
+# Merge job settings into a job body, nested objects such as databaseMaskingOptions are merged key by key
+def apply_job_settings(job_data, settings):
+    for key, value in (settings or {}).items():
+        if isinstance(value, dict) and isinstance(job_data.get(key), dict):
+            job_data[key].update(value)
+        else:
+            job_data[key] = value
+    return job_data
+
+# Build the request body for a masking job.
+# tuned are the settings saved for the ruleset, overrides come from a desired-state entry and win over them.
+def build_job_data(ruleset_id, job_name, overrides=None, tuned=None):
     job_data = {
-        "jobName": ruleset_name,
+        "jobName": job_name,
         "rulesetId": ruleset_id,
         "jobDescription": "",
         "feedbackSize": 100000,
@@ -85,108 +133,363 @@ def create_masking_job(auth_token, ruleset_id, ruleset_name):
             }
         }
     }
-    response = requests.post(create_masking_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=job_data)
-    if response.status_code == 200:
-        job_response = response.json()
-        print("\nMasking Job Details:")
-        print("maskingJobId:", job_response['maskingJobId'])
-        print("jobName:", job_response['jobName'])
-        print("rulesetId:", job_response['rulesetId'])
-        print("Masking job created successfully!")
-    else:
-        print("Failed to create masking job.")
+    apply_job_settings(job_data, tuned)
+    return apply_job_settings(job_data, overrides)
 
-def run_masking_job(auth_token, job_id):
-    job_data = {
-        "jobId": job_id
-    }
-    response = requests.post(run_masking_job_url, headers={'Authorization': auth_token, 'Content-Type': 'application/json'}, json=job_data)
-    if response.status_code == 200:
-        execution_id = response.json().get('executionId')
-        return execution_id
-    else:
-        print(f"Failed to execute masking job {job_id}.")
-        return None
+# Names of the masking jobs on each engine (EngineClient -> set), listed once and kept up to date with the jobs
+# created from this process, so creating jobs one at a time does not page through every job for each one
+_job_names = {}
 
-def fetch_job_details(auth_token, job_id):
-    response = requests.get(f"{job_details_url}{job_id}", headers={'Authorization': auth_token})
-    if response.status_code == 200:
-        job_details = response.json()
-        return {
-            "jobId": job_id,
-            "jobName": job_details.get('jobName', 'Unknown')
-        }
-    else:
-        print(f"Failed to retrieve details for Job ID {job_id}.")
-        return {
-            "jobId": job_id,
-            "jobName": 'Unknown'
-        }
+def masking_job_names(engine):
+    names = _job_names.get(engine)
+    if names is None:
+        names = _job_names[engine] = {job['jobName'] for job in engine.paginate('masking-jobs')}
+    return names
+
+# Add a job created from this process to the engine's index, once the engine's jobs have been listed
+def remember_masking_job(engine, job_name):
+    names = _job_names.get(engine)
+    if names is not None:
+        names.add(job_name)
+
+def create_masking_job(engine, ruleset_id, ruleset_name):
+    try:
+        job_names = masking_job_names(engine)
+    except EngineError:
+        print("Failed to retrieve masking jobs.")
+        return
+    if ruleset_name in job_names:
+        print(f"Failed to create masking job. '{ruleset_name}' already exists")
+        return
 
-def format_datetime(dt_str):
+    job_data = build_job_data(ruleset_id, ruleset_name, tuned=TunedSettings().get(engine.name, ruleset_id))
     try:
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y-%m-%dT%H:%M:%S')
-    except ValueError:
-        return 'Unknown'
+        job_response = run_sync(engine, lambda client: client.create_masking_job(job_data))
+    except EngineError:
+        print("Failed to create masking job.")
+        return
+    remember_masking_job(engine, ruleset_name)
+    print("\nMasking Job Details:")
+    print("maskingJobId:", job_response['maskingJobId'])
+    print("jobName:", job_response['jobName'])
+    print("rulesetId:", job_response['rulesetId'])
+    print("Masking job created successfully!")
+
+# Check whether an existing job differs from the desired job body.
+# Only plain values are compared, scripts and other nested objects are left as they are on the engine.
+def job_needs_update(existing_job, job_data):
+    for key, value in job_data.items():
+        if isinstance(value, dict):
+            existing_value = existing_job.get(key) or {}
+            if any(not isinstance(v, dict) and existing_value.get(k) != v for k, v in value.items()):
+                return True
+        elif key != 'jobDescription' and existing_job.get(key) != value:
+            return True
+    return False
+
+# Read a desired-state file: a JSON list of job entries, or an object with a "jobs" list
+def load_desired_jobs(path):
+    with open(path) as f:
+        desired = json.load(f)
+    if isinstance(desired, dict):
+        desired = desired.get('jobs', [])
+    return desired
+
+# Compare the desired jobs with one inventory fetch of rulesets and jobs.
+# Returns one plan item per desired entry with an action of create, update, unchanged, exists or error.
+def plan_masking_jobs(engine, desired_jobs, allow_update=True):
+    rulesets = fetch_rulesets(engine)
+    rulesets_by_id = {r['databaseRulesetId']: r for r in rulesets}
+    rulesets_by_name = {r['rulesetName']: r for r in rulesets}
+    jobs_by_name = {job['jobName']: job for job in list_masking_jobs(engine)}
+    _job_names[engine] = set(jobs_by_name)
+    tuned_settings = TunedSettings()
+
+    plan = []
+    planned_names = set()
+    for entry in desired_jobs:
+        overrides = {k: v for k, v in entry.items() if k not in ('rulesetId', 'rulesetName', 'jobName')}
+        if 'rulesetId' in entry:
+            ruleset = rulesets_by_id.get(entry['rulesetId'])
+        else:
+            ruleset = rulesets_by_name.get(entry.get('rulesetName'))
+        ruleset_ref = entry.get('rulesetId', entry.get('rulesetName'))
+        if not ruleset:
+            plan.append({"jobName": entry.get('jobName', ''), "rulesetId": ruleset_ref, "action": "error",
+                         "message": f"Rule set {ruleset_ref} does not exist"})
+            continue
+
+        job_name = entry.get('jobName', ruleset['rulesetName'])
+        job_data = build_job_data(ruleset['databaseRulesetId'], job_name, overrides,
+                                  tuned_settings.get(engine.name, ruleset['databaseRulesetId']))
+        item = {"jobName": job_name, "rulesetId": ruleset['databaseRulesetId'], "jobData": job_data}
+        existing_job = jobs_by_name.get(job_name)
+        if job_name in planned_names:
+            item.update(action="error", message="Duplicate job name in desired state")
+        elif not existing_job:
+            item.update(action="create")
+        elif not allow_update:
+            item.update(action="exists", maskingJobId=existing_job['maskingJobId'], message=f"'{job_name}' already exists")
+        elif job_needs_update(existing_job, job_data):
+            item.update(action="update", maskingJobId=existing_job['maskingJobId'])
+        else:
+            item.update(action="unchanged", maskingJobId=existing_job['maskingJobId'])
+        planned_names.add(job_name)
+        plan.append(item)
+    return plan
 
-def check_execution_status(auth_token, execution_id):
-    response = requests.get(f"{execution_status_url}{execution_id}", headers={'Authorization': auth_token})
+# Send the create/update request for one plan item and record the outcome on it, at most `slots` items at once.
+# A transport error or an open circuit fails only this item, the rest of the batch carries on.
+async def apply_plan_item(client, item, slots, rate_limiter=None):
+    async with slots:
+        if rate_limiter:
+            await asyncio.to_thread(rate_limiter.acquire)
+        try:
+            if item['action'] == 'create':
+                response = await client.post('masking-jobs', headers={'Content-Type': 'application/json'}, json=item['jobData'])
+            else:
+                # Replacing a job with the same body is idempotent, so the update may be retried on engine errors
+                response = await client.put(f"masking-jobs/{item['maskingJobId']}", headers={'Content-Type': 'application/json'},
+                                            json=item['jobData'], retry=True)
+        except (EngineError,) + TRANSPORT_ERRORS as e:
+            item['result'] = 'FAILED'
+            item['message'] = f"{type(e).__name__}: {e}"
+            return item
     if response.status_code == 200:
-        execution_details = response.json()
-        job_id = execution_details.get('jobId')
-        job_details = fetch_job_details(auth_token, job_id)
-        return {
-            "executionId": execution_id,
-            "jobId": job_details["jobId"],
-            "jobName": job_details["jobName"],
-            "status": execution_details.get('status', 'Unknown'),
-            "rowsMasked": execution_details.get('rowsMasked', 'Unknown'),
-            "startTime": format_datetime(execution_details.get('startTime', 'Unknown')),
-            "endTime": format_datetime(execution_details.get('endTime', 'Unknown'))
-        }
+        remember_masking_job(client.engine, item['jobName'])
+        item['maskingJobId'] = response.json().get('maskingJobId', item.get('maskingJobId'))
+        item['result'] = 'OK'
     else:
-        print(f"Failed to retrieve status for Execution ID {execution_id}. Response Code: {response.status_code}")
-        return None
+        item['result'] = 'FAILED'
+        item['message'] = f"Status Code: {response.status_code}, Response: {response.text}"
+    return item
+
+async def apply_plan(client, changes, workers, rate_limiter=None):
+    slots = asyncio.Semaphore(workers)
+    return await asyncio.gather(*(apply_plan_item(client, item, slots, rate_limiter) for item in changes))
+
+# Create or update every planned job concurrently, at most rate requests/sec when rate is given, then print a per-item report
+def provision_masking_jobs(engine, desired_jobs, allow_update=True, dry_run=False, workers=PROVISION_WORKERS, rate=PROVISION_RATE):
+    plan = plan_masking_jobs(engine, desired_jobs, allow_update)
+    changes = [item for item in plan if item['action'] in ('create', 'update')]
+    for item in plan:
+        if item not in changes:
+            item['result'] = 'FAILED' if item['action'] in ('error', 'exists') else 'OK'
+        elif dry_run:
+            item['result'] = 'PLANNED'
+
+    if changes and not dry_run:
+        rate_limiter = RateLimiter(rate) if rate else None
+        run_sync(engine, lambda client: apply_plan(client, changes, workers, rate_limiter))
 
-def check_multiple_execution_statuses(auth_token, execution_ids):
-    statuses = [check_execution_status(auth_token, execution_id) for execution_id in execution_ids]
-    
-    # Print header
+    print("\nMasking Job Provisioning Report:")
+    print(f"{'Job Name':<30}{'Ruleset ID':<12}{'Action':<11}{'Result':<9}{'Job ID':<10}{'Message'}")
+    print("="*100)
+    for item in plan:
+        print(f"{item['jobName']:<30}{str(item['rulesetId']):<12}{item['action']:<11}{item['result']:<9}{str(item.get('maskingJobId', '')):<10}{item.get('message', '')}")
+    counts = {}
+    for item in plan:
+        counts[item['action']] = counts.get(item['action'], 0) + 1
+    print(", ".join(f"{action}: {count}" for action, count in counts.items()))
+    return plan
+
+# Print the status table heading and one row per Execution
+# With a ProgressTracker the table also shows the rows/sec, ETA and flag of every execution
+def print_execution_header(progress=None):
     print("\nJob Execution Status:")
-    print(f"{'Execution ID':<15}{'Job ID':<10}{'Job Name':<20}{'Status':<10}{'Rows Masked':<12}{'Start Time':<20}{'End Time':<20}")
-    print("="*120)
-    
-    # Print details
-    for status in statuses:
-        if status:
-            print(f"{status['executionId']:<15}{status['jobId']:<10}{status['jobName']:<20}{status['status']:<10}{status['rowsMasked']:<12}{status['startTime']:<20}{status['endTime']:<20}")
+    columns = f"{'Execution ID':<15}{'Job ID':<10}{'Job Name':<20}{'Status':<10}{'Rows Masked':<12}{'Start Time':<20}{'End Time':<20}"
+    if progress:
+        columns += f"{'Rows/sec':<12}{'Avg Rows/sec':<14}{'ETA':<10}{'Flag':<8}"
+    print(columns)
+    print("="*(164 if progress else 120))
 
-def parse_ruleset_ids(input_str):
-    ruleset_ids = []
-    for part in input_str.split(','):
-        if '-' in part:
-            start, end = map(int, part.split('-'))
-            ruleset_ids.extend(range(start, end + 1))
+def print_execution_row(execution, progress=None):
+    rows_masked = 'Unknown' if execution.rows_masked is None else execution.rows_masked
+    row = (f"{execution.execution_id:<15}{execution.job_id:<10}{execution.job_name or 'Unknown':<20}{execution.status:<10}"
+           f"{rows_masked:<12}{execution.start_text:<20}{execution.end_text:<20}")
+    sampled = progress.get(execution.execution_id) if progress else None
+    if sampled:
+        running = execution.status not in TERMINAL_STATUSES
+        row += (f"{format_rate(sampled.rate) if running else '':<12}{format_rate(sampled.smoothed_rate):<14}"
+                f"{format_duration(sampled.eta) if running else '':<10}{sampled.flag():<8}")
+    print(row)
+
+# Sample an execution's progress, then record it: the tracker reads the previous observation from the history.
+# history is an optional ExecutionHistory every observed execution is recorded in,
+# progress an optional ProgressTracker every observed execution is sampled by
+def observe(engine, execution, history=None, progress=None):
+    if progress:
+        progress.observe(execution)
+    if history:
+        history.record(engine.host, execution)
+
+# Check every execution at once from the engine's event loop, each job is looked up only once.
+# An execution that cannot be read gets an error row, the others are still printed in input order.
+def check_multiple_execution_statuses(engine, execution_ids, history=None, progress=None):
+    execution_ids = list(execution_ids)
+    executions = run_sync(engine, lambda client: client.executions(execution_ids))
+
+    print_execution_header(progress)
+    for execution_id, execution in zip(execution_ids, executions):
+        if isinstance(execution, EngineError):
+            print(f"Failed to retrieve status for Execution ID {execution_id}. Response Code: {execution.status_code}")
+            print(f"Response: {execution.text}")
+            continue
+        if isinstance(execution, BaseException):
+            print(f"Failed to retrieve status for Execution ID {execution_id}. {type(execution).__name__}: {execution}")
+            continue
+        observe(engine, execution, history, progress)
+        print_execution_row(execution, progress)
+
+# Seconds since the epoch for a since=/until= value: an ISO date or time, today, yesterday, or an age such as 30m, 24h or 7d
+def parse_time_bound(value):
+    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if value == 'today':
+        return midnight.timestamp()
+    if value == 'yesterday':
+        return (midnight - timedelta(days=1)).timestamp()
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    if value[:-1].isdigit() and value[-1:] in units:
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    bound = parse_time(value)
+    if bound is None:
+        raise ValueError(f"Invalid time '{value}'")
+    return bound
+
+# Parse a status query such as "5-7 job=12 status=FAILED since=today".
+# Bare IDs and ranges select executions, job= takes job IDs/ranges or a job name (quote names with spaces),
+# status= one or more statuses separated by commas, since=/until= bound the execution start time.
+# Every execution on the engine is only listed for an explicit "all", an empty query is rejected.
+def parse_status_query(input_str):
+    tokens = shlex.split(input_str)
+    if not tokens:
+        raise ValueError("Empty query, give execution IDs, filters or 'all' for every execution")
+    query = {}
+    for token in tokens:
+        key, separator, value = token.partition('=')
+        if token.lower() == 'all':
+            continue
+        if not separator:
+            query['executionIds'] = parse_id_ranges(f"{query['executionIds']},{token}" if 'executionIds' in query else token)
+        elif key == 'job':
+            try:
+                query['jobIds'] = parse_id_ranges(value)
+            except ValueError:
+                query['jobName'] = value
+        elif key == 'status':
+            query['statuses'] = {status.strip().upper() for status in value.split(',')}
+        elif key in ('since', 'until'):
+            query[key] = parse_time_bound(value)
         else:
-            ruleset_ids.append(int(part.strip()))
-    return ruleset_ids
+            raise ValueError(f"Unknown filter '{key}'")
+    return query
+
+# The execution of an executions listing record when it matches the job, status and time filters of a query, else None
+def match_execution(body, query, job_ids, job_names):
+    if job_ids is not None and body.get('jobId') not in job_ids:
+        return None
+    if 'statuses' in query and body.get('status') not in query['statuses']:
+        return None
+    execution = Execution.from_response(body, job_names.get(body.get('jobId'), 'Unknown'))
+    if 'since' in query or 'until' in query:
+        start_time = execution.start_time
+        if start_time is None or not query.get('since', start_time) <= start_time <= query.get('until', start_time):
+            return None
+    return execution
+
+# Stream the executions matching a status query from the executions listing as Execution objects, filtering on the client.
+# Executions come in the engine's order (by execution ID), like the direct lookups of a short ID list.
+# A query for a single job uses the engine's job_id filter so only that job's executions are listed,
+# a query for execution IDs stops paging once every one of them has been seen.
+def query_executions(engine, query, job_names):
+    job_ids = query.get('jobIds')
+    if 'jobName' in query:
+        job_ids = {job_id for job_id, name in job_names.items() if name == query['jobName']}
+    params = {'job_id': next(iter(job_ids))} if job_ids is not None and len(job_ids) == 1 else None
+    if job_ids is not None and not job_ids:
+        return
+    execution_ids = query.get('executionIds')
+    remaining = len(execution_ids) if execution_ids is not None else None
+    for body in engine.paginate('executions', params=params, ordered=True):
+        if execution_ids is not None:
+            if body.get('executionId') not in execution_ids:
+                continue
+            remaining -= 1
+        execution = match_execution(body, query, job_ids, job_names)
+        if execution:
+            yield execution
+        if remaining == 0:
+            return
+
+# Print the status of the executions matching a query as they stream in.
+# A short list of execution IDs and nothing else is checked with one GET per execution instead.
+def check_execution_statuses_by_query(engine, query, history=None, progress=None):
+    execution_ids = query.get('executionIds')
+    if execution_ids is not None and len(query) == 1 and len(execution_ids) <= DIRECT_LOOKUP_LIMIT:
+        check_multiple_execution_statuses(engine, list(execution_ids), history=history, progress=progress)
+        return
+
+    job_names = {job.job_id: job.name for job in map(MaskingJob.from_response, list_masking_jobs(engine))}
+    print_execution_header(progress)
+    matched = 0
+    try:
+        for execution in query_executions(engine, query, job_names):
+            observe(engine, execution, history, progress)
+            print_execution_row(execution, progress)
+            matched += 1
+    except EngineError as e:
+        print("Failed to retrieve executions.")
+        print(e)
+    print(f"{matched} executions matched.")
+
+# Ruleset and job IDs are kept as ranges (IdRanges), "1-5000" is never expanded into a list
+def parse_ruleset_ids(input_str):
+    return parse_id_ranges(input_str)
 
 def parse_job_ids(input_str):
-    job_ids = []
-    for part in input_str.split(','):
-        if '-' in part:
-            start, end = map(int, part.split('-'))
-            job_ids.extend(range(start, end + 1))
-        else:
-            job_ids.append(int(part.strip()))
-    return job_ids
+    return parse_id_ranges(input_str)
 
 def main():
-    auth_token = login()
+    parser = argparse.ArgumentParser(description="List rulesets and create, run and check masking jobs.")
+    parser.add_argument('--apply', metavar='FILE', help="Provision the masking jobs in a desired-state JSON file and exit")
+    parser.add_argument('--dry-run', action='store_true', help="With --apply, only print what would be created or updated")
+    parser.add_argument('--workers', type=int, default=PROVISION_WORKERS, help="Concurrent create/update requests when provisioning masking jobs")
+    parser.add_argument('--rate', type=float, default=PROVISION_RATE, help="Cap provisioning at this many requests/sec (default: adaptive, no fixed cap)")
+    parser.add_argument('--run', metavar='JOB_IDS', help="Run these masking jobs (e.g. 12,15-20) through the scheduler and exit")
+    parser.add_argument('--max-executions', type=slot_limit, default=DEFAULT_MAX_EXECUTIONS, help="Maximum executions running on the engine at once")
+    parser.add_argument('--status', metavar='QUERY', help='Print the executions matching a status query, e.g. "status=FAILED since=today" or "all", and exit')
+    parser.add_argument('--per-connector', type=slot_limit, default=DEFAULT_PER_CONNECTOR, help="Maximum executions running against one database connector")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE,
+                          response_cache=open_response_cache(args.no_cache))
+    auth_token = login(engine)
     if not auth_token:
         return
 
+    # Keep every execution status we see for the throughput reports of execution_history.py
+    history = ExecutionHistory()
+    # Rows/sec and ETA of running executions, sampled every time their status is checked
+    progress = ProgressTracker(engine.host, history)
+
+    if args.apply:
+        provision_masking_jobs(engine, load_desired_jobs(args.apply), dry_run=args.dry_run, workers=args.workers, rate=args.rate)
+        return
+    if args.status:
+        try:
+            query = parse_status_query(args.status)
+        except ValueError as e:
+            print(f"Invalid query: {e}")
+            return
+        check_execution_statuses_by_query(engine, query, history, progress)
+        return
+    if args.run:
+        schedule_masking_jobs(engine, parse_job_ids(args.run), args.max_executions, args.per_connector, history)
+        return
+
     while True:
         print("\nSelect an option:")
         print("1. List existing rulesets")
@@ -194,45 +497,60 @@ def main():
         print("3. List existing masking jobs")
         print("4. Run masking job(s)")
         print("5. Check status of masking job(s)")
-        print("6. Exit")
+        print("6. Provision masking jobs from a desired-state file")
+        print("7. Exit")
         choice = input("Enter your choice: ")
 
         if choice == '1':
-            rulesets = fetch_rulesets(auth_token)
+            rulesets = map(Ruleset.from_response, fetch_rulesets(engine))
             print("Existing Rulesets:")
             print(f"{'Database Ruleset ID':<20}{'Ruleset Name':<30}")
             print("="*50)
             for ruleset in rulesets:
-                print(f"{ruleset['databaseRulesetId']:<20}{ruleset['rulesetName']:<30}")
+                print(f"{ruleset.ruleset_id:<20}{ruleset.name:<30}")
         elif choice == '2':
-            rulesets = fetch_rulesets(auth_token)  # Fetch rulesets but don't print
             ruleset_ids_input = input("\nEnter the rulesetIds to create masking jobs (comma-separated for multiple, hyphen for range): ")
-            ruleset_ids = parse_ruleset_ids(ruleset_ids_input)
-            for ruleset_id in ruleset_ids:
-                selected_ruleset = next((r for r in rulesets if r['databaseRulesetId'] == ruleset_id), None)
-                if selected_ruleset:
-                    create_masking_job(auth_token, ruleset_id, selected_ruleset['rulesetName'])
-                else:
-                    print(f"Rule set ID {ruleset_id} does not exist. Failed to create masking job.")
+            try:
+                ruleset_ids = parse_ruleset_ids(ruleset_ids_input)
+            except ValueError:
+                print("Invalid input. Please enter ruleset IDs such as 3,5-7.")
+                continue
+            # Existing jobs are reported, never changed, when creating from ruleset IDs
+            if len(ruleset_ids) > DIRECT_LOOKUP_LIMIT:
+                # A wide range such as 1-5000: only the rulesets that exist in it, not one error per missing ID
+                ruleset_ids = [r.ruleset_id for r in map(Ruleset.from_response, fetch_rulesets(engine)) if r.ruleset_id in ruleset_ids]
+            provision_masking_jobs(engine, [{"rulesetId": ruleset_id} for ruleset_id in ruleset_ids], allow_update=False,
+                                   workers=args.workers, rate=args.rate)
         elif choice == '3':
-            jobs = list_masking_jobs(auth_token)
+            jobs = map(MaskingJob.from_response, list_masking_jobs(engine))
             print("Existing Masking Jobs:")
             print(f"{'Masking Job ID':<20}{'Job Name':<30}")
             print("="*50)
             for job in jobs:
-                print(f"{job['maskingJobId']:<20}{job['jobName']:<30}")
+                print(f"{job.job_id:<20}{job.name:<30}")
         elif choice == '4':
             job_ids_input = input("\nEnter the jobIds to run (comma-separated for multiple, hyphen for range): ")
-            job_ids = parse_job_ids(job_ids_input)
-            for job_id in job_ids:
-                execution_id = run_masking_job(auth_token, job_id)
-                if execution_id:
-                    print(f"Masking job {job_id} executed successfully! Execution ID: {execution_id}")
+            try:
+                job_ids = parse_job_ids(job_ids_input)
+            except ValueError:
+                print("Invalid input. Please enter job IDs such as 3,5-7.")
+                continue
+            schedule_masking_jobs(engine, job_ids, args.max_executions, args.per_connector, history)
         elif choice == '5':
-            execution_ids_input = input("\nEnter the executionIds to check status (comma-separated for multiple, hyphen for range): ")
-            execution_ids = parse_job_ids(execution_ids_input)  # Reusing parse_job_ids for simplicity
-            check_multiple_execution_statuses(auth_token, execution_ids)
+            query_input = input("\nEnter the executionIds (comma-separated or range) and/or filters, e.g. job=12 status=FAILED since=today, or all: ")
+            try:
+                query = parse_status_query(query_input)
+            except ValueError as e:
+                print(f"Invalid query: {e}")
+                continue
+            check_execution_statuses_by_query(engine, query, history, progress)
         elif choice == '6':
+            desired_file = input("\nEnter the path of the desired-state JSON file: ")
+            try:
+                provision_masking_jobs(engine, load_desired_jobs(desired_file), workers=args.workers, rate=args.rate)
+            except (OSError, ValueError) as e:
+                print(f"Failed to read desired-state file: {e}")
+        elif choice == '7':
             print("Exiting...")
             break
         else:
@@ -0,0 +1,199 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_job_tuner.py
+# Version   : v1
+# Finds the fastest commitSize / feedbackSize / batchUpdate / dropConstraints for a ruleset by running trial
+# executions of a masking job, and saves them so new jobs for that ruleset are created with them
+# (see TunedSettings in masking_job_rs_creation.py).
+# Point the trial job at a subset or a clone of the target database: every trial masks it again.
+# - grid     : every combination runs --repeats times, the best median rows/sec wins
+# - halving  : successive halving, every combination runs once, the faster half runs again, and so on
+#              until one is left, so the slow settings only cost one execution each
+# The trial job is put back to its original settings when tuning ends.
+# Usage: python masking_job_tuner.py JOB_ID [--search grid|halving] [--commit-sizes 5000,20000,50000]
+#        [--feedback-sizes 100000] [--batch-update true,false] [--drop-constraints true] [--save-as RULESET_ID] [--dry-run]
+##################################################################################################################
+
+import argparse
+import asyncio
+import itertools
+import math
+
+from execution_history import format_number, median
+from masking_engine import EngineClient, EngineError, add_metrics_arguments, enable_metrics, poll_until_done
+from masking_job_rs_creation import TunedSettings, apply_job_settings
+from masking_models import Execution
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 4
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+# Default search space
+DEFAULT_COMMIT_SIZES = '5000,20000,50000'
+DEFAULT_FEEDBACK_SIZES = '100000'
+DEFAULT_BATCH_UPDATE = 'true,false'
+DEFAULT_DROP_CONSTRAINTS = 'true'
+
+# Successive halving keeps the fastest 1/HALVING_FACTOR of the settings after every round
+HALVING_FACTOR = 2
+
+# Fields of a masking job returned by the engine that cannot be sent back with an update
+READ_ONLY_FIELDS = ('maskingJobId', 'createdBy', 'createdTime')
+
+
+def parse_list(value, convert):
+    return [convert(item.strip()) for item in value.split(',') if item.strip()]
+
+def parse_bool(value):
+    return value.lower() in ('true', 'yes', '1')
+
+# Every combination of the search space as job settings
+def build_candidates(commit_sizes, feedback_sizes, batch_updates, drop_constraints):
+    return [{"feedbackSize": feedback_size,
+             "databaseMaskingOptions": {"commitSize": commit_size, "batchUpdate": batch_update, "dropConstraints": drop}}
+            for commit_size, feedback_size, batch_update, drop in itertools.product(commit_sizes, feedback_sizes, batch_updates, drop_constraints)]
+
+def describe(settings):
+    options = settings['databaseMaskingOptions']
+    return f"commit={options['commitSize']} feedback={settings['feedbackSize']} batch={options['batchUpdate']} drop={options['dropConstraints']}"
+
+
+# Runs trial executions of one masking job with different settings
+class JobTrials:
+    def __init__(self, engine, job_id):
+        self.engine = engine
+        self.job_id = job_id
+        response = engine.get(f"masking-jobs/{job_id}")
+        if response.status_code != 200:
+            raise EngineError(response)
+        self.original = {k: v for k, v in response.json().items() if k not in READ_ONLY_FIELDS}
+        self.ruleset_id = self.original.get('rulesetId')
+        self.current = None
+
+    def _update_job(self, job_data):
+        response = self.engine.put(f"masking-jobs/{self.job_id}", headers={'Content-Type': 'application/json'}, json=job_data, retry=True)
+        if response.status_code != 200:
+            raise EngineError(response)
+
+    # Run the job once with these settings and return rows/sec, None when the execution did not succeed
+    def run(self, settings):
+        if settings is not self.current:
+            job_data = apply_job_settings(dict(self.original, databaseMaskingOptions=dict(self.original.get('databaseMaskingOptions') or {})), settings)
+            self._update_job(job_data)
+            self.current = settings
+        response = self.engine.post('executions', headers={'Content-Type': 'application/json'}, json={"jobId": self.job_id})
+        if response.status_code != 200:
+            raise EngineError(response)
+        execution = Execution.from_response(asyncio.run(poll_until_done(self.engine, f"executions/{response.json()['executionId']}")))
+        if execution.status != 'SUCCEEDED' or execution.rows_masked is None or not execution.duration or execution.duration <= 0:
+            print(f"  {describe(settings)}: execution {execution.execution_id} {execution.status}")
+            return None
+        rate = execution.rows_masked / execution.duration
+        print(f"  {describe(settings)}: {format_number(rate)} rows/sec")
+        return rate
+
+    def restore(self):
+        self._update_job(self.original)
+
+
+# Run every candidate `repeats` times. Returns {index: [rates]}
+def grid_search(trials, candidates, repeats):
+    results = {i: [] for i in range(len(candidates))}
+    for round_number in range(repeats):
+        print(f"\nRound {round_number + 1}: {len(candidates)} settings")
+        for i, settings in enumerate(candidates):
+            results[i].append(trials.run(settings))
+    return results
+
+# Successive halving: run the survivors once more every round and keep the fastest 1/factor of them,
+# ranked on the median of all their runs so far. Failed runs drop a candidate straight away.
+def halving_search(trials, candidates, factor=HALVING_FACTOR):
+    results = {i: [] for i in range(len(candidates))}
+    survivors = list(range(len(candidates)))
+    round_number = 0
+    while survivors:
+        round_number += 1
+        print(f"\nRound {round_number}: {len(survivors)} settings")
+        for i in survivors:
+            results[i].append(trials.run(candidates[i]))
+        survivors = [i for i in survivors if None not in results[i]]
+        if len(survivors) <= 1:
+            break
+        survivors.sort(key=lambda i: -median(results[i]))
+        survivors = survivors[:math.ceil(len(survivors) / factor)]
+    return results
+
+def score(rates):
+    return None if not rates or None in rates else median(rates)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the performance settings of a masking job with trial executions.")
+    parser.add_argument('job_id', type=int, help="Masking job to run the trials with, pointed at a subset or clone of the data")
+    parser.add_argument('--search', choices=['grid', 'halving'], default='halving', help="Search strategy")
+    parser.add_argument('--repeats', type=int, default=1, help="With grid, executions per combination")
+    parser.add_argument('--commit-sizes', default=DEFAULT_COMMIT_SIZES, help="Comma-separated commitSize values to try")
+    parser.add_argument('--feedback-sizes', default=DEFAULT_FEEDBACK_SIZES, help="Comma-separated feedbackSize values to try")
+    parser.add_argument('--batch-update', default=DEFAULT_BATCH_UPDATE, help="batchUpdate values to try, e.g. true,false")
+    parser.add_argument('--drop-constraints', default=DEFAULT_DROP_CONSTRAINTS, help="dropConstraints values to try, e.g. true,false")
+    parser.add_argument('--save-as', type=int, help="Save the result for this ruleset ID (default: the trial job's ruleset)")
+    parser.add_argument('--dry-run', action='store_true', help="Run the trials but do not save the result")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    candidates = build_candidates(parse_list(args.commit_sizes, int), parse_list(args.feedback_sizes, int),
+                                  parse_list(args.batch_update, parse_bool), parse_list(args.drop_constraints, parse_bool))
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    try:
+        trials = JobTrials(engine, args.job_id)
+    except EngineError as e:
+        print(f"Failed to retrieve masking job {args.job_id}.")
+        print(e)
+        return
+
+    print(f"Tuning masking job {args.job_id} (ruleset {trials.ruleset_id}), {len(candidates)} settings, {args.search} search")
+    try:
+        if args.search == 'grid':
+            results = grid_search(trials, candidates, args.repeats)
+        else:
+            results = halving_search(trials, candidates)
+    except EngineError as e:
+        print("Tuning stopped, a trial execution could not be started.")
+        print(e)
+        return
+    finally:
+        try:
+            trials.restore()
+        except EngineError as e:
+            print(f"Failed to restore the original settings of masking job {args.job_id}.")
+            print(e)
+
+    ranked = sorted(results, key=lambda i: -(score(results[i]) or -1))
+    print("\nTuning Results:")
+    print(f"{'Settings':<65}{'Runs':<6}{'Median Rows/sec':<16}")
+    print("="*87)
+    for i in ranked:
+        print(f"{describe(candidates[i]):<65}{len(results[i]):<6}{format_number(score(results[i])):<16}")
+
+    best = ranked[0]
+    if score(results[best]) is None:
+        print("\nNo trial execution succeeded, nothing saved.")
+        return
+    ruleset_id = args.save_as or trials.ruleset_id
+    print(f"\nFastest: {describe(candidates[best])}")
+    if not args.dry_run:
+        TunedSettings().save(engine.name, ruleset_id, candidates[best], score(results[best]))
+        print(f"Saved for ruleset {ruleset_id}, new masking jobs for it will use these settings.")
+
+if __name__ == "__main__":
+    main()
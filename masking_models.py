@@ -0,0 +1,213 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_models.py
+# Version   : v1
+# Record types shared by the scripts: Ruleset, Connector, MaskingJob, ProfileJob and Execution.
+# A response body is parsed once into a slotted object with only the fields the scripts use, instead of keeping
+# the whole response dict. Repeated strings (statuses, job and ruleset names) are interned so 100k executions
+# share one copy of each, and timestamps are kept as seconds since the epoch.
+# ExecutionTable keeps executions column by column in typed arrays for bulk views, about 50 bytes per execution.
+##################################################################################################################
+
+import math
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+
+# Stored in the integer columns of ExecutionTable when a value is missing
+MISSING = -1
+
+
+# Seconds since the epoch for an engine timestamp such as 2024-07-01T09:00:00.000+00:00, None when missing
+def parse_time(value):
+    if not value or value == 'Unknown':
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+# (seconds since the epoch, UTC offset in seconds) for an engine timestamp, (None, 0) when missing
+def parse_timestamp(value):
+    if not value or value == 'Unknown':
+        return None, 0
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None, 0
+    offset = parsed.utcoffset()
+    return parsed.timestamp(), int(offset.total_seconds()) if offset else 0
+
+# yyyy-MM-ddTHH:mm:ss in the engine's own UTC offset, as the engine reported it
+def format_time(t, utc_offset=0):
+    if t is None or (isinstance(t, float) and math.isnan(t)):
+        return 'Unknown'
+    return datetime.fromtimestamp(t, timezone(timedelta(seconds=utc_offset))).strftime('%Y-%m-%dT%H:%M:%S')
+
+def intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Ruleset:
+    __slots__ = ('ruleset_id', 'name', 'connector_id')
+
+    def __init__(self, ruleset_id, name, connector_id=None):
+        self.ruleset_id = ruleset_id
+        self.name = name
+        self.connector_id = connector_id
+
+    @classmethod
+    def from_response(cls, body):
+        return cls(body.get('databaseRulesetId'), intern(body.get('rulesetName', 'Unknown')), body.get('databaseConnectorId'))
+
+
+class Connector:
+    __slots__ = ('connector_id', 'name', 'database_type', 'host')
+
+    def __init__(self, connector_id, name, database_type=None, host=None):
+        self.connector_id = connector_id
+        self.name = name
+        self.database_type = database_type
+        self.host = host
+
+    @classmethod
+    def from_response(cls, body):
+        return cls(body.get('databaseConnectorId'), intern(body.get('connectorName', 'Unknown')),
+                   intern(body.get('databaseType')), intern(body.get('host')))
+
+
+class MaskingJob:
+    __slots__ = ('job_id', 'name', 'ruleset_id')
+
+    def __init__(self, job_id, name, ruleset_id=None):
+        self.job_id = job_id
+        self.name = name
+        self.ruleset_id = ruleset_id
+
+    @classmethod
+    def from_response(cls, body):
+        return cls(body.get('maskingJobId'), intern(body.get('jobName', 'Unknown')), body.get('rulesetId'))
+
+
+class ProfileJob:
+    __slots__ = ('job_id', 'name', 'ruleset_id', 'profile_set_id')
+
+    def __init__(self, job_id, name, ruleset_id=None, profile_set_id=None):
+        self.job_id = job_id
+        self.name = name
+        self.ruleset_id = ruleset_id
+        self.profile_set_id = profile_set_id
+
+    @classmethod
+    def from_response(cls, body):
+        return cls(body.get('profileJobId'), intern(body.get('jobName', 'Unknown')), body.get('rulesetId'), body.get('profileSetId'))
+
+
+class Execution:
+    __slots__ = ('execution_id', 'job_id', 'status', 'rows_masked', 'rows_total', 'start_time', 'end_time', 'utc_offset', 'job_name')
+
+    def __init__(self, execution_id, job_id, status, rows_masked=None, rows_total=None, start_time=None, end_time=None,
+                 utc_offset=0, job_name=None):
+        self.execution_id = execution_id
+        self.job_id = job_id
+        self.status = status
+        self.rows_masked = rows_masked
+        self.rows_total = rows_total
+        self.start_time = start_time
+        self.end_time = end_time
+        self.utc_offset = utc_offset
+        self.job_name = job_name
+
+    # job_name is the name of the execution's job when the caller knows it (the engine does not return it)
+    @classmethod
+    def from_response(cls, body, job_name=None):
+        start_time, utc_offset = parse_timestamp(body.get('startTime'))
+        rows_masked = body.get('rowsMasked')
+        rows_total = body.get('rowsTotal')
+        return cls(body.get('executionId'), body.get('jobId'), intern(body.get('status', 'Unknown')),
+                   rows_masked if isinstance(rows_masked, int) else None, rows_total if isinstance(rows_total, int) else None,
+                   start_time, parse_time(body.get('endTime')), utc_offset, job_name)
+
+    # Seconds between start and end, None while running
+    @property
+    def duration(self):
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def start_text(self):
+        return format_time(self.start_time, self.utc_offset)
+
+    @property
+    def end_text(self):
+        return format_time(self.end_time, self.utc_offset)
+
+
+# Executions stored column by column: ids, row counts and times in typed arrays, statuses as one byte codes,
+# job names in one map per job. Indexing or iterating gives Execution objects built on demand.
+class ExecutionTable:
+    def __init__(self, executions=()):
+        self.execution_ids = array('q')
+        self.job_ids = array('q')
+        self.rows_masked = array('q')
+        self.start_times = array('d')
+        self.end_times = array('d')
+        self.utc_offsets = array('i')
+        self.status_codes = array('B')
+        self.statuses = []
+        self._status_codes = {}
+        self.job_names = {}
+        for execution in executions:
+            self.append(execution)
+
+    def _status_code(self, status):
+        code = self._status_codes.get(status)
+        if code is None:
+            code = self._status_codes[status] = len(self.statuses)
+            self.statuses.append(status)
+        return code
+
+    def append(self, execution):
+        self.execution_ids.append(execution.execution_id if execution.execution_id is not None else MISSING)
+        self.job_ids.append(execution.job_id if execution.job_id is not None else MISSING)
+        self.rows_masked.append(execution.rows_masked if execution.rows_masked is not None else MISSING)
+        self.start_times.append(execution.start_time if execution.start_time is not None else math.nan)
+        self.end_times.append(execution.end_time if execution.end_time is not None else math.nan)
+        self.utc_offsets.append(execution.utc_offset)
+        self.status_codes.append(self._status_code(execution.status))
+        if execution.job_name is not None:
+            self.job_names[execution.job_id] = execution.job_name
+
+    def __len__(self):
+        return len(self.execution_ids)
+
+    def __getitem__(self, i):
+        job_id = self.job_ids[i]
+        rows_masked = self.rows_masked[i]
+        start_time = self.start_times[i]
+        end_time = self.end_times[i]
+        return Execution(self.execution_ids[i], job_id if job_id != MISSING else None, self.statuses[self.status_codes[i]],
+                         rows_masked if rows_masked != MISSING else None, None,
+                         None if math.isnan(start_time) else start_time, None if math.isnan(end_time) else end_time,
+                         self.utc_offsets[i], self.job_names.get(job_id))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    # Number of executions per status
+    def count_by_status(self):
+        counts = [0] * len(self.statuses)
+        for code in self.status_codes:
+            counts[code] += 1
+        return dict(zip(self.statuses, counts))
+
+    # Executions with one of the given statuses, without building the others
+    def with_status(self, *statuses):
+        codes = {self._status_codes[status] for status in statuses if status in self._status_codes}
+        for i, code in enumerate(self.status_codes):
+            if code in codes:
+                yield self[i]
@@ -0,0 +1,210 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_pipeline.py
+# Version   : v1
+# Runs ruleset refresh -> profile job -> masking job as dependent stages for every given ruleset.
+# Different rulesets run in parallel, bounded by a limit on executions running on the engine at once.
+# Progress is saved to a state file after every stage, so a rerun resumes from the last completed stage
+# (and re-attaches to a refresh or execution that was still running when the previous run stopped).
+# Once every ruleset of a run has succeeded their state is cleared, so the next run starts over.
+# Usage: python masking_pipeline.py 12,15-20 [--max-executions 4] [--state masking_pipeline_state.json]
+##################################################################################################################
+
+import argparse
+import asyncio
+import json
+import os
+
+import requests
+
+from masking_engine import EngineClient, EngineError, add_metrics_arguments, enable_metrics, poll_until_done
+from masking_job_rs_creation import TunedSettings, build_job_data, parse_ruleset_ids
+from masking_models import MaskingJob, ProfileJob, Ruleset
+from masking_scheduler import slot_limit
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 20
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+# Stages run in this order for every ruleset
+STAGES = ('refresh', 'profile', 'mask')
+
+DEFAULT_MAX_EXECUTIONS = 4
+DEFAULT_STATE_FILE = 'masking_pipeline_state.json'
+
+
+# Pipeline progress per ruleset, written to disk after every change
+class PipelineState:
+    def __init__(self, path):
+        self.path = path
+        self.rulesets = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.rulesets = json.load(f)
+
+    def get(self, ruleset_id):
+        return self.rulesets.setdefault(str(ruleset_id), {"completed": [], "running": None, "status": "PENDING"})
+
+    def update(self, ruleset_id, **values):
+        self.get(ruleset_id).update(values)
+        self.save()
+
+    # Forget the given rulesets, the state file is removed once no ruleset is left in it
+    def clear(self, ruleset_ids):
+        for ruleset_id in ruleset_ids:
+            self.rulesets.pop(str(ruleset_id), None)
+        if self.rulesets:
+            self.save()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    # Write to a temporary file first so a crash never leaves a half written state file
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.rulesets, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# Find the profile job and masking job of every ruleset with one listing of each
+def fetch_ruleset_jobs(engine):
+    profile_jobs = {}
+    for job in map(ProfileJob.from_response, engine.paginate('profile-jobs')):
+        profile_jobs.setdefault(job.ruleset_id, job.job_id)
+    masking_jobs = {}
+    for job in map(MaskingJob.from_response, engine.paginate('masking-jobs')):
+        masking_jobs.setdefault(job.ruleset_id, job.job_id)
+    return profile_jobs, masking_jobs
+
+# Create a masking job named after the ruleset when the ruleset does not have one yet
+async def ensure_masking_job(engine, ruleset, masking_jobs):
+    ruleset_id = ruleset.ruleset_id
+    if ruleset_id not in masking_jobs:
+        job_data = build_job_data(ruleset_id, ruleset.name, tuned=TunedSettings().get(engine.name, ruleset_id))
+        response = await asyncio.to_thread(engine.post, 'masking-jobs', headers={'Content-Type': 'application/json'}, json=job_data)
+        if response.status_code != 200:
+            raise EngineError(response)
+        masking_jobs[ruleset_id] = response.json()['maskingJobId']
+    return masking_jobs[ruleset_id]
+
+# Start one stage on the engine and return the API path to poll for its status
+async def start_stage(engine, stage, ruleset_id, job_id):
+    if stage == 'refresh':
+        response = await asyncio.to_thread(engine.put, f"database-rulesets/{ruleset_id}/refresh", json={})
+        if response.status_code != 200:
+            raise EngineError(response)
+        return f"async-tasks/{response.json()['asyncTaskId']}"
+    response = await asyncio.to_thread(engine.post, 'executions', headers={'Content-Type': 'application/json'}, json={'jobId': job_id})
+    if response.status_code != 200:
+        raise EngineError(response)
+    return f"executions/{response.json()['executionId']}"
+
+# Run the remaining stages of one ruleset, each stage holding an engine execution slot while it runs
+async def run_ruleset(engine, ruleset, profile_jobs, masking_jobs, state, slots):
+    ruleset_id = ruleset.ruleset_id
+    label = f"[{ruleset.name}] "
+    progress = state.get(ruleset_id)
+    try:
+        for stage in STAGES:
+            if stage in progress['completed']:
+                continue
+            if stage == 'profile':
+                job_id = profile_jobs.get(ruleset_id)
+                if job_id is None:
+                    print(f"{label}No profile job for this ruleset, skipping the profile stage.")
+                    state.update(ruleset_id, completed=progress['completed'] + [stage])
+                    continue
+            elif stage == 'mask':
+                job_id = await ensure_masking_job(engine, ruleset, masking_jobs)
+            else:
+                job_id = None
+
+            async with slots:
+                running = progress.get('running')
+                if running and running['stage'] == stage:
+                    poll_path = running['path']
+                    print(f"{label}Resuming {stage} ({poll_path})")
+                else:
+                    poll_path = await start_stage(engine, stage, ruleset_id, job_id)
+                    state.update(ruleset_id, running={"stage": stage, "path": poll_path}, status='RUNNING')
+                    print(f"{label}Started {stage} ({poll_path})")
+                result = await poll_until_done(engine, poll_path)
+
+            status = result.get('status')
+            print(f"{label}{stage} finished with status {status}")
+            if status != 'SUCCEEDED':
+                state.update(ruleset_id, running=None, status=f"{stage.upper()}_{status}")
+                return progress['status']
+            state.update(ruleset_id, completed=progress['completed'] + [stage], running=None)
+        state.update(ruleset_id, status='SUCCEEDED')
+    except (EngineError, requests.RequestException) as e:
+        # CircuitOpenError is an EngineError: only this ruleset fails, the others keep running
+        print(f"{label}Request to the engine failed. {e}")
+        state.update(ruleset_id, status='ERROR')
+    return progress['status']
+
+# Run the pipeline for every ruleset, at most max_executions refreshes/executions on the engine at once.
+# When every ruleset succeeded the run is over and its state is cleared, otherwise a rerun resumes it.
+async def run_pipeline(engine, rulesets, state, max_executions=DEFAULT_MAX_EXECUTIONS):
+    profile_jobs, masking_jobs = await asyncio.to_thread(fetch_ruleset_jobs, engine)
+    slots = asyncio.Semaphore(max_executions)
+    results = await asyncio.gather(*(run_ruleset(engine, ruleset, profile_jobs, masking_jobs, state, slots) for ruleset in rulesets))
+    if all(status == 'SUCCEEDED' for status in results):
+        state.clear(ruleset.ruleset_id for ruleset in rulesets)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run refresh -> profile -> mask for a list of rulesets.")
+    parser.add_argument('rulesets', help="Ruleset IDs, comma-separated or range, e.g. 12,15-20")
+    parser.add_argument('--max-executions', type=slot_limit, default=DEFAULT_MAX_EXECUTIONS, help="Maximum executions running on the engine at once")
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help="State file used to resume an interrupted run (delete it to start over)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    try:
+        rulesets_by_id = {r.ruleset_id: r for r in map(Ruleset.from_response, engine.paginate('database-rulesets'))}
+    except EngineError as e:
+        print("Failed to retrieve rulesets.")
+        print(e)
+        return
+
+    ruleset_ids = parse_ruleset_ids(args.rulesets)
+    rulesets = []
+    if len(ruleset_ids) > len(rulesets_by_id):
+        # A wide range such as 1-100000: walk the rulesets that exist instead of every ID in it
+        rulesets = [ruleset for ruleset_id, ruleset in sorted(rulesets_by_id.items()) if ruleset_id in ruleset_ids]
+    else:
+        for ruleset_id in ruleset_ids:
+            if ruleset_id in rulesets_by_id:
+                rulesets.append(rulesets_by_id[ruleset_id])
+            else:
+                print(f"Rule set ID {ruleset_id} does not exist, skipping it.")
+
+    state = PipelineState(args.state)
+    try:
+        results = asyncio.run(run_pipeline(engine, rulesets, state, args.max_executions))
+    except (EngineError, requests.RequestException) as e:
+        print("Failed to retrieve profile or masking jobs.")
+        print(e)
+        return
+
+    print("\nPipeline Summary:")
+    print(f"{'Ruleset ID':<12}{'Ruleset Name':<30}{'Status':<20}{'Completed Stages'}")
+    print("="*90)
+    for ruleset, status in zip(rulesets, results):
+        completed = ', '.join(STAGES if status == 'SUCCEEDED' else state.get(ruleset.ruleset_id)['completed'])
+        print(f"{ruleset.ruleset_id:<12}{ruleset.name:<30}{status:<20}{completed}")
+
+if __name__ == "__main__":
+    main()
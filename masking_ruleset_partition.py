@@ -0,0 +1,293 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_ruleset_partition.py
+# Version   : v1
+# Splits one large database ruleset into K smaller rulesets on the same connector, each with its own masking job,
+# so the tables are masked by K executions running in parallel instead of one long serial job.
+# - row counts come from a CSV of table name and row count (header optional), e.g. exported from the database
+#   statistics: Oracle "SELECT table_name, num_rows FROM all_tables WHERE owner = 'APP'", SQL Server sys.partitions,
+#   PostgreSQL pg_class.reltuples. Tables missing from it are counted at the median of the known tables.
+# - tables that must be masked by the same job stay in the same partition: every --together group, and every
+#   pair of a foreign key CSV (table, referenced table) given with --constraints, are joined with union-find.
+# - the groups are bin-packed largest first into the partition with the fewest rows so far (LPT), which keeps
+#   the largest partition, the critical path, within 4/3 of the best possible split.
+# - the new rulesets (NAME_P1..NAME_PK) get copies of the tables with their algorithm and domain assignments,
+#   and masking jobs with the settings of the ruleset's masking job, overridden by the settings
+#   masking_job_tuner.py saved for the ruleset.
+# - nothing is created when a ruleset or job with one of the new names already exists (e.g. from an earlier
+#   run), --name gives the partitions another prefix.
+# The original ruleset and its job are left as they are. Run the new jobs together with
+# masking_job_rs_creation.py --run JOB_IDS, which schedules them longest first.
+# Usage: python masking_ruleset_partition.py RULESET_ID --parts 4 --row-counts rows.csv
+#        [--together ORDERS,ORDER_ITEMS] [--constraints fk.csv] [--name HR_SPLIT] [--dry-run]
+##################################################################################################################
+
+import argparse
+import asyncio
+import csv
+import heapq
+
+from execution_history import format_number, median
+from masking_engine import EngineClient, EngineError, add_metrics_arguments, enable_metrics
+from masking_engine_async import AsyncEngineClient
+from masking_job_rs_creation import TunedSettings, apply_job_settings, build_job_data
+from masking_snapshot import DEFAULT_CONCURRENCY, SnapshotImport
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+# Settings of the original masking job carried over to the partition jobs
+JOB_SETTINGS = ('jobDescription', 'feedbackSize', 'onTheFlyMasking', 'databaseMaskingOptions', 'maxMemory', 'minMemory',
+                'numInputStreams', 'emailAddress')
+
+
+# Read a CSV of table name and row count, {TABLE_NAME: rows}. Names are matched case-insensitively.
+def load_row_counts(path):
+    row_counts = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or not row[1].strip().replace(',', '').isdigit():
+                # Header or empty line
+                continue
+            row_counts[row[0].strip().upper()] = int(row[1].strip().replace(',', ''))
+    return row_counts
+
+# Read a CSV of foreign keys as (table, referenced table) pairs
+def load_constraints(path):
+    with open(path, newline='') as f:
+        return [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2 and row[0].strip() and row[1].strip()]
+
+
+# Union-find over table names, groups the tables that must stay together
+class TableGroups:
+    def __init__(self, names):
+        self.parent = {name: name for name in names}
+
+    def find(self, name):
+        root = name
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression
+        while self.parent[name] != root:
+            self.parent[name], name = root, self.parent[name]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+    # Lists of table names, one per group
+    def groups(self):
+        groups = {}
+        for name in self.parent:
+            groups.setdefault(self.find(name), []).append(name)
+        return list(groups.values())
+
+
+# Bin-pack weighted groups into `parts` bins, largest group first into the lightest bin (LPT).
+# groups is [(weight, items)], returns [(weight, items)] per bin, heaviest bin first.
+def partition_groups(groups, parts):
+    bins = [(0, i, []) for i in range(parts)]
+    for weight, items in sorted(groups, key=lambda group: -group[0]):
+        load, i, contents = heapq.heappop(bins)
+        contents.extend(items)
+        heapq.heappush(bins, (load + weight, i, contents))
+    return sorted(((load, contents) for load, _, contents in bins if contents), key=lambda b: -b[0])
+
+# Row count of every table, tables without a count get the median of the known ones (1 when none is known).
+# Returns ({tableName: rows}, [tables estimated])
+def table_weights(tables, row_counts):
+    known = [row_counts[t['tableName'].upper()] for t in tables if t['tableName'].upper() in row_counts]
+    default = median(known) if known else 1
+    weights = {}
+    estimated = []
+    for table in tables:
+        rows = row_counts.get(table['tableName'].upper())
+        if rows is None:
+            estimated.append(table['tableName'])
+            rows = default
+        weights[table['tableName']] = max(rows, 1)
+    return weights, estimated
+
+# Group the tables (constraints and --together lists) and split them into `parts` partitions of table names
+def plan_partitions(tables, weights, parts, together=(), constraints=()):
+    names = [table['tableName'] for table in tables]
+    by_upper = {name.upper(): name for name in names}
+    table_groups = TableGroups(names)
+    links = [(a, b) for a, b in constraints]
+    for group in together:
+        links.extend((group[0], name) for name in group[1:])
+    for a, b in links:
+        if a.upper() in by_upper and b.upper() in by_upper:
+            table_groups.union(by_upper[a.upper()], by_upper[b.upper()])
+        else:
+            print(f"Ignoring constraint {a} -> {b}: not a table of this ruleset")
+    groups = [(sum(weights[name] for name in group), group) for group in table_groups.groups()]
+    return partition_groups(groups, parts)
+
+def print_plan(ruleset_name, partitions, total_rows):
+    print(f"\nPartitions of ruleset {ruleset_name}:")
+    print(f"{'Ruleset Name':<40}{'Tables':<8}{'Est. Rows':<18}{'Share':<8}")
+    print("="*74)
+    for (rows, tables), name in partitions:
+        print(f"{name:<40}{len(tables):<8}{format_number(rows, 0):<18}{100.0 * rows / total_rows:<8.1f}")
+    largest = max(rows for (rows, _), _ in partitions)
+    print(f"Largest partition: {100.0 * largest / total_rows:.1f}% of the rows (ideal {100.0 / len(partitions):.1f}%)")
+
+
+# Read the ruleset, its tables with their columns, its masking job and the names of every masking job
+async def read_ruleset(client, ruleset_id):
+    ruleset = await client.get_json(f"database-rulesets/{ruleset_id}")
+    tables = await client.list_all('table-metadata', {'ruleset_id': ruleset_id})
+    columns = await asyncio.gather(*(client.list_all('column-metadata', {'table_metadata_id': table['tableMetadataId']})
+                                     for table in tables))
+    all_jobs = await client.list_all('masking-jobs')
+    jobs = [job for job in all_jobs if job.get('rulesetId') == ruleset_id]
+    return (ruleset, tables, [column for table_columns in columns for column in table_columns], jobs[0] if jobs else None,
+            {job['jobName'] for job in all_jobs})
+
+# Names of the masking jobs of the partitions, after --name or else the ruleset's job (the ruleset when it has none)
+def partition_job_names(ruleset, job, count, prefix=None):
+    prefix = prefix or (job['jobName'] if job else ruleset['rulesetName'])
+    return [f"{prefix}_P{i}" for i in range(1, count + 1)]
+
+# The partition rulesets (on the ruleset's connector) and masking jobs of this run that already exist on the engine,
+# e.g. from an earlier run with the same --name
+async def find_existing_partitions(client, ruleset, partitions, new_job_names, job_names):
+    wanted = {name for _, name in partitions}
+    existing_rulesets = [r['rulesetName'] async for r in client.paginate('database-rulesets')
+                         if r.get('rulesetName') in wanted and r.get('databaseConnectorId') == ruleset['databaseConnectorId']]
+    existing_jobs = [name for name in new_job_names if name in job_names]
+    return existing_rulesets, existing_jobs
+
+# Create the partition rulesets, copy their tables and column assignments, and create one masking job each.
+# partitions is [((rows, [tableName]), rulesetName)]. Returns [(ruleset, job, table count)] and the import results.
+async def create_partitions(client, ruleset, tables, columns, job, partitions, tuned, concurrency=DEFAULT_CONCURRENCY, job_prefix=None):
+    new_rulesets = await asyncio.gather(*(client.create_database_ruleset({"rulesetName": name, "databaseConnectorId": ruleset['databaseConnectorId']})
+                                          for _, name in partitions))
+    partition_of = {}
+    for ((_, table_names), _), new_ruleset in zip(partitions, new_rulesets):
+        for name in table_names:
+            partition_of[name] = new_ruleset['databaseRulesetId']
+
+    # The tables and columns are copied the way a snapshot import creates them: new ids are mapped, columns the
+    # engine generated for a new table get the original's algorithm and domain
+    copier = SnapshotImport(client, concurrency=concurrency)
+    copier.id_maps['database-rulesets'] = {r['databaseRulesetId']: r['databaseRulesetId'] for r in new_rulesets}
+    await copier.import_type('table-metadata', [dict(table, rulesetId=partition_of[table['tableName']]) for table in tables], existing=[])
+    new_table_ids = [copier.id_maps['table-metadata'][t['tableMetadataId']] for t in tables if t['tableMetadataId'] in copier.id_maps['table-metadata']]
+    generated = await asyncio.gather(*(client.list_all('column-metadata', {'table_metadata_id': table_id}) for table_id in new_table_ids))
+    await copier.import_type('column-metadata', columns, existing=[column for table_columns in generated for column in table_columns])
+
+    # The settings tuned for the original ruleset win over the ones its job was left with
+    settings = {key: value for key, value in (job or {}).items() if key in JOB_SETTINGS}
+    job_names = partition_job_names(ruleset, job, len(new_rulesets), job_prefix)
+    new_jobs = await asyncio.gather(*(client.create_masking_job(apply_job_settings(build_job_data(new_ruleset['databaseRulesetId'],
+                                                                                                  job_name, settings), tuned))
+                                      for new_ruleset, job_name in zip(new_rulesets, job_names)), return_exceptions=True)
+    created = [(new_ruleset, new_job, len(table_names))
+               for new_ruleset, new_job, ((_, table_names), _) in zip(new_rulesets, new_jobs, partitions)]
+    return created, copier
+
+def print_created(created, copier):
+    print("\nPartition Rulesets and Masking Jobs:")
+    print(f"{'Ruleset ID':<12}{'Ruleset Name':<40}{'Tables':<8}{'Job ID':<10}{'Job Name':<40}")
+    print("="*110)
+    job_ids = []
+    for new_ruleset, new_job, table_count in created:
+        if isinstance(new_job, EngineError):
+            job_id, job_name = 'FAILED', f"{new_job.status_code} {new_job.text[:30]}"
+        elif isinstance(new_job, BaseException):
+            raise new_job
+        else:
+            job_id, job_name = new_job['maskingJobId'], new_job['jobName']
+            job_ids.append(str(job_id))
+        print(f"{new_ruleset['databaseRulesetId']:<12}{new_ruleset['rulesetName']:<40}{table_count:<8}{job_id:<10}{job_name:<40}")
+    for path in ('table-metadata', 'column-metadata'):
+        result = copier.results[path]
+        print(f"{path}: {result['created']} created, {result['updated']} updated, {result['existing']} unchanged, {result['failed']} failed")
+    for path, object_id, key, message in copier.failures:
+        print(f"  Failed to copy {path} {object_id} ({key}): {message}")
+    if job_ids:
+        print(f"\nRun them in parallel with: python masking_job_rs_creation.py --run {','.join(job_ids)}")
+
+async def partition_ruleset(engine, args, row_counts, together, constraints):
+    async with AsyncEngineClient(engine) as client:
+        ruleset, tables, columns, job, job_names = await read_ruleset(client, args.ruleset_id)
+        if not tables:
+            print(f"Ruleset {args.ruleset_id} has no tables, nothing to partition.")
+            return
+        parts = min(args.parts, len(tables))
+        weights, estimated = table_weights(tables, row_counts)
+        if estimated:
+            print(f"No row count for {len(estimated)} of {len(tables)} tables, counted at the median: "
+                  f"{', '.join(estimated[:10])}{' ...' if len(estimated) > 10 else ''}")
+        bins = plan_partitions(tables, weights, parts, together, constraints)
+        name = args.name or ruleset['rulesetName']
+        partitions = [(b, f"{name}_P{i}") for i, b in enumerate(bins, start=1)]
+        print_plan(ruleset['rulesetName'], partitions, sum(weights.values()))
+        if len(partitions) < parts:
+            print(f"Only {len(partitions)} partitions: the constrained groups cannot be split further.")
+        # Refuse before creating anything rather than leave a half-created set of partitions behind
+        new_job_names = partition_job_names(ruleset, job, len(partitions), args.name)
+        existing_rulesets, existing_jobs = await find_existing_partitions(client, ruleset, partitions, new_job_names, job_names)
+        if existing_rulesets or existing_jobs:
+            print("\nThese partitions already exist, most likely from an earlier run:")
+            for name in existing_rulesets:
+                print(f"  ruleset {name}")
+            for name in existing_jobs:
+                print(f"  masking job {name}")
+            print("Delete them on the engine, or give the new partitions another prefix with --name.")
+            return
+        if args.dry_run:
+            return
+        tuned = TunedSettings().get(engine.name, args.ruleset_id)
+        created, copier = await create_partitions(client, ruleset, tables, columns, job, partitions, tuned, args.concurrency, args.name)
+        print_created(created, copier)
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a database ruleset into balanced rulesets with one masking job each.")
+    parser.add_argument('ruleset_id', type=int, help="Ruleset to partition")
+    parser.add_argument('--parts', type=int, required=True, help="Number of rulesets to split it into")
+    parser.add_argument('--row-counts', metavar='FILE', help="CSV of table name and row count")
+    parser.add_argument('--together', action='append', default=[], metavar='TABLES', help="Comma-separated tables kept in one partition (can be repeated)")
+    parser.add_argument('--constraints', metavar='FILE', help="CSV of foreign keys as table, referenced table")
+    parser.add_argument('--name', help="Prefix of the new ruleset and job names (default: the ruleset's and its job's name)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Tables and columns created at once")
+    parser.add_argument('--dry-run', action='store_true', help="Only print the partitions")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+    if args.parts < 2:
+        parser.error("--parts must be at least 2")
+
+    try:
+        row_counts = load_row_counts(args.row_counts) if args.row_counts else {}
+        constraints = load_constraints(args.constraints) if args.constraints else []
+    except OSError as e:
+        parser.error(str(e))
+    if not row_counts:
+        print("No row counts given, every table counts the same.")
+    together = [[name.strip() for name in group.split(',') if name.strip()] for group in args.together]
+    together = [group for group in together if group]
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    try:
+        asyncio.run(partition_ruleset(engine, args, row_counts, together, constraints))
+    except EngineError as e:
+        print(f"Failed to partition ruleset {args.ruleset_id}.")
+        print(e)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_scheduler.py
+# Version   : v1
+# Runs a batch of masking jobs through a queue instead of starting them all at once.
+# - At most max_executions executions run on the engine, and at most per_connector against one database connector,
+#   so two jobs never fight over the same database unless allowed.
+# - Jobs are dispatched longest expected duration first (the median of their past runs in execution_history.py),
+#   which keeps the long jobs from ending up alone at the end of the batch. Jobs without history get the median
+#   expectation of the others.
+# - The next job starts as soon as a slot frees up, skipping over jobs whose connector is still busy.
+# Used by option 4 and --run of masking_job_rs_creation.py.
+##################################################################################################################
+
+import argparse
+import asyncio
+import time
+
+import requests
+
+from execution_history import format_number, median
+from masking_engine import EngineError, poll_until_done
+from masking_models import Execution, MaskingJob, Ruleset
+
+DEFAULT_MAX_EXECUTIONS = 4
+DEFAULT_PER_CONNECTOR = 1
+
+
+# argparse type of --max-executions and --per-connector: a limit of 0 would never start a job
+def slot_limit(value):
+    try:
+        limit = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if limit < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {limit}")
+    return limit
+
+# Look up the connector and expected duration of every job id with one listing of jobs and rulesets.
+# Returns the jobs in dispatch order (longest expected first) and the ids that are not masking jobs.
+def plan_schedule(engine, job_ids, history=None):
+    jobs_by_id = {job.job_id: job for job in map(MaskingJob.from_response, engine.paginate('masking-jobs'))}
+    connectors = {r.ruleset_id: r.connector_id for r in map(Ruleset.from_response, engine.paginate('database-rulesets'))}
+
+    if len(job_ids) <= len(jobs_by_id):
+        selected = dict.fromkeys(job_ids)
+    else:
+        # A wide range such as 1-100000: walk the jobs that exist instead of every ID in it
+        selected = [job_id for job_id in jobs_by_id if job_id in job_ids]
+
+    jobs = []
+    missing = []
+    for job_id in selected:
+        job = jobs_by_id.get(job_id)
+        if not job:
+            missing.append(job_id)
+            continue
+        expected = history.expected_duration(engine.host, job_id) if history else None
+        jobs.append({"jobId": job_id, "jobName": job.name,
+                     "connectorId": connectors.get(job.ruleset_id), "expectedDuration": expected})
+
+    known = [job['expectedDuration'] for job in jobs if job['expectedDuration'] is not None]
+    default = median(known) if known else 0
+    for job in jobs:
+        if job['expectedDuration'] is None:
+            job['expectedDuration'] = default
+            job['estimated'] = True
+    jobs.sort(key=lambda job: -job['expectedDuration'])
+    return jobs, missing
+
+# Start one job and wait for its execution to finish, recording every status seen in the history.
+# A job whose start or status polling fails (engine error, transport error, open circuit) is reported as FAILED
+# without stopping the rest of the schedule. The duration is the engine's start to end time of the execution.
+async def run_scheduled_job(engine, job, history=None):
+    try:
+        response = await asyncio.to_thread(engine.post, 'executions', headers={'Content-Type': 'application/json'}, json={"jobId": job['jobId']})
+    except (EngineError, requests.RequestException) as e:
+        print(f"Failed to execute masking job {job['jobId']}. {type(e).__name__}: {e}")
+        return dict(job, status='FAILED', duration=None, rowsMasked=None)
+    if response.status_code != 200:
+        print(f"Failed to execute masking job {job['jobId']}.")
+        print(f"Status Code: {response.status_code}, Response: {response.text}")
+        return dict(job, status='NOT STARTED', duration=None, rowsMasked=None)
+    execution_id = response.json().get('executionId')
+    print(f"Masking job {job['jobId']} ({job['jobName']}) started, Execution ID: {execution_id}")
+
+    started = time.monotonic()
+    on_update = (lambda body: history.record(engine.host, body, job['jobName'])) if history else None
+    try:
+        execution = Execution.from_response(await poll_until_done(engine, f"executions/{execution_id}", on_update), job['jobName'])
+    except (EngineError, requests.RequestException) as e:
+        print(f"Lost track of execution {execution_id}. {type(e).__name__}: {e}")
+        return dict(job, executionId=execution_id, status='FAILED', duration=None, rowsMasked=None)
+    print(f"Masking job {job['jobId']} ({job['jobName']}) finished: {execution.status}")
+    # Wall-clock time (which includes the polling lag) only when the engine did not report start and end times
+    duration = execution.duration if execution.duration is not None else time.monotonic() - started
+    return dict(job, executionId=execution_id, status=execution.status, duration=duration,
+                rowsMasked=execution.rows_masked)
+
+# Dispatch the jobs in order under the engine and connector slot limits, returns one result per job.
+# Both limits must be at least 1, otherwise no job could ever start.
+async def run_schedule(engine, jobs, max_executions=DEFAULT_MAX_EXECUTIONS, per_connector=DEFAULT_PER_CONNECTOR, history=None):
+    if max_executions < 1 or per_connector < 1:
+        raise ValueError(f"max_executions and per_connector must be at least 1, got {max_executions} and {per_connector}")
+    pending = list(jobs)
+    running = {}
+    busy = {}
+    results = []
+    while pending or running:
+        for job in list(pending):
+            if len(running) >= max_executions:
+                break
+            # Jobs whose connector is unknown only limit themselves
+            connector = job['connectorId'] if job['connectorId'] is not None else ('job', job['jobId'])
+            if busy.get(connector, 0) >= per_connector:
+                continue
+            pending.remove(job)
+            busy[connector] = busy.get(connector, 0) + 1
+            running[asyncio.create_task(run_scheduled_job(engine, job, history))] = connector
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            busy[running.pop(task)] -= 1
+            results.append(task.result())
+    return results
+
+# Run a batch of masking jobs through the scheduler and print a report with the batch makespan
+def schedule_masking_jobs(engine, job_ids, max_executions=DEFAULT_MAX_EXECUTIONS, per_connector=DEFAULT_PER_CONNECTOR, history=None):
+    try:
+        jobs, missing = plan_schedule(engine, job_ids, history)
+    except EngineError as e:
+        print("Failed to retrieve masking jobs or rulesets.")
+        print(e)
+        return []
+    for job_id in missing:
+        print(f"Error: No masking job found with the jobId '{job_id}'")
+    if not jobs:
+        return []
+
+    print(f"Running {len(jobs)} masking jobs, at most {max_executions} at once and {per_connector} per connector.")
+    started = time.monotonic()
+    results = asyncio.run(run_schedule(engine, jobs, max_executions, per_connector, history))
+    makespan = time.monotonic() - started
+
+    print("\nMasking Job Schedule Report:")
+    print(f"{'Job ID':<10}{'Job Name':<30}{'Connector':<11}{'Expected (s)':<14}{'Actual (s)':<12}{'Execution ID':<14}{'Status':<12}")
+    print("="*103)
+    for result in results:
+        expected = format_number(result['expectedDuration'], 0) + ('*' if result.get('estimated') else '')
+        print(f"{result['jobId']:<10}{result['jobName']:<30}{str(result['connectorId']):<11}{expected:<14}"
+              f"{format_number(result['duration'], 0):<12}{str(result.get('executionId', '')):<14}{result['status']:<12}")
+    print(f"Makespan: {format_number(makespan, 0)}s (* no history for this job, expected duration estimated)")
+    return results
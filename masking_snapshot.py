@@ -0,0 +1,334 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_snapshot.py
+# Version   : v1
+# Snapshot of an engine's masking configuration, to rebuild an engine or move the configuration to another one.
+# export : connectors, profile sets, rulesets, table and column metadata, masking jobs and profile jobs are written
+#          to one zip bundle (deflate compressed): manifest.json with the bundle format and version, the source
+#          engine and the object counts, and one JSON-lines file per object type. Every listing is read with
+#          several pages in flight and streamed into the bundle, so memory does not grow with the engine.
+# import : the objects are created on the target engine in dependency order, all objects of one level at once:
+#            1. connectors, profile sets       3. table metadata, masking jobs, profile jobs
+#            2. rulesets                       4. column metadata
+#          Every reference (databaseConnectorId, rulesetId, profileSetId, tableMetadataId, and the source connector
+#          of an on-the-fly masking job) is remapped from the snapshot's id to the id the object got on the target. Objects that already exist on the target (same
+#          name, or same table/column name under the same parent) are reused, so an interrupted import can be run
+#          again. Columns the engine generated for a new table get the snapshot's algorithm and domain.
+#          Objects whose parent could not be imported are skipped and reported. An object the engine refuses, or
+#          that hits a connection error, is reported as failed and the import carries on.
+# The engine does not return connector passwords, give them with --connector-passwords, a JSON file of
+# {"connectorName": "password"}. Profile sets keep their classifierIds: built-in classifiers have the same ids
+# on every engine.
+# Usage: python masking_snapshot.py export engine.snapshot [--workers 8]
+#        python masking_snapshot.py import engine.snapshot [--connector-passwords passwords.json] [--concurrency 32] [--dry-run]
+##################################################################################################################
+
+import argparse
+import asyncio
+import json
+import time
+import zipfile
+from datetime import datetime, timezone
+
+from masking_engine import DEFAULT_PAGE_WORKERS, EngineClient, EngineError, add_metrics_arguments, enable_metrics
+from masking_engine_async import TRANSPORT_ERRORS, AsyncEngineClient
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 32
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+SNAPSHOT_FORMAT = 'delphix-masking-snapshot'
+SNAPSHOT_VERSION = 1
+
+# Object types of a snapshot, in dependency order: (endpoint, id field, key fields, references).
+# The key fields identify an object on the target engine, references map a field to the type it points to.
+SNAPSHOT_TYPES = [
+    ('database-connectors', 'databaseConnectorId', ('connectorName',), {}),
+    ('profile-sets', 'profileSetId', ('profileSetName',), {}),
+    ('database-rulesets', 'databaseRulesetId', ('rulesetName',), {'databaseConnectorId': 'database-connectors'}),
+    ('table-metadata', 'tableMetadataId', ('rulesetId', 'tableName'), {'rulesetId': 'database-rulesets'}),
+    ('masking-jobs', 'maskingJobId', ('jobName',), {'rulesetId': 'database-rulesets'}),
+    ('profile-jobs', 'profileJobId', ('jobName',), {'rulesetId': 'database-rulesets', 'profileSetId': 'profile-sets'}),
+    ('column-metadata', 'columnMetadataId', ('tableMetadataId', 'columnName'), {'tableMetadataId': 'table-metadata'}),
+]
+
+# On-the-fly masking jobs read from a source connector: {type: (field, connector types of the snapshot)}.
+# Only database connectors are in a snapshot, jobs reading from another connector type are skipped.
+SOURCE_CONNECTOR_REFERENCES = {'masking-jobs': ('onTheFlyMaskingSource', ('DATABASE', None))}
+
+# Types created at the same time on import, every level only refers to the levels before it
+IMPORT_LEVELS = [
+    ('database-connectors', 'profile-sets'),
+    ('database-rulesets',),
+    ('table-metadata', 'masking-jobs', 'profile-jobs'),
+    ('column-metadata',),
+]
+
+# Fields set by the engine that are not sent back when creating an object
+SERVER_FIELDS = ('createdBy', 'createdTime')
+
+# Column fields an import brings an existing column in line with
+COLUMN_MASKING_FIELDS = ('isMasked', 'algorithmName', 'domainName')
+
+# Objects created at once per object type on import
+DEFAULT_CONCURRENCY = 32
+
+# Failures listed after the import report
+FAILURES_SHOWN = 20
+
+
+def snapshot_type(path):
+    return next(entry for entry in SNAPSHOT_TYPES if entry[0] == path)
+
+
+# Stream every object type of the engine into a zip bundle, returns {type: count}
+async def export_snapshot(client, bundle_path, workers=DEFAULT_PAGE_WORKERS):
+    counts = {}
+    with zipfile.ZipFile(bundle_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for path, _, _, _ in SNAPSHOT_TYPES:
+            started = time.monotonic()
+            count = 0
+            with bundle.open(f"{path}.jsonl", 'w') as entry:
+                async for record in client.paginate(path, workers=workers):
+                    entry.write((json.dumps(record) + '\n').encode())
+                    count += 1
+            counts[path] = count
+            print(f"Exported {count} {path} in {time.monotonic() - started:.1f}s")
+        manifest = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "engine": client.name,
+                    "created": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'), "counts": counts}
+        bundle.writestr('manifest.json', json.dumps(manifest, indent=2))
+    return counts
+
+
+# Open a bundle and check its manifest, raises ValueError for anything that is not a snapshot this script can read
+def open_snapshot(bundle_path):
+    try:
+        bundle = zipfile.ZipFile(bundle_path)
+        manifest = json.loads(bundle.read('manifest.json'))
+    except (KeyError, zipfile.BadZipFile, json.JSONDecodeError) as e:
+        raise ValueError(f"{bundle_path} is not a masking engine snapshot ({e})")
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"{bundle_path} is not a masking engine snapshot")
+    if not isinstance(manifest.get('version'), int) or manifest['version'] > SNAPSHOT_VERSION:
+        raise ValueError(f"{bundle_path} is snapshot version {manifest.get('version')}, this script reads up to version {SNAPSHOT_VERSION}")
+    return bundle, manifest
+
+def snapshot_records(bundle, path):
+    with bundle.open(f"{path}.jsonl") as entry:
+        for line in entry:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Creates the objects of a snapshot on the target engine and keeps the snapshot id -> target id map of every type
+class SnapshotImport:
+    def __init__(self, client, connector_passwords=None, concurrency=DEFAULT_CONCURRENCY, dry_run=False):
+        self.client = client
+        self.connector_passwords = connector_passwords or {}
+        self.concurrency = concurrency
+        self.dry_run = dry_run
+        self.id_maps = {path: {} for path, _, _, _ in SNAPSHOT_TYPES}
+        # Objects already on the target: {type: {key: record}}
+        self.existing = {}
+        self.results = {path: {'created': 0, 'existing': 0, 'updated': 0, 'failed': 0, 'skipped': 0} for path, _, _, _ in SNAPSHOT_TYPES}
+        self.failures = []
+
+    # Index the objects of a type already on the target by key, from the whole listing unless records are given
+    async def load_existing(self, path, records=None):
+        _, _, key_fields, _ = snapshot_type(path)
+        if records is None:
+            records = [record async for record in self.client.paginate(path)]
+        self.existing[path] = {tuple(record.get(field) for field in key_fields): record for record in records}
+
+    # Snapshot record -> body for the target engine with its references remapped, None when a parent is missing
+    def target_body(self, path, record):
+        _, id_field, _, references = snapshot_type(path)
+        body = {key: value for key, value in record.items() if key != id_field and key not in SERVER_FIELDS}
+        for field, referenced in references.items():
+            if body.get(field) is None:
+                continue
+            target_id = self.id_maps[referenced].get(body[field])
+            if target_id is None:
+                return None
+            body[field] = target_id
+        if path in SOURCE_CONNECTOR_REFERENCES:
+            field, connector_types = SOURCE_CONNECTOR_REFERENCES[path]
+            source = body.get(field)
+            if source and source.get('connectorId') is not None:
+                target_id = self.id_maps['database-connectors'].get(source['connectorId']) if source.get('connectorType') in connector_types else None
+                if target_id is None:
+                    return None
+                body[field] = dict(source, connectorId=target_id)
+        if path == 'database-connectors' and body.get('connectorName') in self.connector_passwords:
+            body['password'] = self.connector_passwords[body['connectorName']]
+        return body
+
+    def fail(self, path, record, message):
+        self.results[path]['failed'] += 1
+        _, id_field, key_fields, _ = snapshot_type(path)
+        self.failures.append((path, record.get(id_field), '/'.join(str(record.get(field)) for field in key_fields), message))
+
+    async def import_record(self, path, record):
+        _, id_field, key_fields, _ = snapshot_type(path)
+        body = self.target_body(path, record)
+        if body is None:
+            self.results[path]['skipped'] += 1
+            return
+        existing = self.existing[path].get(tuple(body.get(field) for field in key_fields))
+        if existing is not None:
+            self.id_maps[path][record[id_field]] = existing[id_field]
+            if path == 'column-metadata' and any(existing.get(field) != body.get(field) for field in COLUMN_MASKING_FIELDS):
+                await self.update_column(existing, body)
+            else:
+                self.results[path]['existing'] += 1
+            return
+        if self.dry_run:
+            # Placeholder id so the children of a new object are planned as new too
+            self.id_maps[path][record[id_field]] = -record[id_field]
+            self.results[path]['created'] += 1
+            return
+        try:
+            created = await self.client.create(path, body)
+        except EngineError as e:
+            self.fail(path, record, f"{e.status_code} {e.text}")
+            return
+        except TRANSPORT_ERRORS as e:
+            self.fail(path, record, f"{type(e).__name__}: {e}")
+            return
+        self.id_maps[path][record[id_field]] = created[id_field]
+        self.results[path]['created'] += 1
+
+    # Give a column the engine generated for a new table the algorithm and domain of the snapshot
+    async def update_column(self, existing, body):
+        if self.dry_run:
+            self.results['column-metadata']['updated'] += 1
+            return
+        column_id = existing['columnMetadataId']
+        update = {key: value for key, value in existing.items() if key != 'columnMetadataId' and key not in SERVER_FIELDS}
+        update.update({field: body.get(field) for field in COLUMN_MASKING_FIELDS})
+        try:
+            response = await self.client.put(f"column-metadata/{column_id}", headers={'Content-Type': 'application/json'}, json=update)
+        except (EngineError,) + TRANSPORT_ERRORS as e:
+            self.fail('column-metadata', existing, f"{type(e).__name__}: {e}")
+            return
+        if response.status_code != 200:
+            self.fail('column-metadata', existing, f"{response.status_code} {response.text}")
+            return
+        self.results['column-metadata']['updated'] += 1
+
+    # Import the records of one type with at most `concurrency` creations in flight.
+    # existing are the target's objects the records may match, default every object of the type on the target.
+    # When the target's objects cannot be listed every record of the type is reported as failed.
+    async def import_type(self, path, records, existing=None):
+        try:
+            await self.load_existing(path, existing)
+        except (EngineError,) + TRANSPORT_ERRORS as e:
+            for record in records:
+                self.fail(path, record, f"Failed to list {path} on the target. {type(e).__name__}: {e}")
+            return
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        async def run(record):
+            try:
+                await self.import_record(path, record)
+            finally:
+                slots.release()
+
+        for record in records:
+            await slots.acquire()
+            task = asyncio.ensure_future(run(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        # The existing objects are only needed while this type is imported
+        self.existing.pop(path, None)
+
+    async def run(self, bundle):
+        for level in IMPORT_LEVELS:
+            started = time.monotonic()
+            await asyncio.gather(*(self.import_type(path, snapshot_records(bundle, path)) for path in level))
+            print(f"Imported {', '.join(level)} in {time.monotonic() - started:.1f}s")
+
+
+def print_import_report(snapshot_import, manifest):
+    print("\nSnapshot Import Report:")
+    print(f"{'Object Type':<22}{'In Snapshot':<13}{'Created':<10}{'Existing':<10}{'Updated':<10}{'Failed':<8}{'Skipped':<8}")
+    print("="*81)
+    for path, _, _, _ in SNAPSHOT_TYPES:
+        result = snapshot_import.results[path]
+        print(f"{path:<22}{manifest['counts'].get(path, 0):<13}{result['created']:<10}{result['existing']:<10}"
+              f"{result['updated']:<10}{result['failed']:<8}{result['skipped']:<8}")
+    if snapshot_import.failures:
+        print(f"\nFailed objects ({len(snapshot_import.failures)}):")
+        for path, object_id, key, message in snapshot_import.failures[:FAILURES_SHOWN]:
+            print(f"  {path} {object_id} ({key}): {message}")
+        if len(snapshot_import.failures) > FAILURES_SHOWN:
+            print(f"  ... and {len(snapshot_import.failures) - FAILURES_SHOWN} more")
+
+async def import_snapshot(engine, bundle, connector_passwords, concurrency, dry_run):
+    async with AsyncEngineClient(engine) as client:
+        snapshot_import = SnapshotImport(client, connector_passwords, concurrency, dry_run)
+        await snapshot_import.run(bundle)
+        return snapshot_import
+
+async def run_export(engine, bundle_path, workers):
+    async with AsyncEngineClient(engine) as client:
+        return await export_snapshot(client, bundle_path, workers)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a masking engine's configuration to a snapshot bundle, or import one.")
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('bundle', help="Snapshot bundle file")
+    parser.add_argument('--workers', type=int, default=8, help="With export, pages of a listing fetched at once")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="With import, objects of one type created at once")
+    parser.add_argument('--connector-passwords', metavar='FILE', help='With import, JSON file of {"connectorName": "password"}')
+    parser.add_argument('--dry-run', action='store_true', help="With import, only report what would be created")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    connector_passwords = None
+    if args.connector_passwords:
+        try:
+            with open(args.connector_passwords) as f:
+                connector_passwords = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read {args.connector_passwords}: {e}")
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    started = time.monotonic()
+    if args.action == 'export':
+        try:
+            counts = asyncio.run(run_export(engine, args.bundle, args.workers))
+        except (EngineError,) + TRANSPORT_ERRORS as e:
+            print("Failed to export the engine configuration.")
+            print(e)
+            return
+        print(f"Exported {sum(counts.values())} objects to {args.bundle} in {time.monotonic() - started:.1f}s")
+        return
+
+    try:
+        bundle, manifest = open_snapshot(args.bundle)
+    except (OSError, ValueError) as e:
+        print(f"Failed to read snapshot: {e}")
+        return
+    print(f"Importing snapshot of {manifest.get('engine')} taken {manifest.get('created')} into {engine.name}"
+          f"{' (dry run)' if args.dry_run else ''}")
+    # Errors of single objects and listings are counted in the report, the import always gets to it
+    with bundle:
+        snapshot_import = asyncio.run(import_snapshot(engine, bundle, connector_passwords, args.concurrency, args.dry_run))
+    print_import_report(snapshot_import, manifest)
+    print(f"Finished in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
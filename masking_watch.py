@@ -0,0 +1,248 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : masking_watch.py
+# Version   : v1
+# Live terminal dashboard of running masking executions, a watch mode for option 7 of interactive_masking_tasks.py.
+# Executions are refreshed with executions list calls (filtered with job_id when jobs are given) instead of one
+# GET per execution plus one job lookup each:
+# - the engine lists executions in executionId order, so new and running executions sit at the end of the list.
+#   Every tick only re-reads the pages from the one holding the oldest unfinished execution to the last page,
+#   which for a batch of running executions is usually one request per listing.
+# - job names come from one jobs listing at start, unknown jobs are looked up once.
+# - a listing whose executions have all finished is not polled again (unless --follow is given).
+# On a terminal only the rows that changed are redrawn, with the rows masked since the previous tick, the
+# instantaneous and smoothed rows/sec, the ETA and a SLOW/STALLED flag (see execution_progress.py).
+# Rows that do not fit the terminal are summarised on a "+N more" line, running and failed executions first.
+# Usage: python masking_watch.py [--job 12 --job 15] [--interval 5] [--follow] [--all]
+##################################################################################################################
+
+import argparse
+import math
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from execution_history import ExecutionHistory, format_number
+from execution_progress import ProgressTracker, format_duration, format_rate
+from masking_engine import (DEFAULT_PAGE_SIZE, TERMINAL_STATUSES, EngineClient, EngineError, Memo, add_metrics_arguments,
+                            enable_metrics, metrics)
+from masking_models import Execution, MaskingJob
+
+# Define the masking engine connection
+ENGINE_HOST = 'uvo1h6cwkmhoeckc9am.vm.cld.sr'
+API_VERSION = 'v5.1.35'
+POOL_SIZE = 10
+
+# Credentials come from MASKING_USERNAME / MASKING_PASSWORD or the credentials file,
+# see masking_engine.load_credentials
+
+DEFAULT_INTERVAL = 5.0
+
+# Number of header lines above the first execution row
+HEADER_LINES = 4
+
+
+# One executions listing (all executions, or the executions of one job) read from its unfinished tail
+class ExecutionFeed:
+    def __init__(self, engine, params=None, page_size=DEFAULT_PAGE_SIZE):
+        self.engine = engine
+        self.params = params or {}
+        self.page_size = page_size
+        # First page that still holds an unfinished execution, 1 until the first full read
+        self.start_page = 1
+        self.done = False
+
+    def _fetch(self, page_number):
+        return self.engine.fetch_page('executions', page_number, self.page_size, self.params)
+
+    # Read the listing from start_page to the end and return its executions as Execution objects.
+    # unfinished are the ids the caller still waits for: start_page moves to the page of the oldest of them,
+    # and if one of them was not seen (the list shifted) the next tick reads the whole listing again.
+    # With any_unfinished every running execution in the listing is waited for, not only the known ones.
+    def poll(self, unfinished, any_unfinished):
+        records, total = self._fetch(self.start_page)
+        pages = [records]
+        last_page = max(1, math.ceil((total or 0) / self.page_size))
+        if last_page > self.start_page:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                pages.extend(records for records, _ in executor.map(self._fetch, range(self.start_page + 1, last_page + 1)))
+
+        executions = []
+        oldest_page = None
+        for offset, records in enumerate(pages):
+            page_number = self.start_page + offset
+            for body in records:
+                execution = Execution.from_response(body)
+                executions.append(execution)
+                running = execution.status not in TERMINAL_STATUSES
+                if running and oldest_page is None and (any_unfinished or execution.execution_id in unfinished):
+                    oldest_page = page_number
+
+        seen = {execution.execution_id for execution in executions}
+        if any(execution_id not in seen for execution_id in unfinished):
+            self.start_page = 1
+        elif oldest_page is not None:
+            self.start_page = oldest_page
+        elif any_unfinished:
+            self.start_page = last_page
+        else:
+            self.done = True
+        return executions
+
+
+# Terminal table of the watched executions, redrawing only the screen rows whose text changed.
+# When there are more executions than terminal lines, running and then failed executions are shown first and
+# the others are counted on a "+N more" line.
+class Dashboard:
+    columns = [('Execution ID', 14), ('Job ID', 8), ('Job Name', 24), ('Status', 11), ('Rows Masked', 14),
+               ('Delta Rows', 12), ('Rows/sec', 12), ('Avg Rows/sec', 14), ('ETA', 10), ('Flag', 9), ('Start Time', 20)]
+
+    def __init__(self, interactive):
+        self.interactive = interactive
+        self.lines = {}
+        # executionId -> 0 running, 1 failed, 2 other, the order rows are kept in when the screen is full
+        self.ranks = {}
+        # Text currently drawn on each screen row below the header
+        self.screen = []
+
+    def header(self, status_line):
+        if not self.interactive:
+            return
+        header = ''.join(f"{heading:<{width}}" for heading, width in self.columns)
+        # Move to the top left, draw the header and keep the rows below it
+        sys.stdout.write(f"\x1b[H\x1b[K{status_line}\n\x1b[K\n\x1b[K{header}\n\x1b[K{'=' * len(header)}\n")
+
+    def clear(self):
+        if self.interactive:
+            sys.stdout.write("\x1b[2J\x1b[H")
+        self.screen = []
+
+    def update(self, execution_id, row, status=None):
+        self.ranks[execution_id] = 0 if status not in TERMINAL_STATUSES else 1 if status == 'FAILED' else 2
+        line = ''.join(f"{str(value):<{width}}" for value, (_, width) in zip(row, self.columns))
+        if self.lines.get(execution_id) == line:
+            return
+        self.lines[execution_id] = line
+        if not self.interactive:
+            print(line)
+
+    # The rows that fit below the header, one line is kept free for the cursor
+    def _rows(self):
+        capacity = max(2, shutil.get_terminal_size().lines - HEADER_LINES - 1)
+        if len(self.lines) <= capacity:
+            return [self.lines[execution_id] for execution_id in sorted(self.lines)]
+        shown = sorted(self.lines, key=lambda execution_id: (self.ranks[execution_id], execution_id))[:capacity - 1]
+        return [self.lines[execution_id] for execution_id in shown] + [f"+{len(self.lines) - len(shown)} more"]
+
+    def flush(self):
+        if self.interactive:
+            rows = self._rows()
+            for position, line in enumerate(rows):
+                if position >= len(self.screen) or self.screen[position] != line:
+                    sys.stdout.write(f"\x1b[{HEADER_LINES + position + 1};1H\x1b[K{line}")
+            for position in range(len(rows), len(self.screen)):
+                sys.stdout.write(f"\x1b[{HEADER_LINES + position + 1};1H\x1b[K")
+            self.screen = rows
+            sys.stdout.write(f"\x1b[{HEADER_LINES + len(rows) + 1};1H")
+        sys.stdout.flush()
+
+
+# Watch executions until every watched execution has finished (or forever with follow)
+def watch_executions(engine, job_ids=None, interval=DEFAULT_INTERVAL, follow=False, include_finished=False, history=None):
+    job_names = {job.job_id: job.name for job in map(MaskingJob.from_response, engine.paginate('masking-jobs'))}
+    def lookup_job_name(job_id):
+        response = engine.get(f"masking-jobs/{job_id}")
+        return response.json().get('jobName', 'Unknown') if response.status_code == 200 else 'Unknown'
+    job_lookup = Memo(lookup_job_name)
+
+    feeds = [ExecutionFeed(engine, {'job_id': job_id}) for job_id in job_ids] if job_ids else [ExecutionFeed(engine)]
+    watched = {}
+    unfinished = {}
+    dashboard = Dashboard(sys.stdout.isatty())
+    dashboard.clear()
+    progress = ProgressTracker(engine.host, history)
+    first_tick = True
+
+    while True:
+        requests_before = metrics.request_count()
+        for feed in feeds:
+            if feed.done:
+                continue
+            for execution in feed.poll(unfinished.get(id(feed), set()), first_tick or follow):
+                execution_id = execution.execution_id
+                finished = execution.status in TERMINAL_STATUSES
+                if execution_id not in watched:
+                    # Only executions running when the watch started, or started since with follow, are shown
+                    if first_tick and finished and not include_finished:
+                        continue
+                    if not first_tick and not follow:
+                        continue
+                    watched[execution_id] = {"rowsMasked": None, "feed": id(feed)}
+                entry = watched[execution_id]
+                if finished:
+                    unfinished.get(id(feed), set()).discard(execution_id)
+                else:
+                    unfinished.setdefault(id(feed), set()).add(execution_id)
+                execution.job_name = job_names.get(execution.job_id)
+                progress.observe(execution)
+                if history and (not finished or entry.get('status') != execution.status):
+                    history.record(engine.host, execution)
+                entry["status"] = execution.status
+                entry["execution"] = execution
+
+        requests_made = metrics.request_count() - requests_before
+        running = sum(len(ids) for ids in unfinished.values())
+        dashboard.header(f"{engine.name}  {time.strftime('%H:%M:%S')}  running: {running}  watched: {len(watched)}  "
+                         f"requests this refresh: {requests_made}")
+        for execution_id in sorted(watched):
+            entry = watched[execution_id]
+            execution = entry["execution"]
+            job_id = execution.job_id
+            job_name = execution.job_name or job_lookup(job_id)
+            rows = execution.rows_masked
+            delta = rows - entry["rowsMasked"] if rows is not None and entry["rowsMasked"] is not None else None
+            entry["rowsMasked"] = rows
+            sampled = progress.get(execution_id)
+            running = execution.status not in TERMINAL_STATUSES
+            dashboard.update(execution_id, [execution_id, job_id, job_name[:23], execution.status,
+                                            format_number(rows, 0) if rows is not None else 'Unknown',
+                                            f"+{delta:,}" if delta else '', format_rate(sampled.rate) if running else '',
+                                            format_rate(sampled.smoothed_rate), format_duration(sampled.eta) if running else '',
+                                            sampled.flag(), execution.start_text], execution.status)
+        dashboard.flush()
+        first_tick = False
+
+        if all(feed.done for feed in feeds):
+            print("All watched executions have finished.")
+            return watched
+        time.sleep(interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch running masking executions.")
+    parser.add_argument('--job', type=int, action='append', help="Only watch executions of this masking job ID (can be repeated)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="Seconds between refreshes")
+    parser.add_argument('--follow', action='store_true', help="Keep watching and show executions started after the watch began")
+    parser.add_argument('--all', action='store_true', help="Also show executions that had already finished when the watch started")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    enable_metrics(args.stats, args.metrics_file)
+
+    engine = EngineClient(ENGINE_HOST, api_version=API_VERSION, pool_size=POOL_SIZE)
+    if not engine.login():
+        return
+
+    history = ExecutionHistory()
+    try:
+        watch_executions(engine, args.job, args.interval, args.follow, args.all, history)
+    except EngineError as e:
+        print("Failed to retrieve executions.")
+        print(e)
+    except KeyboardInterrupt:
+        print()
+    history.close()
+
+if __name__ == "__main__":
+    main()
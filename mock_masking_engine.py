@@ -0,0 +1,318 @@
+###################################################################################################################
+# Delphix Corp (2024)
+# Author    : Aaron Tully
+# Date      : July 2024
+# Script    : mock_masking_engine.py
+# Version   : v1
+# Local stand-in for the masking engine API so the scripts can be run and benchmarked without a live engine.
+# Covers /login, database-rulesets (incl. refresh), database-connectors, masking-jobs, profile-jobs, executions,
+# async-tasks, classifiers and profile-sets, with page_number/page_size pagination and _pageInfo totals.
+# Executions and refresh tasks report RUNNING until their configured duration has passed, then SUCCEEDED.
+# Latency, jitter and an error rate (503 responses) can be configured to mimic a loaded engine.
+# GET responses carry an ETag and answer a matching If-None-Match with 304 Not Modified.
+# Request counters are served on /__stats (GET) and cleared with /__reset (POST), outside the API path.
+# Usage: python mock_masking_engine.py [--port 8282] [--objects 1000] [--latency 20] [--error-rate 0.01]
+#        then point a script at it with ENGINE_HOST = 'localhost:8282'
+##################################################################################################################
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_PORT = 8282
+DEFAULT_PAGE_SIZE = 100
+
+# Collections served as list endpoints and the id field of their records
+collections = {
+    'database-rulesets': 'databaseRulesetId',
+    'database-connectors': 'databaseConnectorId',
+    'masking-jobs': 'maskingJobId',
+    'profile-jobs': 'profileJobId',
+    'executions': 'executionId',
+    'async-tasks': 'asyncTaskId',
+    'classifiers': 'classifierId',
+    'profile-sets': 'profileSetId',
+    'table-metadata': 'tableMetadataId',
+    'column-metadata': 'columnMetadataId',
+}
+
+# Query parameters a list endpoint can be filtered on and the record field they match
+filters = {
+    'job_id': 'jobId',
+    'ruleset_id': 'rulesetId',
+    'table_metadata_id': 'tableMetadataId',
+}
+
+
+def timestamp(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + '+00:00'
+
+
+# In-memory engine content and request counters, shared by all handler threads
+class MockEngine:
+    def __init__(self, objects=100, execution_duration=2.0, refresh_duration=1.0, rows_per_second=10000,
+                 latency=0.0, jitter=0.0, error_rate=0.0, default_page_size=DEFAULT_PAGE_SIZE):
+        self.execution_duration = execution_duration
+        self.refresh_duration = refresh_duration
+        self.rows_per_second = rows_per_second
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.default_page_size = default_page_size
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.counts = Counter()
+        self.data = {name: {} for name in collections}
+        self.populate(objects)
+
+    # Create `objects` rulesets with their table metadata and a profile job each, masking jobs for the first half
+    # of them, `objects` finished executions spread over those jobs, plus connectors, classifiers and profile sets
+    def populate(self, objects):
+        now = time.time()
+        connectors = max(1, objects // 100)
+        for i in range(1, connectors + 1):
+            self.add('database-connectors', {"connectorName": f"CONNECTOR_{i}", "databaseType": "ORACLE", "host": f"db{i}.example.com"})
+        for i in range(1, objects + 1):
+            ruleset = self.add('database-rulesets', {"rulesetName": f"RULESET_{i}", "databaseConnectorId": (i - 1) % connectors + 1})
+            table = self.add('table-metadata', {"tableName": f"TABLE_{i}", "rulesetId": ruleset['databaseRulesetId']})
+            for column in range(1, 4):
+                self.add('column-metadata', {"columnName": f"COLUMN_{column}", "tableMetadataId": table['tableMetadataId'],
+                                             "dataType": "VARCHAR2", "isMasked": column == 1,
+                                             "algorithmName": "FirstNameLookup" if column == 1 else None,
+                                             "domainName": "FIRST_NAME" if column == 1 else None})
+            self.add('profile-jobs', {"jobName": f"PROFILE_{i}", "rulesetId": ruleset['databaseRulesetId'], "profileSetId": 1})
+            if i <= max(1, objects // 2):
+                self.add('masking-jobs', {"jobName": f"RULESET_{i}", "rulesetId": ruleset['databaseRulesetId'],
+                                          "feedbackSize": 100000, "onTheFlyMasking": False,
+                                          "databaseMaskingOptions": {"batchUpdate": True, "commitSize": 20000, "dropConstraints": True}})
+        # One finished execution per ruleset, spread over the masking jobs
+        jobs = len(self.data['masking-jobs'])
+        for i in range(1, objects + 1):
+            start = now - 3600
+            self.add('executions', {"jobId": (i - 1) % jobs + 1, "status": "SUCCEEDED", "rowsMasked": 100000 + i,
+                                    "rowsTotal": 100000 + i, "startTime": timestamp(start), "endTime": timestamp(start + 60 + i % 60)})
+        classifiers = max(10, objects)
+        for i in range(1, classifiers + 1):
+            self.add('classifiers', {"classifierName": f"CLASSIFIER_{i}", "domainName": f"DOMAIN_{i % 25}"})
+        for i in range(1, max(1, objects // 100) + 1):
+            self.add('profile-sets', {"profileSetName": f"PROFILE_SET_{i}",
+                                      "classifierIds": list(range(i, classifiers + 1, max(1, objects // 100)))})
+
+    def add(self, collection, record):
+        records = self.data[collection]
+        record[collections[collection]] = len(records) + 1
+        records[record[collections[collection]]] = record
+        return record
+
+    # Bring RUNNING executions and async tasks up to date with the time passed since they started
+    def advance(self, collection, record):
+        started = record.get('_started')
+        if started is None or record['status'] != 'RUNNING':
+            return
+        elapsed = time.time() - started
+        if collection == 'executions':
+            record['rowsMasked'] = int(min(elapsed, record['_duration']) * self.rows_per_second)
+        if elapsed >= record['_duration']:
+            record['status'] = 'SUCCEEDED'
+            record['endTime'] = timestamp(started + record['_duration'])
+
+    def start(self, collection, record, duration):
+        record.update({"status": "RUNNING", "startTime": timestamp(time.time()), "_started": time.time(), "_duration": duration})
+        if collection == 'executions':
+            record['rowsMasked'] = 0
+        return self.add(collection, record)
+
+
+class MockEngineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without TCP_NODELAY every keep-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    engine = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # With etag the response carries an ETag, and a request whose If-None-Match matches it gets a 304
+    def send_json(self, status, body, etag=False):
+        data = json.dumps(body).encode()
+        tag = f'"{hashlib.sha1(data).hexdigest()[:16]}"' if etag else None
+        if tag and self.headers.get('If-None-Match') == tag:
+            self.send_response(304)
+            self.send_header('ETag', tag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if tag:
+            self.send_header('ETag', tag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    # Common handling: counters, simulated latency and errors, authorization. Returns (path, query) or None.
+    def prepare(self, method):
+        # Always read the body first so an early error response leaves the keep-alive connection usable
+        self.body = self.read_json() if method in ('POST', 'PUT') else {}
+        url = urlparse(self.path)
+        if url.path == '/__stats':
+            self.send_json(200, {"requests": sum(self.engine.counts.values()), "byEndpoint": dict(self.engine.counts)})
+            return None
+        if url.path == '/__reset':
+            self.engine.counts.clear()
+            self.send_json(200, {})
+            return None
+        match = re.match(r'/masking/api/[^/]+/(.*)', url.path)
+        if not match:
+            self.send_json(404, {"errorMessage": "Not found"})
+            return None
+        path = match.group(1).rstrip('/')
+        endpoint = re.sub(r'/\d+', '/{id}', path)
+        with self.engine.lock:
+            self.engine.counts[f"{method} {endpoint}"] += 1
+
+        if self.engine.latency or self.engine.jitter:
+            time.sleep(max(0.0, self.engine.latency + random.uniform(-self.engine.jitter, self.engine.jitter)))
+        if path != 'login' and random.random() < self.engine.error_rate:
+            self.send_json(503, {"errorMessage": "Engine is busy"})
+            return None
+        if path != 'login' and self.headers.get('Authorization') not in self.engine.tokens:
+            self.send_json(401, {"errorMessage": "Unauthorized"})
+            return None
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return path, query
+
+    def public(self, record):
+        return {key: value for key, value in record.items() if not key.startswith('_')}
+
+    def do_GET(self):
+        prepared = self.prepare('GET')
+        if not prepared:
+            return
+        path, query = prepared
+        parts = path.split('/')
+        collection = parts[0]
+        if collection not in collections:
+            return self.send_json(404, {"errorMessage": f"Unknown endpoint {path}"})
+
+        with self.engine.lock:
+            if len(parts) == 2 and parts[1].isdigit():
+                record = self.engine.data[collection].get(int(parts[1]))
+                if not record:
+                    return self.send_json(404, {"errorMessage": f"{collection} {parts[1]} not found"})
+                self.engine.advance(collection, record)
+                return self.send_json(200, self.public(record), etag=True)
+
+            records = self.engine.data[collection].values()
+            for parameter, field in filters.items():
+                if parameter in query:
+                    records = [record for record in records if str(record.get(field)) == query[parameter]]
+            records = list(records)
+            for record in records:
+                self.engine.advance(collection, record)
+            if 'page_number' in query or 'page_size' in query:
+                page_size = int(query.get('page_size', self.engine.default_page_size))
+                page_number = int(query.get('page_number', 1))
+                page = records[(page_number - 1) * page_size:page_number * page_size]
+            else:
+                page = records
+            body = {"_pageInfo": {"numberOnPage": len(page), "total": len(records)}, "responseList": [self.public(r) for r in page]}
+        self.send_json(200, body, etag=True)
+
+    def do_POST(self):
+        prepared = self.prepare('POST')
+        if not prepared:
+            return
+        path, _ = prepared
+        body = self.body
+        with self.engine.lock:
+            if path == 'login':
+                token = f"token-{random.getrandbits(64):x}"
+                self.engine.tokens.add(token)
+                return self.send_json(200, {"Authorization": token})
+            if path == 'executions':
+                if body.get('jobId') not in self.engine.data['masking-jobs'] and body.get('jobId') not in self.engine.data['profile-jobs']:
+                    return self.send_json(404, {"errorMessage": f"Job {body.get('jobId')} not found"})
+                record = self.engine.start('executions', {"jobId": body['jobId']}, self.engine.execution_duration)
+                return self.send_json(200, self.public(record))
+            if path in ('masking-jobs', 'database-rulesets', 'database-connectors', 'table-metadata', 'column-metadata',
+                        'profile-sets', 'profile-jobs'):
+                name_field = {'masking-jobs': 'jobName', 'database-rulesets': 'rulesetName'}.get(path)
+                if name_field and any(r.get(name_field) == body.get(name_field) for r in self.engine.data[path].values()):
+                    return self.send_json(409, {"errorMessage": f"{body.get(name_field)} already exists"})
+                return self.send_json(200, self.public(self.engine.add(path, body)))
+        self.send_json(404, {"errorMessage": f"Unknown endpoint {path}"})
+
+    def do_PUT(self):
+        prepared = self.prepare('PUT')
+        if not prepared:
+            return
+        path, _ = prepared
+        body = self.body
+        with self.engine.lock:
+            match = re.match(r'database-rulesets/(\d+)/refresh$', path)
+            if match:
+                if int(match.group(1)) not in self.engine.data['database-rulesets']:
+                    return self.send_json(404, {"errorMessage": f"Ruleset {match.group(1)} not found"})
+                record = self.engine.start('async-tasks', {"operation": "RULESET_REFRESH", "reference": match.group(1)},
+                                           self.engine.refresh_duration)
+                return self.send_json(200, self.public(record))
+            match = re.match(r'([a-z-]+)/(\d+)$', path)
+            if match and match.group(1) in collections and int(match.group(2)) in self.engine.data[match.group(1)]:
+                record = self.engine.data[match.group(1)][int(match.group(2))]
+                record.update(body)
+                record[collections[match.group(1)]] = int(match.group(2))
+                return self.send_json(200, self.public(record))
+        self.send_json(404, {"errorMessage": f"Unknown endpoint {path}"})
+
+
+# Start a mock engine server in a background thread, returns the server (call shutdown() to stop it)
+# Accepts connections as fast as clients with hundreds of requests in flight open them (the default backlog is 5)
+class MockEngineServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(engine, port=DEFAULT_PORT, host='127.0.0.1'):
+    handler = type('Handler', (MockEngineHandler,), {'engine': engine})
+    server = MockEngineServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock masking engine.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--objects', type=int, default=100, help="Number of rulesets (and related objects) to create")
+    parser.add_argument('--latency', type=float, default=0.0, help="Added latency per request in milliseconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +/- latency in milliseconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of API requests answered with 503")
+    parser.add_argument('--execution-duration', type=float, default=2.0, help="Seconds an execution stays RUNNING")
+    parser.add_argument('--refresh-duration', type=float, default=1.0, help="Seconds a ruleset refresh stays RUNNING")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help="Page size when page_number is given without page_size")
+    args = parser.parse_args()
+
+    engine = MockEngine(args.objects, execution_duration=args.execution_duration, refresh_duration=args.refresh_duration,
+                        latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+                        default_page_size=args.page_size)
+    server = start_server(engine, args.port)
+    print(f"Mock masking engine listening on http://127.0.0.1:{args.port}/masking/api/v5.1.33 with {args.objects} rulesets")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
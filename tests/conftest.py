@@ -0,0 +1,65 @@
+# Fixtures shared by the tests: mock masking engines (mock_masking_engine.py) served from a background thread
+# on a free port, and logged in EngineClients of them.
+
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import masking_engine
+from masking_engine import EngineClient
+from mock_masking_engine import MockEngine, start_server
+
+LOGIN = {'username': 'admin', 'password': 'secret'}
+
+# Small engines whose executions and refreshes finish quickly
+MOCK_OPTIONS = {'objects': 20, 'execution_duration': 0.2, 'refresh_duration': 0.1}
+
+
+# Retries and status polls wait milliseconds instead of seconds
+@pytest.fixture(autouse=True)
+def fast_waits(monkeypatch):
+    monkeypatch.setattr(masking_engine, 'backoff_delay', lambda attempt, response=None: 0.01)
+    monkeypatch.setattr(masking_engine, 'poll_intervals', lambda: itertools.repeat(0.05))
+
+
+# Writes from clients without a cache invalidate the shared response cache file, keep it out of the home directory
+@pytest.fixture(autouse=True)
+def response_cache_file(monkeypatch, tmp_path):
+    path = str(tmp_path / 'responses.db')
+    monkeypatch.setattr(masking_engine, 'RESPONSE_CACHE_FILE', path)
+    return path
+
+
+# start_engine(mock=None, **options) serves a MockEngine (a new one built from MOCK_OPTIONS and options when none
+# is given) and returns (mock, EngineClient). Clients and servers are closed after the test.
+@pytest.fixture
+def start_engine():
+    started = []
+
+    def start(mock=None, response_cache=None, **options):
+        mock = mock or MockEngine(**dict(MOCK_OPTIONS, **options))
+        server = start_server(mock, port=0)
+        engine = EngineClient(f"127.0.0.1:{server.server_address[1]}", token_cache=False, response_cache=response_cache)
+        started.append((server, engine))
+        engine.login(dict(LOGIN))
+        return mock, engine
+
+    yield start
+    for server, engine in started:
+        engine.close()
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def mock_engine(start_engine):
+    return start_engine()
+
+
+@pytest.fixture
+def engine(mock_engine):
+    return mock_engine[1]
@@ -0,0 +1,59 @@
+# convert_UTC_log_time_to_local_time.py: timestamps around DST changes and day boundaries, chunked conversion
+# of a whole file in input order, and refusing an unknown --timezone.
+
+import os
+import sys
+from multiprocessing import Pool
+
+import pytest
+
+import convert_UTC_log_time_to_local_time as converter
+from convert_UTC_log_time_to_local_time import TimestampConverter
+
+
+@pytest.mark.parametrize('utc, local', [
+    # Europe/Dublin goes from GMT to IST at 01:00 UTC on 2024-03-31 and back at 01:00 UTC on 2024-10-27
+    (b'2024-03-31T00:59:59,999Z', b'2024-03-31T00:59:59,999'),
+    (b'2024-03-31T01:00:00,000Z', b'2024-03-31T02:00:00,000'),
+    (b'2024-10-27T00:59:59,500Z', b'2024-10-27T01:59:59,500'),
+    (b'2024-10-27T01:00:00,000Z', b'2024-10-27T01:00:00,000'),
+    (b'2024-07-01T23:30:00,123Z', b'2024-07-02T00:30:00,123'),
+    (b'2024-12-31T23:59:59,001Z', b'2024-12-31T23:59:59,001'),
+])
+def test_timestamps_follow_dst_changes(utc, local):
+    assert TimestampConverter('Europe/Dublin').convert(utc) == local
+
+def test_offsets_are_cached_across_dst_changes():
+    # One converter for a whole log, going back and forth over both changes of the year
+    lines = [b'2024-03-31T00:30:00,000Z', b'2024-10-27T01:30:00,000Z', b'2024-03-31T01:30:00,000Z',
+             b'2024-10-27T00:30:00,000Z', b'2024-01-15T12:00:00,000Z']
+    converted = TimestampConverter('America/New_York').convert(b'\n'.join(lines)).split(b'\n')
+    assert converted == [b'2024-03-30T20:30:00,000', b'2024-10-26T21:30:00,000', b'2024-03-30T21:30:00,000',
+                         b'2024-10-26T20:30:00,000', b'2024-01-15T07:00:00,000']
+
+def test_other_text_is_left_alone():
+    text = b'job 12 started 2024-05-01T08:00:00,000Z (was 2024-05-01T08:00:00Z), id 2024-05-01T08:00:00,000ZZ'
+    assert TimestampConverter('Asia/Kolkata').convert(text) == \
+        b'job 12 started 2024-05-01T13:30:00,000 (was 2024-05-01T08:00:00Z), id 2024-05-01T08:00:00,000ZZ'
+
+
+def test_convert_file_keeps_line_order(tmp_path):
+    source = tmp_path / 'masking_logs_UTC.txt'
+    lines = [f"2024-03-31T00:{i // 60 % 60:02d}:{i % 60:02d},{i % 1000:03d}Z INFO line {i}\n" for i in range(5000)]
+    source.write_text(''.join(lines))
+    target = tmp_path / 'masking_logs_local.txt'
+
+    # Chunks of a few KB spread over two workers
+    with Pool(2, initializer=converter._init_worker, initargs=('UTC',)) as pool:
+        converter.convert_file(pool, str(source), str(target), 4096, 2)
+    assert target.read_text() == ''.join(line.replace('Z INFO', ' INFO') for line in lines)
+
+def test_unknown_timezone_is_refused_before_any_output(tmp_path, monkeypatch, capsys):
+    source = tmp_path / 'masking_logs_UTC.txt'
+    source.write_text('2024-03-31T00:59:59,999Z INFO\n')
+    target = tmp_path / 'masking_logs_local.txt'
+    monkeypatch.setattr(sys, 'argv', ['convert', str(source), str(target), '--timezone', 'Bad/Zone'])
+    with pytest.raises(SystemExit):
+        converter.main()
+    assert 'unknown time zone: Bad/Zone' in capsys.readouterr().err
+    assert not os.path.exists(target)
@@ -0,0 +1,69 @@
+# execution_history.py: recording observations of executions, and the duration and rows/sec reports built on them.
+
+import pytest
+
+from execution_history import ExecutionHistory, percentile
+from masking_models import Execution
+
+ENGINE = 'engine.example.com'
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = ExecutionHistory(str(tmp_path / 'history.db'))
+    yield history
+    history.close()
+
+# A successful run of a job that started at `start` and took `duration` seconds
+def run(execution_id, job_id, start, duration, rows, status='SUCCEEDED'):
+    return Execution(execution_id, job_id, status, rows, start_time=start, end_time=start + duration)
+
+
+def test_later_observation_replaces_the_earlier(history):
+    history.record(ENGINE, Execution(1, 7, 'RUNNING', 10, start_time=1000), 'JOB_7')
+    history.record(ENGINE, run(1, 7, 1000, 50, 500))
+    status, rows_masked, _ = history.last_observation(ENGINE, 1)
+    assert (status, rows_masked) == ('SUCCEEDED', 500)
+
+def test_known_job_name_is_kept(history):
+    history.record(ENGINE, run(1, 7, 1000, 50, 500), 'JOB_7')
+    history.record(ENGINE, run(1, 7, 1000, 60, 600))
+    history.record_many(ENGINE, [run(1, 7, 1000, 60, 600)], 'Unknown')
+    assert history.completed_runs() == [(ENGINE, 7, 'JOB_7', 600, 60)]
+    history.record(ENGINE, run(1, 7, 1000, 60, 600), 'JOB_7_RENAMED')
+    assert history.trend('JOB_7_RENAMED')[0]['jobName'] == 'JOB_7_RENAMED'
+
+def test_executions_are_kept_per_engine(history):
+    history.record(ENGINE, run(1, 7, 1000, 50, 500), 'JOB_7')
+    history.record('other.example.com', run(1, 3, 1000, 20, 100), 'JOB_3')
+    assert history.last_observation(ENGINE, 1)[1] == 500
+    assert history.last_observation('other.example.com', 1)[1] == 100
+    assert history.last_observation(ENGINE, 2) is None
+
+
+def test_expected_duration_is_the_median_of_successful_runs(history):
+    history.record_many(ENGINE, [run(1, 7, 1000, 50, 500), run(2, 7, 2000, 70, 700), run(3, 7, 3000, 60, 600),
+                                 run(4, 7, 4000, 900, 0, status='FAILED')], 'JOB_7')
+    assert history.expected_duration(ENGINE, 7) == 60
+    assert history.expected_duration(ENGINE, 7, limit=1) == 60
+    assert history.expected_duration(ENGINE, 8) is None
+    assert history.expected_rows(ENGINE, 7) == 600
+
+def test_throughput_and_percentiles(history):
+    history.record_many(ENGINE, [run(1, 7, 1000, 10, 1000), run(2, 7, 2000, 20, 1000), run(3, 3, 1500, 5, None)])
+    report = {entry['jobId']: entry for entry in history.throughput()}
+    assert report[7]['runs'] == 2
+    assert report[7]['avgRate'] == 75 and report[7]['lastRate'] == 50
+    assert report[3]['avgRate'] is None
+    durations = {entry['jobId']: entry for entry in history.duration_percentiles()}
+    assert durations[7]['p50'] == 15 and durations[3]['p99'] == 5
+    assert percentile([], 0.5) is None
+
+def test_regressions_compare_recent_runs_with_earlier_ones(history):
+    runs = [run(i, 7, i * 1000, 10, 1000) for i in range(1, 8)]
+    runs += [run(i, 7, i * 1000, 20, 1000) for i in range(8, 11)]
+    runs += [run(i, 3, i * 1000, 10, 1000) for i in range(11, 21)]
+    history.record_many(ENGINE, runs, 'JOB')
+    report = history.regressions()
+    assert [entry['jobId'] for entry in report] == [7]
+    assert report[0]['change'] == pytest.approx(-0.5)
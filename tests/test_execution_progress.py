@@ -0,0 +1,106 @@
+# execution_progress.py: rows/sec, smoothed rate and ETA of running executions, their SLOW/STALLED flags, and the
+# first sample taken from the execution history.
+
+import pytest
+
+from execution_history import ExecutionHistory
+from execution_progress import (EWMA_WINDOW, RING_SIZE, STALL_SECONDS, ExecutionProgress, ProgressTracker,
+                                format_duration, format_rate)
+from masking_models import Execution
+
+ENGINE = 'engine.example.com'
+
+
+def running(rows, execution_id=1, job_id=7):
+    return Execution(execution_id, job_id, 'RUNNING', rows)
+
+
+def test_rate_and_eta_at_a_steady_rate():
+    progress = ExecutionProgress(expected_rows=10000)
+    for t in range(0, 50, 10):
+        progress.add(t, t * 100, 'RUNNING')
+    assert progress.rate == 100
+    assert progress.smoothed_rate == pytest.approx(100)
+    assert progress.eta == pytest.approx(60)
+    assert progress.percent == 40
+    assert len(progress.samples) == 5
+
+def test_smoothed_rate_weighs_samples_by_their_interval():
+    progress = ExecutionProgress()
+    progress.add(0, 0)
+    progress.add(10, 1000)
+    progress.add(10 + EWMA_WINDOW, 1000 + 300 * EWMA_WINDOW)
+    # A full window later the new rate weighs 1 - 1/e
+    assert progress.rate == 300
+    assert progress.smoothed_rate == pytest.approx(100 + (1 - 0.36788) * 200, rel=1e-4)
+
+def test_restarted_count_and_stale_samples():
+    progress = ExecutionProgress()
+    progress.add(0, 500)
+    progress.add(10, 1500)
+    progress.add(5, 2000)
+    assert progress.rows == 1500
+    progress.add(20, 100)
+    assert progress.rows == 100 and progress.rate is None and progress.smoothed_rate is None
+
+def test_ring_buffer_keeps_the_last_samples():
+    progress = ExecutionProgress()
+    for t in range(RING_SIZE * 2):
+        progress.add(t, t)
+    assert len(progress.samples) == RING_SIZE
+    assert progress.samples[0] == (RING_SIZE, RING_SIZE)
+
+
+def test_unmoving_execution_is_stalled():
+    progress = ExecutionProgress()
+    progress.add(0, 100, 'RUNNING')
+    progress.add(60, 500, 'RUNNING')
+    progress.add(60 + STALL_SECONDS, 500, 'RUNNING')
+    assert progress.flag() == 'STALLED'
+    progress.add(61 + STALL_SECONDS, 500, 'SUCCEEDED')
+    assert progress.flag() == ''
+
+def test_slow_against_the_last_run_or_the_peak_rate():
+    progress = ExecutionProgress(reference_rate=1000)
+    for t, rows in ((0, 0), (10, 1000), (20, 2000)):
+        progress.add(t, rows, 'RUNNING')
+    assert progress.flag() == 'SLOW'
+
+    progress = ExecutionProgress()
+    rows = 0
+    for t in range(0, 600, 10):
+        rows += 10000 if t < 300 else 10
+        progress.add(t, rows, 'RUNNING')
+    assert progress.flag() == 'SLOW'
+    assert ExecutionProgress().flag() == ''
+
+
+def test_tracker_uses_the_last_run_and_last_observation(tmp_path):
+    history = ExecutionHistory(str(tmp_path / 'history.db'))
+    history.record(ENGINE, Execution(1, 7, 'SUCCEEDED', 6000, start_time=0, end_time=60), 'JOB_7')
+    history.record(ENGINE, running(1000, execution_id=2))
+    observed_at = history.last_observation(ENGINE, 2)[2]
+
+    tracker = ProgressTracker(ENGINE, history)
+    progress = tracker.observe(running(3000, execution_id=2), now=observed_at + 20)
+    # The recorded observation is the first sample, so the first check already has a rate
+    assert progress.rate == pytest.approx(100)
+    assert progress.expected_rows == 6000 and progress.reference_rate == 100
+    assert progress.eta == pytest.approx(30)
+    assert tracker.get(2) is progress and tracker.get(3) is None
+    history.close()
+
+def test_tracker_without_history():
+    tracker = ProgressTracker(ENGINE)
+    tracker.observe(running(0), now=0)
+    progress = tracker.observe(running(500), now=5)
+    assert progress.rate == 100 and progress.eta is None
+
+
+@pytest.mark.parametrize('seconds, text', [(None, ''), (float('nan'), ''), (45, '45s'), (750, '12m 30s'), (7500, '2h 05m')])
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+def test_format_rate():
+    assert format_rate(None) == ''
+    assert format_rate(1234.56) == '1,234.6'
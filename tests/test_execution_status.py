@@ -0,0 +1,75 @@
+# Execution status checks of masking_job_rs_creation.py: parsing status queries, and checking many executions at
+# once with their rows printed in input order.
+
+import time
+
+import pytest
+import requests
+
+from masking_engine_async import AsyncEngineClient
+from masking_job_rs_creation import check_execution_statuses_by_query, check_multiple_execution_statuses, parse_status_query
+
+
+def test_parse_status_query_reads_ids_and_filters():
+    query = parse_status_query("7 5-6 job='RULESET 3' status=failed,Running since=today")
+    assert list(query['executionIds']) == [5, 6, 7]
+    assert query['jobName'] == 'RULESET 3'
+    assert query['statuses'] == {'FAILED', 'RUNNING'}
+    assert query['since'] <= time.time()
+
+def test_parse_status_query_job_ids_and_ages():
+    query = parse_status_query("job=12,15-16 since=24h until=2024-05-01")
+    assert list(query['jobIds']) == [12, 15, 16]
+    assert abs(query['since'] - (time.time() - 86400)) < 5
+    assert query['until'] < query['since']
+
+def test_parse_status_query_needs_all_for_every_execution():
+    assert parse_status_query("all") == {}
+    assert parse_status_query("ALL status=FAILED") == {'statuses': {'FAILED'}}
+    with pytest.raises(ValueError):
+        parse_status_query("   ")
+
+@pytest.mark.parametrize('query', ["owner=me", "since=someday", "5-x"])
+def test_parse_status_query_rejects_bad_input(query):
+    with pytest.raises(ValueError):
+        parse_status_query(query)
+
+
+# Execution IDs of the status rows printed, errors as ('error', id)
+def printed_rows(out):
+    rows = []
+    for line in out.splitlines():
+        if line.startswith('Failed to retrieve status for Execution ID '):
+            rows.append(('error', int(line.split()[7].rstrip('.'))))
+        elif line[:1].isdigit():
+            rows.append(int(line.split()[0]))
+    return rows
+
+def test_statuses_are_printed_in_input_order(mock_engine, capsys):
+    mock, engine = mock_engine
+    check_multiple_execution_statuses(engine, [12, 3, 999, 2])
+    assert printed_rows(capsys.readouterr().out) == [12, 3, ('error', 999), 2]
+    # Executions 12 and 2 share a job, it is looked up once
+    assert mock.counts['GET masking-jobs/{id}'] == 2
+
+def test_transport_error_prints_an_error_row(mock_engine, monkeypatch, capsys):
+    mock, engine = mock_engine
+    execution = AsyncEngineClient.execution
+
+    async def unreachable_for_5(client, execution_id, jobs=None):
+        if execution_id == 5:
+            raise requests.ConnectionError("connection reset")
+        return await execution(client, execution_id, jobs)
+    monkeypatch.setattr(AsyncEngineClient, 'execution', unreachable_for_5)
+
+    check_multiple_execution_statuses(engine, [4, 5, 6])
+    out = capsys.readouterr().out
+    assert printed_rows(out) == [4, ('error', 5), 6]
+    assert 'ConnectionError: connection reset' in out
+
+def test_short_id_query_checks_each_execution(mock_engine, capsys):
+    mock, engine = mock_engine
+    check_execution_statuses_by_query(engine, parse_status_query("9,2-3"))
+    assert printed_rows(capsys.readouterr().out) == [2, 3, 9]
+    assert mock.counts['GET executions/{id}'] == 3
+    assert mock.counts['GET executions'] == 0
@@ -0,0 +1,81 @@
+# masking_engine_async.py against the mock engine: operations through run_sync, the thread fallback without
+# aiohttp, and the aiohttp path with its own in-flight limit.
+
+import asyncio
+import time
+
+import pytest
+
+import masking_engine_async
+from masking_engine_async import AsyncEngineClient, run_sync
+from masking_models import Execution
+
+
+def start_executions(engine, *job_ids):
+    return [engine.post('executions', json={'jobId': job_id}).json()['executionId'] for job_id in job_ids]
+
+# Run operation(client) on a new AsyncEngineClient of engine and close it
+def run_client(engine, operation, **options):
+    async def run():
+        async with AsyncEngineClient(engine, **options) as client:
+            return await operation(client)
+    return asyncio.run(run())
+
+
+def test_run_sync_reads_executions_in_order(mock_engine):
+    mock, engine = mock_engine
+    execution_ids = start_executions(engine, 3, 1, 3, 2)
+    results = run_sync(engine, lambda client: client.executions(execution_ids + [999]))
+
+    assert [e.execution_id for e in results[:4]] == execution_ids
+    assert [e.job_name for e in results[:4]] == [mock.data['masking-jobs'][job_id]['jobName'] for job_id in (3, 1, 3, 2)]
+    assert all(isinstance(e, Execution) for e in results[:4])
+    # The unknown execution gives its error, and every job is looked up once for the batch
+    assert isinstance(results[4], Exception)
+    assert mock.counts['GET masking-jobs/{id}'] == 3
+
+def test_run_sync_reuses_one_loop_per_engine(engine):
+    first = run_sync(engine, lambda client: asyncio.sleep(0, client))
+    assert run_sync(engine, lambda client: asyncio.sleep(0, client)) is first
+    created = run_sync(engine, lambda client: client.create('database-rulesets', {'rulesetName': 'NEW', 'databaseConnectorId': 1}))
+    assert created['rulesetName'] == 'NEW'
+
+def test_thread_fallback_without_aiohttp(start_engine, monkeypatch):
+    monkeypatch.setattr(masking_engine_async, 'aiohttp', None)
+    mock, engine = start_engine(latency=0.1)
+
+    started = time.monotonic()
+    names = run_client(engine, lambda client: asyncio.gather(*(client.get_json(f"database-rulesets/{i}") for i in range(1, 21))),
+                       pool_size=20)
+    # Bounded by the EngineClient's connection pool (10), not by one request at a time
+    assert time.monotonic() - started < 1.0
+    assert [r['rulesetName'] for r in names] == [f"RULESET_{i}" for i in range(1, 21)]
+    assert engine.limiter.requests == 20
+
+
+def test_aiohttp_requests_are_not_held_to_the_engine_pool(start_engine):
+    pytest.importorskip('aiohttp')
+    mock, engine = start_engine(latency=0.1)
+
+    started = time.monotonic()
+    run_client(engine, lambda client: asyncio.gather(*(client.get('masking-jobs/1') for _ in range(200))))
+    # 200 requests of 100 ms with up to 100 connections, the EngineClient's limiter of 10 is not used
+    assert time.monotonic() - started < 1.5
+    assert mock.counts['GET masking-jobs/{id}'] == 200
+    assert engine.limiter.requests == 0
+
+def test_aiohttp_cancelled_request_frees_its_slot_without_a_sample(start_engine):
+    pytest.importorskip('aiohttp')
+    mock, engine = start_engine(latency=0.5)
+
+    async def cancel_one(client):
+        task = asyncio.ensure_future(client.get('masking-jobs/1'))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return client.limiter
+
+    limiter = run_client(engine, cancel_one)
+    assert limiter.in_flight == 0
+    assert limiter.requests == 0 and limiter.latency is None
@@ -0,0 +1,46 @@
+# Job name checks of the creation scripts: the engine's masking jobs are listed once per session, and jobs created
+# from the session are added to the index so the next create sees them.
+
+import pytest
+
+import interactive_masking_tasks
+import list_RS_run_masking_job_based_on_RSID
+import masking_job_rs_creation
+
+LISTING = 'GET masking-jobs'
+CREATES = 'POST masking-jobs'
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(masking_job_rs_creation, '_job_names', {})
+
+
+@pytest.mark.parametrize('script', [interactive_masking_tasks, list_RS_run_masking_job_based_on_RSID, masking_job_rs_creation])
+def test_second_create_sees_the_first(script, mock_engine, capsys):
+    mock, engine = mock_engine
+    jobs = len(mock.data['masking-jobs'])
+    script.create_masking_job(engine, 20, 'RULESET_20')
+    script.create_masking_job(engine, 20, 'RULESET_20')
+    script.create_masking_job(engine, 19, 'RULESET_19')
+
+    out = capsys.readouterr().out
+    assert out.count('Masking job created successfully!') == 2
+    assert "'RULESET_20' already exists" in out
+    assert len(mock.data['masking-jobs']) == jobs + 2
+    assert mock.counts[CREATES] == 2
+    # One listing of the engine's jobs for the whole session
+    assert mock.counts[LISTING] == 1
+
+def test_existing_jobs_are_refused(mock_engine, capsys):
+    mock, engine = mock_engine
+    interactive_masking_tasks.create_masking_job(engine, 1, 'RULESET_1')
+    assert "'RULESET_1' already exists" in capsys.readouterr().out
+    assert mock.counts[CREATES] == 0
+
+def test_provisioned_jobs_are_added_to_the_index(mock_engine, capsys):
+    mock, engine = mock_engine
+    masking_job_rs_creation.provision_masking_jobs(engine, [{"rulesetId": 18}], allow_update=False)
+    interactive_masking_tasks.create_masking_job(engine, 18, 'RULESET_18')
+    assert "'RULESET_18' already exists" in capsys.readouterr().out
+    assert mock.counts[CREATES] == 1
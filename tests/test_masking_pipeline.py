@@ -0,0 +1,68 @@
+# masking_pipeline.py against the mock engine: stages, resuming from the state file, clearing it after success.
+
+import asyncio
+import os
+
+from masking_models import Ruleset
+from masking_pipeline import STAGES, PipelineState, run_pipeline
+
+REFRESHES = 'PUT database-rulesets/{id}/refresh'
+EXECUTIONS = 'POST executions'
+
+
+def rulesets_of(engine, *ruleset_ids):
+    return [Ruleset.from_response(r) for r in engine.paginate('database-rulesets') if r['databaseRulesetId'] in ruleset_ids]
+
+
+def test_pipeline_runs_every_stage_and_clears_its_state(mock_engine, tmp_path):
+    mock, engine = mock_engine
+    state = PipelineState(str(tmp_path / 'state.json'))
+    results = asyncio.run(run_pipeline(engine, rulesets_of(engine, 1, 2), state))
+    assert results == ['SUCCEEDED', 'SUCCEEDED']
+    assert mock.counts[REFRESHES] == 2
+    # A profile and a masking execution per ruleset
+    assert mock.counts[EXECUTIONS] == 4
+    assert not os.path.exists(state.path)
+
+    # Nothing is left to resume: the next run starts over
+    asyncio.run(run_pipeline(engine, rulesets_of(engine, 1, 2), PipelineState(state.path)))
+    assert mock.counts[REFRESHES] == 4
+
+def test_pipeline_creates_missing_masking_jobs(mock_engine, tmp_path):
+    mock, engine = mock_engine
+    # Only the first half of the mock's rulesets have a masking job
+    jobs = len(mock.data['masking-jobs'])
+    results = asyncio.run(run_pipeline(engine, rulesets_of(engine, 20), PipelineState(str(tmp_path / 'state.json'))))
+    assert results == ['SUCCEEDED']
+    assert len(mock.data['masking-jobs']) == jobs + 1
+    assert mock.data['masking-jobs'][jobs + 1]['rulesetId'] == 20
+
+def test_pipeline_resumes_a_running_stage(mock_engine, tmp_path):
+    mock, engine = mock_engine
+    execution = engine.post('executions', json={'jobId': 1}).json()
+    state = PipelineState(str(tmp_path / 'state.json'))
+    state.update(1, completed=['refresh'], running={"stage": "profile", "path": f"executions/{execution['executionId']}"},
+                 status='RUNNING')
+
+    results = asyncio.run(run_pipeline(engine, rulesets_of(engine, 1), PipelineState(state.path)))
+    assert results == ['SUCCEEDED']
+    # The refresh is not repeated and the profile execution is waited for, only the masking job is started
+    assert mock.counts[REFRESHES] == 0
+    assert mock.counts[EXECUTIONS] == 2
+
+def test_failed_ruleset_keeps_the_state_for_a_rerun(mock_engine, tmp_path):
+    mock, engine = mock_engine
+    missing = Ruleset(999, 'MISSING', 1)
+    state = PipelineState(str(tmp_path / 'state.json'))
+    results = asyncio.run(run_pipeline(engine, rulesets_of(engine, 1) + [missing], state))
+    assert results == ['SUCCEEDED', 'ERROR']
+
+    saved = PipelineState(state.path)
+    assert saved.get(1)['completed'] == list(STAGES)
+    assert saved.get(999)['status'] == 'ERROR'
+
+    # The rerun does not repeat the stages of the ruleset that already succeeded
+    refreshes, executions = mock.counts[REFRESHES], mock.counts[EXECUTIONS]
+    results = asyncio.run(run_pipeline(engine, rulesets_of(engine, 1), saved))
+    assert results == ['SUCCEEDED']
+    assert (mock.counts[REFRESHES], mock.counts[EXECUTIONS]) == (refreshes, executions)
@@ -0,0 +1,87 @@
+# masking_ruleset_partition.py: balance of the partitions, tables kept together, and creating them on the mock engine.
+
+import argparse
+import asyncio
+import itertools
+import random
+
+import pytest
+
+from masking_ruleset_partition import partition_groups, partition_ruleset, plan_partitions, table_weights
+
+
+def tables_named(*names):
+    return [{'tableName': name} for name in names]
+
+# Largest bin of the best possible split, by trying every assignment
+def best_largest_bin(weights, parts):
+    best = sum(weights)
+    for assignment in itertools.product(range(parts), repeat=len(weights)):
+        loads = [0] * parts
+        for weight, part in zip(weights, assignment):
+            loads[part] += weight
+        best = min(best, max(loads))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_partitions_are_within_four_thirds_of_the_best_split(seed):
+    rng = random.Random(seed)
+    weights = [rng.randint(1, 1000) for _ in range(8)]
+    bins = partition_groups([(weight, [i]) for i, weight in enumerate(weights)], 3)
+    assert sorted(item for _, items in bins for item in items) == list(range(8))
+    assert all(load == sum(weights[i] for i in items) for load, items in bins)
+    assert bins[0][0] <= 4 / 3 * best_largest_bin(weights, 3)
+
+def test_partitions_are_balanced_to_the_largest_table():
+    weights = list(range(1, 101))
+    bins = partition_groups([(weight, [weight]) for weight in weights], 4)
+    loads = [load for load, _ in bins]
+    assert loads == sorted(loads, reverse=True)
+    assert loads[0] - loads[-1] <= max(weights)
+    assert sum(loads) == sum(weights)
+
+def test_fewer_groups_than_parts_leave_no_empty_partition():
+    bins = partition_groups([(5, ['A']), (3, ['B'])], 4)
+    assert bins == [(5, ['A']), (3, ['B'])]
+
+def test_constrained_tables_stay_in_one_partition():
+    tables = tables_named('ORDERS', 'ORDER_ITEMS', 'CUSTOMERS', 'ADDRESSES', 'PRODUCTS', 'PRICES')
+    weights = {table['tableName']: 10 for table in tables}
+    bins = plan_partitions(tables, weights, 3, together=[['CUSTOMERS', 'addresses']],
+                           constraints=[('ORDER_ITEMS', 'ORDERS'), ('PRICES', 'PRODUCTS'), ('PRICES', 'NOT_IN_RULESET')])
+    partition_of = {name: i for i, (_, names) in enumerate(bins) for name in names}
+    assert len(bins) == 3
+    assert partition_of['ORDERS'] == partition_of['ORDER_ITEMS']
+    assert partition_of['CUSTOMERS'] == partition_of['ADDRESSES']
+    assert partition_of['PRODUCTS'] == partition_of['PRICES']
+
+def test_tables_without_row_count_count_at_the_median():
+    weights, estimated = table_weights(tables_named('A', 'b', 'C', 'D'), {'A': 100, 'B': 300, 'C': 0})
+    assert weights == {'A': 100, 'b': 300, 'C': 1, 'D': 100}
+    assert estimated == ['D']
+
+
+def test_partition_ruleset_creates_partitions_once(mock_engine, capsys):
+    mock, engine = mock_engine
+    for i in range(2, 7):
+        table = mock.add('table-metadata', {'tableName': f"EXTRA_{i}", 'rulesetId': 1})
+        mock.add('column-metadata', {'columnName': 'NAME', 'tableMetadataId': table['tableMetadataId'], 'isMasked': True,
+                                     'algorithmName': 'FirstNameLookup', 'domainName': 'FIRST_NAME'})
+    args = argparse.Namespace(ruleset_id=1, parts=3, name=None, concurrency=8, dry_run=False)
+    rulesets = len(mock.data['database-rulesets'])
+
+    asyncio.run(partition_ruleset(engine, args, {}, [], []))
+    new_rulesets = [r for r in mock.data['database-rulesets'].values() if r['rulesetName'].startswith('RULESET_1_P')]
+    assert sorted(r['rulesetName'] for r in new_rulesets) == ['RULESET_1_P1', 'RULESET_1_P2', 'RULESET_1_P3']
+    new_ids = {r['databaseRulesetId'] for r in new_rulesets}
+    copied = [t for t in mock.data['table-metadata'].values() if t['rulesetId'] in new_ids]
+    assert len(copied) == 6
+    assert sorted(j['jobName'] for j in mock.data['masking-jobs'].values() if j['rulesetId'] in new_ids) == \
+        ['RULESET_1_P1', 'RULESET_1_P2', 'RULESET_1_P3']
+
+    # A second run finds the partitions and creates nothing
+    capsys.readouterr()
+    asyncio.run(partition_ruleset(engine, args, {}, [], []))
+    assert 'already exist' in capsys.readouterr().out
+    assert len(mock.data['database-rulesets']) == rulesets + 3
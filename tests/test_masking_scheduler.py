@@ -0,0 +1,77 @@
+# masking_scheduler.py: dispatch order, the engine and per-connector slot limits, and limits that could never
+# start a job.
+
+import argparse
+import asyncio
+
+import pytest
+
+import masking_scheduler
+from masking_engine import parse_id_ranges
+from masking_scheduler import plan_schedule, run_schedule, schedule_masking_jobs, slot_limit
+
+
+# ExecutionHistory stand-in with fixed expected durations per job
+class KnownDurations:
+    def __init__(self, durations):
+        self.durations = durations
+
+    def expected_duration(self, engine_host, job_id):
+        return self.durations.get(job_id)
+
+
+def test_jobs_are_planned_longest_first(engine):
+    history = KnownDurations({1: 30, 2: 300, 4: 100})
+    jobs, missing = plan_schedule(engine, parse_id_ranges("1-4,99"), history)
+    assert [job['jobId'] for job in jobs] == [2, 3, 4, 1]
+    # Job 3 has no history and is expected to take the median of the others
+    assert jobs[1]['expectedDuration'] == 100 and jobs[1]['estimated']
+    assert missing == [99]
+
+def test_wide_ranges_only_walk_existing_jobs(engine):
+    jobs, missing = plan_schedule(engine, parse_id_ranges("1-1000000"))
+    assert sorted(job['jobId'] for job in jobs) == list(range(1, 11))
+    assert missing == []
+
+
+def test_slot_limits_are_respected(monkeypatch):
+    running = []
+    peaks = {'engine': 0}
+
+    async def fake_run(engine, job, history=None):
+        running.append(job['connectorId'])
+        peaks['engine'] = max(peaks['engine'], len(running))
+        peaks[job['connectorId']] = max(peaks.get(job['connectorId'], 0), running.count(job['connectorId']))
+        await asyncio.sleep(0.01 * job['expectedDuration'])
+        running.remove(job['connectorId'])
+        return dict(job, status='SUCCEEDED')
+    monkeypatch.setattr(masking_scheduler, 'run_scheduled_job', fake_run)
+
+    jobs = [{'jobId': i, 'connectorId': i % 3, 'expectedDuration': 10 - i} for i in range(10)]
+    results = asyncio.run(run_schedule(None, jobs, max_executions=3, per_connector=2))
+    assert sorted(result['jobId'] for result in results) == list(range(10))
+    assert peaks['engine'] == 3
+    assert all(peaks[connector] <= 2 for connector in range(3))
+
+def test_zero_limits_are_refused():
+    jobs = [{'jobId': 1, 'connectorId': 1, 'expectedDuration': 0}]
+    for limits in ((0, 1), (1, 0)):
+        with pytest.raises(ValueError):
+            asyncio.run(run_schedule(None, jobs, *limits))
+    with pytest.raises(argparse.ArgumentTypeError):
+        slot_limit('0')
+    assert slot_limit('2') == 2
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--per-connector', type=slot_limit)
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--per-connector', '0'])
+
+
+def test_schedule_runs_every_job_on_the_engine(mock_engine, capsys):
+    mock, engine = mock_engine
+    results = schedule_masking_jobs(engine, parse_id_ranges("1-4"), max_executions=2, per_connector=1)
+    assert sorted(result['jobId'] for result in results) == [1, 2, 3, 4]
+    assert all(result['status'] == 'SUCCEEDED' and result['duration'] is not None for result in results)
+    assert mock.counts['POST executions'] == 4
+    assert 'Makespan' in capsys.readouterr().out
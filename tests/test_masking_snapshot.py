@@ -0,0 +1,59 @@
+# masking_snapshot.py: export a mock engine and import the bundle into an empty one, references remapped.
+
+import asyncio
+
+from masking_snapshot import SNAPSHOT_TYPES, import_snapshot, open_snapshot, run_export
+
+
+# {(ruleset, table, column): (isMasked, algorithmName, domainName)} of a mock engine
+def column_assignments(mock):
+    rulesets = mock.data['database-rulesets']
+    tables = mock.data['table-metadata']
+    return {(rulesets[tables[c['tableMetadataId']]['rulesetId']]['rulesetName'], tables[c['tableMetadataId']]['tableName'], c['columnName']):
+            (c.get('isMasked'), c.get('algorithmName'), c.get('domainName')) for c in mock.data['column-metadata'].values()}
+
+def export_and_import(source_engine, target_engine, bundle_path):
+    asyncio.run(run_export(source_engine, bundle_path, 2))
+    bundle, manifest = open_snapshot(bundle_path)
+    with bundle:
+        return manifest, asyncio.run(import_snapshot(target_engine, bundle, None, 8, False))
+
+
+def test_snapshot_round_trip(start_engine, tmp_path):
+    source, source_engine = start_engine(objects=10)
+    # The target numbers its objects differently: it already has a connector, and the source's has another name
+    source.data['database-connectors'][1]['connectorName'] = 'SOURCE_DB'
+    source.data['masking-jobs'][1].update(onTheFlyMasking=True, onTheFlyMaskingSource={'connectorId': 1, 'connectorType': 'DATABASE'})
+    target, target_engine = start_engine(objects=0)
+
+    manifest, result = export_and_import(source_engine, target_engine, str(tmp_path / 'engine.snapshot'))
+    assert not result.failures
+    for path, _, _, _ in SNAPSHOT_TYPES:
+        assert manifest['counts'][path] == len(source.data[path])
+        counts = result.results[path]
+        assert counts['created'] + counts['existing'] == manifest['counts'][path]
+
+    connector_id = next(c['databaseConnectorId'] for c in target.data['database-connectors'].values() if c['connectorName'] == 'SOURCE_DB')
+    assert connector_id != 1
+    target_rulesets = target.data['database-rulesets']
+    assert sorted(r['rulesetName'] for r in target_rulesets.values()) == sorted(r['rulesetName'] for r in source.data['database-rulesets'].values())
+    assert all(r['databaseConnectorId'] == connector_id for r in target_rulesets.values())
+    for job in target.data['masking-jobs'].values():
+        # Every job points at the ruleset of the same name it had on the source
+        assert target_rulesets[job['rulesetId']]['rulesetName'] == job['jobName']
+        if job['onTheFlyMasking']:
+            assert job['onTheFlyMaskingSource']['connectorId'] == connector_id
+    assert column_assignments(target) == column_assignments(source)
+
+def test_snapshot_import_reuses_existing_objects(start_engine, tmp_path):
+    source, source_engine = start_engine(objects=5)
+    target, target_engine = start_engine(objects=0)
+    bundle_path = str(tmp_path / 'engine.snapshot')
+    export_and_import(source_engine, target_engine, bundle_path)
+    objects = {path: len(target.data[path]) for path, _, _, _ in SNAPSHOT_TYPES}
+
+    # Importing again creates nothing: every object is found by name under its remapped parent
+    _, result = export_and_import(source_engine, target_engine, bundle_path)
+    assert not result.failures
+    assert all(result.results[path]['created'] == 0 for path, _, _, _ in SNAPSHOT_TYPES)
+    assert {path: len(target.data[path]) for path, _, _, _ in SNAPSHOT_TYPES} == objects
@@ -0,0 +1,73 @@
+# masking_watch.py: executions listings re-read from their unfinished tail, and the dashboard redrawing only the
+# rows that changed and clipping the table to the terminal height.
+
+import os
+import shutil
+
+from masking_watch import HEADER_LINES, Dashboard, ExecutionFeed, watch_executions
+
+
+def row(execution_id, status, rows=0):
+    return [execution_id, 1, 'RULESET_1', status, rows, '', '', '', '', '', '']
+
+def test_dashboard_prints_changed_rows_only(capsys):
+    dashboard = Dashboard(interactive=False)
+    dashboard.update(1, row(1, 'RUNNING', 10), 'RUNNING')
+    dashboard.update(1, row(1, 'RUNNING', 10), 'RUNNING')
+    dashboard.update(1, row(1, 'SUCCEEDED', 20), 'SUCCEEDED')
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[3] for line in lines] == ['RUNNING', 'SUCCEEDED']
+
+def test_dashboard_redraws_changed_screen_rows(capsys):
+    dashboard = Dashboard(interactive=True)
+    for execution_id in (1, 2, 3):
+        dashboard.update(execution_id, row(execution_id, 'RUNNING'), 'RUNNING')
+    dashboard.flush()
+    capsys.readouterr()
+    dashboard.update(2, row(2, 'RUNNING', 500), 'RUNNING')
+    dashboard.flush()
+    out = capsys.readouterr().out
+    # Only the second row below the header is rewritten
+    assert out.count('\x1b[K') == 1
+    assert f"\x1b[{HEADER_LINES + 2};1H\x1b[K" in out
+
+def test_dashboard_clips_rows_to_the_terminal(monkeypatch):
+    monkeypatch.setattr(shutil, 'get_terminal_size', lambda fallback=None: os.terminal_size((120, HEADER_LINES + 6)))
+    dashboard = Dashboard(interactive=True)
+    statuses = {1: 'SUCCEEDED', 2: 'RUNNING', 3: 'FAILED', 4: 'SUCCEEDED', 5: 'RUNNING', 6: 'SUCCEEDED', 7: 'FAILED', 8: 'RUNNING'}
+    for execution_id, status in statuses.items():
+        dashboard.update(execution_id, row(execution_id, status), status)
+    rows = dashboard._rows()
+    # 5 lines for rows: running executions, then failed ones, then a summary of the rest
+    assert [int(line.split()[0]) for line in rows[:-1]] == [2, 5, 8, 3]
+    assert rows[-1] == "+4 more"
+
+
+def test_feed_reads_from_the_page_of_the_oldest_running_execution(mock_engine):
+    mock, engine = mock_engine
+    for _ in range(30):
+        mock.add('executions', {"jobId": 1, "status": "SUCCEEDED", "rowsMasked": 1})
+    running = mock.add('executions', {"jobId": 1, "status": "RUNNING", "rowsMasked": 1})
+    feed = ExecutionFeed(engine, page_size=10)
+    executions = feed.poll(set(), True)
+    assert len(executions) == len(mock.data['executions'])
+    # The running execution is the last one, on the last page
+    assert feed.start_page == (running['executionId'] - 1) // 10 + 1 > 1
+
+    before = mock.counts['GET executions']
+    executions = feed.poll({running['executionId']}, False)
+    assert mock.counts['GET executions'] - before == 1
+    assert executions[-1].execution_id == running['executionId']
+    running['status'] = 'SUCCEEDED'
+    feed.poll({running['executionId']}, False)
+    assert feed.done
+
+def test_watch_follows_executions_until_they_finish(mock_engine, capsys):
+    mock, engine = mock_engine
+    started = [engine.post('executions', json={"jobId": job_id}).json()['executionId'] for job_id in (1, 2)]
+    watched = watch_executions(engine, interval=0.05)
+    assert sorted(watched) == started
+    assert all(entry['status'] == 'SUCCEEDED' for entry in watched.values())
+    assert "All watched executions have finished." in capsys.readouterr().out
+    # Job names come from the one jobs listing
+    assert mock.counts['GET masking-jobs/{id}'] == 0
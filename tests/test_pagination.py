@@ -0,0 +1,22 @@
+# EngineClient.paginate: every page of a listing read, pages after the first fetched concurrently.
+
+from masking_engine import DEFAULT_PAGE_SIZE
+
+
+def test_paginate_reads_every_page(mock_engine):
+    mock, engine = mock_engine
+    names = [r['rulesetName'] for r in engine.paginate('database-rulesets', page_size=3)]
+    assert sorted(names) == sorted(f"RULESET_{i}" for i in range(1, 21))
+    # 20 rulesets on pages of 3, each page requested once
+    assert mock.counts['GET database-rulesets'] == 7
+
+def test_ordered_paginate_keeps_the_engine_order(start_engine):
+    mock, engine = start_engine(jitter=0.02)
+    ordered = [r['databaseRulesetId'] for r in engine.paginate('database-rulesets', page_size=3, workers=4, ordered=True)]
+    assert ordered == list(range(1, 21))
+
+def test_paginate_of_a_single_page(mock_engine):
+    mock, engine = mock_engine
+    assert len(list(engine.paginate('masking-jobs'))) == len(mock.data['masking-jobs'])
+    assert len(mock.data['masking-jobs']) <= DEFAULT_PAGE_SIZE
+    assert mock.counts['GET masking-jobs'] == 1
@@ -0,0 +1,85 @@
+# Declarative masking job provisioning of masking_job_rs_creation.py: the plan built from one inventory fetch,
+# the creates and updates applied concurrently, and the per-item report.
+
+import json
+
+import pytest
+import requests
+
+from masking_engine_async import AsyncEngineClient
+from masking_job_rs_creation import load_desired_jobs, plan_masking_jobs, provision_masking_jobs
+
+# Against MOCK_OPTIONS rulesets 1-10 have a job named after them with the default settings, 11-20 have none
+DESIRED = [
+    {"rulesetId": 1},
+    {"rulesetId": 2, "feedbackSize": 5000},
+    {"rulesetId": 15},
+    {"rulesetId": 99},
+    {"rulesetName": "RULESET_16", "jobName": "CUSTOM_16", "databaseMaskingOptions": {"commitSize": 500}},
+    {"rulesetId": 15},
+]
+
+
+def actions(plan):
+    return [item['action'] for item in plan]
+
+def test_plan_compares_desired_jobs_with_the_engine(mock_engine):
+    mock, engine = mock_engine
+    plan = plan_masking_jobs(engine, DESIRED)
+    assert actions(plan) == ['unchanged', 'update', 'create', 'error', 'create', 'error']
+    assert plan[1]['maskingJobId'] == 2
+    assert plan[3]['message'] == "Rule set 99 does not exist"
+    assert plan[4]['jobData']['databaseMaskingOptions']['commitSize'] == 500
+    assert plan[5]['message'] == "Duplicate job name in desired state"
+    # One listing of the rulesets and one of the jobs, whatever the number of entries
+    assert mock.counts['GET database-rulesets'] == 1
+    assert mock.counts['GET masking-jobs'] == 1
+
+def test_existing_jobs_are_not_updated_without_allow_update(mock_engine):
+    mock, engine = mock_engine
+    plan = plan_masking_jobs(engine, DESIRED[:2], allow_update=False)
+    assert actions(plan) == ['exists', 'exists']
+
+
+def test_provision_applies_the_plan(mock_engine, capsys):
+    mock, engine = mock_engine
+    plan = provision_masking_jobs(engine, DESIRED, workers=3)
+    assert [item['result'] for item in plan] == ['OK', 'OK', 'OK', 'FAILED', 'OK', 'FAILED']
+    assert mock.counts['POST masking-jobs'] == 2
+    assert mock.counts['PUT masking-jobs/{id}'] == 1
+    assert mock.data['masking-jobs'][2]['feedbackSize'] == 5000
+    created = {job['jobName']: job for job in mock.data['masking-jobs'].values()}
+    assert created['CUSTOM_16']['maskingJobId'] == plan[4]['maskingJobId']
+
+    out = capsys.readouterr().out
+    assert 'Masking Job Provisioning Report:' in out
+    assert "unchanged: 1, update: 1, create: 2, error: 2" in out
+
+def test_dry_run_sends_nothing(mock_engine, capsys):
+    mock, engine = mock_engine
+    plan = provision_masking_jobs(engine, DESIRED, dry_run=True)
+    assert [item['result'] for item in plan] == ['OK', 'PLANNED', 'PLANNED', 'FAILED', 'PLANNED', 'FAILED']
+    assert mock.counts['POST masking-jobs'] == 0
+    assert mock.counts['PUT masking-jobs/{id}'] == 0
+
+def test_failed_item_does_not_stop_the_batch(mock_engine, monkeypatch, capsys):
+    mock, engine = mock_engine
+    post = AsyncEngineClient.post
+
+    async def unreachable_for_custom(client, path, **kwargs):
+        if kwargs.get('json', {}).get('jobName') == 'CUSTOM_16':
+            raise requests.ConnectionError("connection reset")
+        return await post(client, path, **kwargs)
+    monkeypatch.setattr(AsyncEngineClient, 'post', unreachable_for_custom)
+
+    plan = provision_masking_jobs(engine, DESIRED[2:5])
+    assert [item['result'] for item in plan] == ['OK', 'FAILED', 'FAILED']
+    assert plan[2]['message'] == "ConnectionError: connection reset"
+    assert mock.counts['POST masking-jobs'] == 1
+
+
+@pytest.mark.parametrize('content', [DESIRED, {"jobs": DESIRED}])
+def test_load_desired_jobs_reads_both_forms(tmp_path, content):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps(content))
+    assert load_desired_jobs(str(path)) == DESIRED
@@ -0,0 +1,146 @@
+# ResponseCache (masking_engine.py) against the mock engine: fresh, stale and revalidated entries, listings cached
+# as one generation of pages, and invalidation by writes from any client and any API version of the engine.
+
+import time
+
+from masking_engine import EngineClient, ResponseCache
+from conftest import LOGIN
+
+LISTING = 'GET database-rulesets'
+
+
+def new_ruleset(engine, name):
+    response = engine.post('database-rulesets', headers={'Content-Type': 'application/json'},
+                           json={'rulesetName': name, 'databaseConnectorId': 1})
+    assert response.status_code == 200
+
+def ruleset_names(engine):
+    return [r['rulesetName'] for r in engine.paginate('database-rulesets', page_size=3)]
+
+def wait_for_refreshes(engine):
+    deadline = time.monotonic() + 5
+    while engine._refreshing:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_response_cache_serves_fresh_entries(start_engine, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), ttls={'database-rulesets': 60})
+    mock, engine = start_engine(response_cache=cache)
+    first = engine.get('database-rulesets/1').json()
+    second = engine.get('database-rulesets/1').json()
+    assert first == second
+    assert mock.counts['GET database-rulesets/{id}'] == 1
+
+def test_response_cache_serves_stale_entries_while_revalidating(start_engine, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), ttls={'database-rulesets': 60}, stale=3600)
+    mock, engine = start_engine(response_cache=cache)
+    engine.get('database-rulesets/1')
+    cache.db.execute('UPDATE responses SET stored_at = stored_at - 120')
+    cache.db.commit()
+    mock.data['database-rulesets'][1]['rulesetName'] = 'RENAMED'
+
+    # The stale body comes back at once, the refresh runs in the background
+    assert engine.get('database-rulesets/1').json()['rulesetName'] == 'RULESET_1'
+    deadline = time.monotonic() + 5
+    while engine._refreshing or mock.counts['GET database-rulesets/{id}'] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert engine.get('database-rulesets/1').json()['rulesetName'] == 'RENAMED'
+    assert mock.counts['GET database-rulesets/{id}'] == 2
+
+def test_response_cache_revalidates_expired_entries(start_engine, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), ttls={'database-rulesets': 60}, stale=0)
+    mock, engine = start_engine(response_cache=cache)
+    body = engine.get('database-rulesets/1').json()
+    cache.db.execute('UPDATE responses SET stored_at = stored_at - 120')
+    cache.db.commit()
+    # Unchanged on the engine: the 304 only renews the entry
+    assert engine.get('database-rulesets/1').json() == body
+    assert engine.get('database-rulesets/1').json() == body
+    assert mock.counts['GET database-rulesets/{id}'] == 2
+
+def test_writes_invalidate_the_response_cache(start_engine, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), ttls={'database-rulesets': 60})
+    mock, engine = start_engine(response_cache=cache)
+    total = len(list(engine.paginate('database-rulesets')))
+    response = engine.post('database-rulesets', headers={'Content-Type': 'application/json'},
+                           json={'rulesetName': 'NEW', 'databaseConnectorId': 1})
+    assert response.status_code == 200
+    assert len(list(engine.paginate('database-rulesets'))) == total + 1
+
+
+
+def test_listing_pages_are_cached_as_one_entry(start_engine, response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60})
+    mock, engine = start_engine(response_cache=cache)
+    names = ruleset_names(engine)
+    assert names == [f"RULESET_{i}" for i in range(1, 21)]
+    # 7 pages of 3 read once, then the listing comes from one cache entry
+    assert mock.counts[LISTING] == 7
+    assert ruleset_names(engine) == names
+    assert mock.counts[LISTING] == 7
+    assert cache.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0] == 1
+
+def test_stale_listing_is_refreshed_as_a_whole(start_engine, response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60}, stale=3600)
+    mock, engine = start_engine(response_cache=cache)
+    names = ruleset_names(engine)
+    cache.db.execute('UPDATE responses SET stored_at = stored_at - 120')
+    cache.db.commit()
+    mock.data['database-rulesets'][1]['rulesetName'] = 'FIRST'
+    mock.data['database-rulesets'][20]['rulesetName'] = 'LAST'
+
+    # Every page of the stale listing is served from the same read, none of them mixed with newer pages
+    assert ruleset_names(engine) == names
+    wait_for_refreshes(engine)
+    assert ruleset_names(engine) == ['FIRST'] + names[1:19] + ['LAST']
+    assert mock.counts[LISTING] == 14
+
+def test_single_pages_are_not_cached(start_engine, response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60})
+    mock, engine = start_engine(response_cache=cache)
+    for _ in range(2):
+        records, total = engine.fetch_page('database-rulesets', 2, 3)
+        assert total == 20 and [r['databaseRulesetId'] for r in records] == [4, 5, 6]
+    assert mock.counts[LISTING] == 2
+
+def test_writes_from_uncached_clients_invalidate_the_shared_cache(start_engine, response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60})
+    mock, cached_engine = start_engine(response_cache=cache)
+    names = ruleset_names(cached_engine)
+    # Another script, without a cache, creates a ruleset on the same engine
+    engine = EngineClient(cached_engine.host, token_cache=False)
+    try:
+        engine.login(dict(LOGIN))
+        new_ruleset(engine, 'NEW')
+    finally:
+        engine.close()
+    assert ruleset_names(cached_engine) == names + ['NEW']
+
+def test_writes_invalidate_every_api_version(start_engine, response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60, 'masking-jobs': 60})
+    mock, engine = start_engine(response_cache=cache)
+    old_api = EngineClient(engine.host, api_version='v5.1.33', token_cache=False, response_cache=cache)
+    try:
+        old_api.login(dict(LOGIN))
+        jobs = len(list(old_api.paginate('masking-jobs')))
+        names = ruleset_names(old_api)
+        new_ruleset(engine, 'NEW')
+        # The ruleset listing, and the job listing that depends on it, are read again
+        assert ruleset_names(old_api) == names + ['NEW']
+        assert len(list(old_api.paginate('masking-jobs'))) == jobs
+        assert mock.counts['GET masking-jobs'] == 2
+    finally:
+        old_api.close()
+
+def test_refresh_started_before_an_invalidation_is_not_stored(response_cache_file):
+    cache = ResponseCache(response_cache_file, ttls={'database-rulesets': 60})
+    engine = 'http://engine/masking/api/v5.1.35'
+    key = cache.key(engine, 'database-rulesets/1')
+    requested_at = time.time()
+    cache.invalidate('http://engine/masking/api/v5.1.33', 'database-rulesets/1')
+    cache.put(key, engine, 'database-rulesets', b'{}', None, None, requested_at)
+    assert cache.get(key) is None
+    cache.put(key, engine, 'database-rulesets', b'{}', None, None, time.time())
+    assert cache.get(key)[0] == b'{}'
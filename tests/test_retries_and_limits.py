@@ -0,0 +1,113 @@
+# Retries and concurrency control of masking_engine.py: backoff and retries of refused requests, the adaptive
+# in-flight limit and the circuit breaker.
+
+import pytest
+import requests
+
+from masking_engine import MAX_RETRIES, RETRY_CAP, AdaptiveLimiter, CircuitBreaker, CircuitOpenError, backoff_delay
+from mock_masking_engine import MockEngine
+
+
+# Mock engine answering its first `failures` API requests (not logins) with 503
+class FlakyEngine(MockEngine):
+    def __init__(self, failures, **options):
+        self.failures = failures
+        super().__init__(**options)
+
+    # Read once per API request by the mock's handler
+    @property
+    def error_rate(self):
+        if self.failures > 0:
+            self.failures -= 1
+            return 1.0
+        return 0.0
+
+    @error_rate.setter
+    def error_rate(self, value):
+        pass
+
+
+# Imported before the fast_waits fixture replaces masking_engine.backoff_delay
+def test_backoff_is_capped_and_honours_retry_after():
+    assert all(0 <= backoff_delay(attempt) <= RETRY_CAP for attempt in range(20))
+    response = requests.Response()
+    response.headers['Retry-After'] = '7'
+    assert backoff_delay(0, response) >= 7
+
+def test_request_retries_refused_requests(start_engine):
+    mock, engine = start_engine(FlakyEngine(2, objects=5))
+    response = engine.get('masking-jobs/1')
+    assert response.status_code == 200
+    assert mock.counts['GET masking-jobs/{id}'] == 3
+
+def test_request_gives_up_after_max_retries(start_engine):
+    mock, engine = start_engine(FlakyEngine(100, objects=5))
+    engine.breaker.threshold = 100
+    assert engine.get('masking-jobs/1').status_code == 503
+    assert mock.counts['GET masking-jobs/{id}'] == MAX_RETRIES + 1
+
+
+def test_adaptive_limiter_grows_on_fast_responses():
+    limiter = AdaptiveLimiter(initial=2, maximum=6)
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(0.01, False)
+    assert limiter.limit == 6
+
+def test_adaptive_limiter_halves_once_per_burst_of_errors():
+    limiter = AdaptiveLimiter(initial=8, maximum=16)
+    limiter.acquire()
+    limiter.release(1.0, False)
+    limit = limiter.limit
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(1.0, True)
+    assert limiter.limit == limit / 2
+
+def test_adaptive_limiter_backs_off_when_latency_climbs():
+    limiter = AdaptiveLimiter(initial=8, maximum=16)
+    limiter.acquire()
+    limiter.release(0.01, False)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(2.0, False)
+    assert limiter.limit < 8
+
+def test_adaptive_limiter_caps_requests_in_flight():
+    limiter = AdaptiveLimiter(initial=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release(0.01, False)
+    assert limiter.try_acquire()
+
+
+def test_circuit_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker('engine', threshold=3, cooldown=0.2, max_wait=0.05)
+    for _ in range(2):
+        breaker.record(True)
+    breaker.before_request()
+    breaker.record(True)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+def test_circuit_breaker_probe_closes_or_reopens():
+    breaker = CircuitBreaker('engine', threshold=1, cooldown=0.05, max_wait=1)
+    breaker.record(True)
+    breaker.before_request()
+    assert breaker.state == 'half-open'
+    # A failed probe reopens the breaker with twice the cooldown
+    breaker.record(True)
+    assert breaker.state == 'open' and breaker.cooldown == 0.2
+    breaker.before_request()
+    breaker.record(False)
+    assert breaker.state == 'closed' and breaker.cooldown == 0.05
+
+def test_engine_stops_sending_to_a_failing_engine(start_engine):
+    mock, engine = start_engine(FlakyEngine(100, objects=5))
+    engine.breaker.max_wait = 0.05
+    engine.get('masking-jobs/1')
+    sent = mock.counts['GET masking-jobs/{id}']
+    with pytest.raises(CircuitOpenError):
+        engine.get('masking-jobs/1')
+    assert mock.counts['GET masking-jobs/{id}'] == sent
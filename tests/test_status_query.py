@@ -0,0 +1,67 @@
+# Status lookups by query: ID ranges kept as ranges, and matching executions read from the executions listing
+# in execution ID order, paging stopped once every requested execution was seen.
+
+import time
+
+import pytest
+
+from masking_engine import IdRanges, parse_id_ranges
+from masking_job_rs_creation import query_executions
+from mock_masking_engine import timestamp
+
+EXECUTIONS = 3000
+LISTING = 'GET executions'
+
+
+def test_parse_id_ranges_merges_ranges():
+    ids = parse_id_ranges("7, 3,5-6, 5000-100, 8")
+    assert repr(ids) == "3,5-8,100-5000"
+    assert len(ids) == 4906
+    assert 4999 in ids and 6 in ids
+    assert 4 not in ids and 5001 not in ids and '6' not in ids
+    assert list(parse_id_ranges("3,1-2")) == [1, 2, 3]
+
+def test_parse_id_ranges_rejects_other_input():
+    with pytest.raises(ValueError):
+        parse_id_ranges("3,a")
+    assert not parse_id_ranges("")
+    assert not IdRanges()
+
+def test_wide_ranges_are_not_expanded():
+    ids = parse_id_ranges("1-1000000000")
+    assert len(ids) == 1000000000
+    assert 999999999 in ids
+
+
+# Mock engine with EXECUTIONS executions over 6 pages of the default page size, pages answered in random order
+@pytest.fixture
+def executions_engine(start_engine):
+    mock, engine = start_engine(jitter=0.02)
+    started = time.time() - 3600
+    mock.data['executions'].clear()
+    for i in range(1, EXECUTIONS + 1):
+        mock.add('executions', {"jobId": i % 10 + 1, "status": "FAILED" if i % 7 == 0 else "SUCCEEDED",
+                                "rowsMasked": i, "startTime": timestamp(started), "endTime": timestamp(started + 60)})
+    job_names = {job_id: job['jobName'] for job_id, job in mock.data['masking-jobs'].items()}
+    return mock, engine, job_names
+
+def test_query_results_come_in_execution_id_order(executions_engine):
+    mock, engine, job_names = executions_engine
+    executions = list(query_executions(engine, {'statuses': {'FAILED'}}, job_names))
+    assert [e.execution_id for e in executions] == [i for i in range(1, EXECUTIONS + 1) if i % 7 == 0]
+    assert all(e.job_name == job_names[e.job_id] for e in executions)
+
+def test_query_for_execution_ids_stops_paging_once_all_are_found(executions_engine):
+    mock, engine, job_names = executions_engine
+    executions = list(query_executions(engine, {'executionIds': parse_id_ranges("40-60,5")}, job_names))
+    assert [e.execution_id for e in executions] == [5] + list(range(40, 61))
+    # Page 1 and the pages prefetched with it, never the last page
+    assert mock.counts[LISTING] < 6
+
+def test_query_filters_combine(executions_engine):
+    mock, engine, job_names = executions_engine
+    query = {'executionIds': parse_id_ranges("1-100"), 'jobIds': parse_id_ranges("1"), 'statuses': {'FAILED'}}
+    executions = list(query_executions(engine, query, job_names))
+    assert [e.execution_id for e in executions] == [i for i in range(1, 101) if i % 7 == 0 and i % 10 == 0]
+    # A single job is filtered by the engine
+    assert all(e.job_id == 1 for e in executions)
@@ -0,0 +1,61 @@
+# Token lifecycle of EngineClient: re-login on an expired token, and tokens shared between clients and processes
+# through the TokenCache file.
+
+import threading
+import time
+
+from conftest import LOGIN
+from masking_engine import EngineClient, TokenCache
+
+
+def test_expired_token_logs_in_again(mock_engine):
+    mock, engine = mock_engine
+    token = engine.auth_token
+    mock.tokens.clear()
+    response = engine.get('masking-jobs/1')
+    assert response.status_code == 200
+    assert engine.auth_token != token
+    assert mock.counts['POST login'] == 2
+
+def test_threads_share_one_relogin(mock_engine):
+    mock, engine = mock_engine
+    mock.tokens.clear()
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(engine.get('masking-jobs/1').status_code)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 8
+    assert mock.counts['POST login'] == 2
+
+
+def test_token_cache_expires_entries(tmp_path):
+    cache = TokenCache(str(tmp_path / 'tokens.json'), ttl=0.2)
+    with cache.lock():
+        cache.put('engine|admin', 'token-1')
+        assert cache.get('engine|admin') == 'token-1'
+        assert cache.get('engine|other') is None
+    time.sleep(0.25)
+    with cache.lock():
+        assert cache.get('engine|admin') is None
+
+def test_clients_reuse_a_cached_token(mock_engine, tmp_path):
+    mock, engine = mock_engine
+    cache = TokenCache(str(tmp_path / 'tokens.json'))
+    clients = [EngineClient(engine.host, token_cache=cache) for _ in range(3)]
+    try:
+        tokens = {client.login(dict(LOGIN)) for client in clients}
+        assert len(tokens) == 1
+        # The fixture's client and the first cached client logged in, the others used the cached token
+        assert mock.counts['POST login'] == 2
+
+        # A token replaced by one client is picked up by the others instead of logging in again
+        mock.tokens.clear()
+        assert clients[0].get('masking-jobs/1').status_code == 200
+        assert clients[1].get('masking-jobs/1').status_code == 200
+        assert clients[1].auth_token == clients[0].auth_token
+        assert mock.counts['POST login'] == 3
+    finally:
+        for client in clients:
+            client.close()